@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class AdsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'ads'
\ No newline at end of file
+    name = 'ads'
+    
+    def ready(self):
+        import ads.signals
\ No newline at end of file
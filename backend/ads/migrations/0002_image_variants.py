@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-17 02:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='advertisement',
+            name='image_ad_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='image variants'),
+        ),
+    ]
@@ -7,6 +7,7 @@ class Advertisement(models.Model):
     title = models.CharField(_('title'), max_length=200)
     description = models.TextField(_('description'), blank=True)
     image_ad = models.ImageField(_('image'), upload_to='ads/')
+    image_ad_variants = models.JSONField(_('image variants'), default=dict, blank=True, editable=False)
     link = models.URLField(_('link'), blank=True)
     priority = models.PositiveIntegerField(_('priority'), default=0, 
                                          help_text=_('Higher priority ads will be shown first'))
@@ -16,6 +17,8 @@ class Advertisement(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    IMAGE_VARIANT_FIELDS = ('image_ad',)
+    
     class Meta:
         verbose_name = _('advertisement')
         verbose_name_plural = _('advertisements')
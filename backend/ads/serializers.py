@@ -1,14 +1,16 @@
 from rest_framework import serializers
+from rafal_backend.images import ImageVariantsField
 from .models import Advertisement
 
 
 class AdvertisementSerializer(serializers.ModelSerializer):
     is_valid = serializers.BooleanField(read_only=True)
+    image_ad_variants = ImageVariantsField()
     
     class Meta:
         model = Advertisement
         fields = [
-            'id', 'title', 'description', 'image_ad', 'link', 
+            'id', 'title', 'description', 'image_ad', 'image_ad_variants', 'link', 
             'priority', 'start_date', 'end_date', 'is_active', 
             'is_valid', 'created_at', 'updated_at'
         ]
@@ -0,0 +1,7 @@
+from django.db.models.signals import post_save
+from rafal_backend.images import queue_image_variants
+from .models import Advertisement
+
+
+post_save.connect(queue_image_variants, sender=Advertisement,
+                  dispatch_uid='queue_image_variants_Advertisement')
\ No newline at end of file
@@ -2,12 +2,13 @@ from rest_framework import viewsets, permissions
 from django.utils import timezone
 from .models import Advertisement
 from .serializers import AdvertisementSerializer
+from rafal_backend.conditional import ConditionalGetMixin
 from django.db import models
 
 from django.db.models import Q
 
 
-class AdvertisementViewSet(viewsets.ReadOnlyModelViewSet):
+class AdvertisementViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = AdvertisementSerializer
     permission_classes = [permissions.AllowAny]
 
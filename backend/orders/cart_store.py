@@ -0,0 +1,543 @@
+"""
+Storage of guest carts: the carts of visitors known only by the
+``session_key`` the storefront keeps for them. User carts are always Cart
+rows.
+
+DatabaseCartStore keeps guest carts as Cart rows as well, created with
+their first item; orders.tasks.delete_stale_carts deletes the empty and
+expired ones. RedisCartStore keeps each one as a Redis hash whose TTL
+every write renews, so adding, updating or removing a line costs a couple
+of Redis round trips and no SQL write; most guest carts are abandoned and
+never need a row. A guest cart is written to SQL only when it is needed
+there: at checkout, when its lines are merged into a user's cart at login,
+and by the write-behind task orders.tasks.persist_guest_carts, which copies
+the carts changed since its last run. A cart missing from Redis, e.g.
+after a restart, is restored from that copy.
+
+Without a Redis URL, RedisCartStore runs on LocalRedis, an in-process
+stand-in for the few commands it uses, for development and tests. The
+store is chosen by the CART_STORE_BACKEND setting.
+"""
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from products.models import Product, ProductColor
+from rafal_backend.sparse import SparseFieldset
+from .models import Cart, CartItem, CartTotals
+
+
+def prefetch_cart_items(cart, fieldset=None):
+    """
+    Load ``cart``'s items for CartSerializer in one query, whatever the cart
+    size: line totals are computed in SQL and colors, products and their
+    categories joined, leaving out the joins ``fieldset`` does not render.
+    """
+    fieldset = fieldset or SparseFieldset()
+    if not fieldset.includes_any('items', 'total', 'item_count', 'delivery'):
+        return cart
+    items = CartItem.objects.with_totals()
+    if fieldset.includes('items'):
+        items = items.select_related('color')
+    if fieldset.includes('items.product'):
+        items = items.select_related('product__category')
+    prefetch_related_objects([cart], Prefetch('items', queryset=items))
+    return cart
+
+
+def add_cart_item(cart, product, color, quantity):
+    """Add ``quantity`` of the product and color to a Cart row; returns the item."""
+    item = CartItem.objects.filter(cart=cart, product=product, color=color).first()
+    if item is None:
+        return CartItem.objects.create(cart=cart, product=product, color=color, quantity=quantity)
+    item.quantity += quantity
+    item.save()
+    return item
+
+
+def set_cart_item_quantity(cart, item_id, quantity):
+    """Set the quantity of a Cart row's item, removing it at zero; False if not found."""
+    try:
+        item = CartItem.objects.get(id=item_id, cart=cart)
+    except CartItem.DoesNotExist:
+        return False
+    if quantity <= 0:
+        item.delete()
+    else:
+        item.quantity = quantity
+        item.save()
+    return True
+
+
+def valid_lines(lines):
+    """
+    ``{(product_id, color_id): quantity}`` lines without deleted products;
+    lines of deleted colors fall back to no color.
+    """
+    if not lines:
+        return {}
+    product_ids = set(
+        Product.objects.filter(pk__in={product_id for product_id, _ in lines})
+        .values_list('pk', flat=True)
+    )
+    color_ids = set(
+        ProductColor.objects.filter(pk__in={color_id for _, color_id in lines if color_id})
+        .values_list('pk', flat=True)
+    )
+    valid = {}
+    for (product_id, color_id), quantity in lines.items():
+        if product_id in product_ids:
+            line = (product_id, color_id if color_id in color_ids else None)
+            valid[line] = valid.get(line, 0) + quantity
+    return valid
+
+
+def merge_cart_lines(cart, lines):
+    """
+    Add ``{(product_id, color_id): quantity}`` lines to a Cart row in a
+    fixed number of statements, whatever their number: one read of the
+    cart's items, one bulk update of the lines it has and one insert of
+    the others.
+    """
+    lines = dict(lines)
+    now = timezone.now()
+    updated = []
+    for item in CartItem.objects.filter(cart=cart).only('pk', 'product_id', 'color_id', 'quantity'):
+        quantity = lines.pop((item.product_id, item.color_id), None)
+        if quantity:
+            item.quantity += quantity
+            item.updated_at = now
+            updated.append(item)
+    CartItem.objects.bulk_update(updated, ['quantity', 'updated_at'])
+    CartItem.objects.bulk_create([
+        CartItem(cart=cart, product_id=product_id, color_id=color_id, quantity=quantity)
+        for (product_id, color_id), quantity in lines.items()
+    ])
+
+
+class GuestCart(CartTotals):
+    """
+    A guest cart without a Cart row, shaped like Cart for CartSerializer:
+    one read from Redis, or an empty cart whose row is only created with
+    its first item.
+    """
+    id = None
+    user = None
+    user_id = None
+
+    def __init__(self, session_key, items=(), created_at=None, updated_at=None):
+        self.session_key = session_key
+        self.items = list(items)
+        self.created_at = created_at or timezone.now()
+        self.updated_at = updated_at or self.created_at
+
+    def get_items(self):
+        return self.items
+
+
+class DatabaseCartStore:
+    """Guest carts as Cart rows."""
+
+    def load(self, session_key, fieldset=None):
+        """The cart of ``session_key``, ready for CartSerializer; empty until it has a row."""
+        cart = Cart.objects.filter(session_key=session_key).first()
+        if cart is None:
+            return GuestCart(session_key)
+        return prefetch_cart_items(cart, fieldset)
+
+    def add_item(self, session_key, product, color, quantity):
+        cart, _ = Cart.objects.get_or_create(session_key=session_key)
+        add_cart_item(cart, product, color, quantity)
+
+    def set_quantity(self, session_key, item_id, quantity):
+        cart = Cart.objects.filter(session_key=session_key).first()
+        return cart is not None and set_cart_item_quantity(cart, item_id, quantity)
+
+    def remove_item(self, session_key, item_id):
+        return self.set_quantity(session_key, item_id, 0)
+
+    def clear(self, session_key):
+        CartItem.objects.filter(cart__session_key=session_key, cart__user=None).delete()
+
+    def get_lines(self, session_key):
+        """``{(product_id, color_id): quantity}`` of the cart of ``session_key``."""
+        return {
+            (product_id, color_id): quantity
+            for product_id, color_id, quantity in CartItem.objects.filter(
+                cart__session_key=session_key, cart__user=None
+            ).values_list('product_id', 'color_id', 'quantity')
+        }
+
+    def delete(self, session_key):
+        Cart.objects.filter(session_key=session_key, user=None).delete()
+
+    def materialize(self, session_key):
+        """The Cart row of ``session_key``, if any, for checkout."""
+        return Cart.objects.filter(session_key=session_key).first()
+
+    def persist_changed(self, batch_size):
+        return 0
+
+
+class LocalRedis:
+    """
+    In-process stand-in for the Redis commands RedisCartStore uses, replying
+    like a client created with ``decode_responses=True``.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.data = {}
+        self.expires = {}
+
+    def _get(self, key, factory=None):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        if key not in self.data and factory is not None:
+            self.data[key] = factory()
+        return self.data.get(key)
+
+    def exists(self, key):
+        with self.lock:
+            return int(self._get(key) is not None)
+
+    def delete(self, *keys):
+        with self.lock:
+            deleted = 0
+            for key in keys:
+                deleted += self._get(key) is not None
+                self.data.pop(key, None)
+                self.expires.pop(key, None)
+            return deleted
+
+    def expire(self, key, seconds):
+        with self.lock:
+            if self._get(key) is None:
+                return False
+            self.expires[key] = time.monotonic() + seconds
+            return True
+
+    def hget(self, key, field):
+        with self.lock:
+            return (self._get(key) or {}).get(field)
+
+    def hgetall(self, key):
+        with self.lock:
+            return dict(self._get(key) or {})
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        values = dict(mapping or {})
+        if field is not None:
+            values[field] = value
+        with self.lock:
+            fields = self._get(key, dict)
+            added = len(values.keys() - fields.keys())
+            fields.update((name, str(value)) for name, value in values.items())
+            return added
+
+    def hsetnx(self, key, field, value):
+        with self.lock:
+            fields = self._get(key, dict)
+            if field in fields:
+                return 0
+            fields[field] = str(value)
+            return 1
+
+    def hincrby(self, key, field, amount=1):
+        with self.lock:
+            fields = self._get(key, dict)
+            fields[field] = str(int(fields.get(field, 0)) + amount)
+            return int(fields[field])
+
+    def hdel(self, key, *fields):
+        with self.lock:
+            stored = self._get(key)
+            if not stored:
+                return 0
+            deleted = sum(stored.pop(field, None) is not None for field in fields)
+            if not stored:
+                self.delete(key)
+            return deleted
+
+    def sadd(self, key, *members):
+        with self.lock:
+            stored = self._get(key, set)
+            before = len(stored)
+            stored.update(members)
+            return len(stored) - before
+
+    def srem(self, key, *members):
+        with self.lock:
+            stored = self._get(key)
+            if not stored:
+                return 0
+            before = len(stored)
+            stored.difference_update(members)
+            if not stored:
+                self.delete(key)
+            return before - len(stored)
+
+    def spop(self, key, count=None):
+        with self.lock:
+            stored = self._get(key) or set()
+            popped = [stored.pop() for _ in range(min(count or 1, len(stored)))]
+            if not stored:
+                self.delete(key)
+            if count is None:
+                return popped[0] if popped else None
+            return popped
+
+    def pipeline(self, transaction=True):
+        return LocalPipeline(self)
+
+
+class LocalPipeline:
+    """Queues LocalRedis commands and runs them together under its lock."""
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+
+        def queue(*args, **kwargs):
+            self.commands.append((method, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        with self.client.lock:
+            results = [method(*args, **kwargs) for method, args, kwargs in self.commands]
+        self.commands = []
+        return results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.commands = []
+
+
+class RedisCartStore:
+    """
+    Guest carts as Redis hashes. Each line is two fields, keyed by product
+    and color: ``line:<product>:<color>`` holds the quantity, changed with
+    HINCRBY so concurrent adds never lose one, and ``item:<product>:<color>``
+    the line's item id and when it was added. ``seq`` numbers the items.
+    """
+    key_prefix = 'rafal:cart'
+
+    def __init__(self, url=None, ttl=None):
+        url = settings.CART_STORE_REDIS_URL if url is None else url
+        if url:
+            import redis
+            self.client = redis.Redis.from_url(url, decode_responses=True)
+        else:
+            self.client = LocalRedis()
+        self.ttl = ttl or settings.GUEST_CART_TTL
+        self.changed_key = f'{self.key_prefix}:changed'
+
+    def key(self, session_key):
+        return f'{self.key_prefix}:{session_key}'
+
+    def touch(self, pipe, session_key, now):
+        """Queue the bookkeeping of a write: timestamps, TTL and the write-behind mark."""
+        key = self.key(session_key)
+        pipe.hsetnx(key, 'created_at', now)
+        pipe.hset(key, 'updated_at', now)
+        pipe.expire(key, self.ttl)
+        pipe.sadd(self.changed_key, session_key)
+
+    # Reading
+
+    def read(self, session_key):
+        """
+        ``(lines, created_at, updated_at)`` of a cart, with lines as
+        ``(item_id, product_id, color_id, quantity, added_at)`` tuples.
+        """
+        fields = self.client.hgetall(self.key(session_key))
+        if not fields:
+            fields = self.restore(session_key)
+
+        def moment(value):
+            return datetime.fromtimestamp(float(value), tz=dt_timezone.utc) if value else None
+
+        lines = []
+        for name, quantity in fields.items():
+            if not name.startswith('line:'):
+                continue
+            _, product_id, color_id = name.split(':')
+            item = fields.get(f'item:{product_id}:{color_id}')
+            if item is None:
+                continue
+            item_id, added_at = item.split()
+            lines.append((
+                int(item_id), int(product_id), int(color_id) if color_id else None,
+                int(quantity), moment(added_at),
+            ))
+        return lines, moment(fields.get('created_at')), moment(fields.get('updated_at'))
+
+    def restore(self, session_key):
+        """Copy a cart missing from Redis back from its SQL copy; returns its fields."""
+        items = list(
+            CartItem.objects.filter(cart__session_key=session_key, cart__user=None)
+            .values_list('pk', 'product_id', 'color_id', 'quantity', 'created_at')
+        )
+        if not items:
+            return {}
+        fields = {'seq': max(item[0] for item in items)}
+        for item_id, product_id, color_id, quantity, created_at in items:
+            line = f'{product_id}:{color_id or ""}'
+            fields[f'line:{line}'] = quantity
+            fields[f'item:{line}'] = f'{item_id} {created_at.timestamp()}'
+        fields['created_at'] = fields['updated_at'] = min(item[4] for item in items).timestamp()
+        key = self.key(session_key)
+        with self.client.pipeline() as pipe:
+            pipe.hset(key, mapping=fields)
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+        return {name: str(value) for name, value in fields.items()}
+
+    def load(self, session_key, fieldset=None):
+        """The cart of ``session_key`` as a GuestCart, with two queries at most."""
+        lines, created_at, updated_at = self.read(session_key)
+        product_ids = {product_id for _, product_id, _, _, _ in lines}
+        color_ids = {color_id for _, _, color_id, _, _ in lines if color_id}
+        products = Product.objects.select_related('category').in_bulk(product_ids)
+        colors = ProductColor.objects.in_bulk(color_ids)
+        items = [
+            CartItem(
+                id=item_id, product=products[product_id], color=colors.get(color_id),
+                quantity=quantity, created_at=added_at,
+            )
+            for item_id, product_id, color_id, quantity, added_at in lines
+            if product_id in products
+        ]
+        items.sort(key=lambda item: item.created_at, reverse=True)
+        return GuestCart(session_key, items, created_at, updated_at)
+
+    # Writing
+
+    def add_item(self, session_key, product, color, quantity):
+        key = self.key(session_key)
+        if not self.client.exists(key):
+            self.restore(session_key)
+        line = f'{product.pk}:{color.pk if color else ""}'
+        item_id = self.client.hincrby(key, 'seq', 1)
+        now = time.time()
+        with self.client.pipeline() as pipe:
+            pipe.hsetnx(key, f'item:{line}', f'{item_id} {now}')
+            pipe.hincrby(key, f'line:{line}', quantity)
+            self.touch(pipe, session_key, now)
+            pipe.execute()
+
+    def set_quantity(self, session_key, item_id, quantity):
+        lines, _, _ = self.read(session_key)
+        for line_id, product_id, color_id, _, _ in lines:
+            if str(line_id) != str(item_id):
+                continue
+            key = self.key(session_key)
+            line = f'{product_id}:{color_id or ""}'
+            with self.client.pipeline() as pipe:
+                if quantity <= 0:
+                    pipe.hdel(key, f'line:{line}', f'item:{line}')
+                else:
+                    pipe.hset(key, f'line:{line}', int(quantity))
+                self.touch(pipe, session_key, time.time())
+                pipe.execute()
+            return True
+        return False
+
+    def remove_item(self, session_key, item_id):
+        return self.set_quantity(session_key, item_id, 0)
+
+    def clear(self, session_key):
+        # An empty hash, rather than none, so the SQL copy is not restored
+        key = self.key(session_key)
+        with self.client.pipeline() as pipe:
+            pipe.delete(key)
+            self.touch(pipe, session_key, time.time())
+            pipe.execute()
+
+    # Write-behind
+
+    def get_lines(self, session_key):
+        lines = {}
+        for _, product_id, color_id, quantity, _ in self.read(session_key)[0]:
+            lines[(product_id, color_id)] = quantity
+        return lines
+
+    def delete(self, session_key):
+        """Drop the cart of ``session_key``; Redis follows once the transaction commits."""
+        Cart.objects.filter(session_key=session_key, user=None).delete()
+
+        def delete_hash():
+            with self.client.pipeline() as pipe:
+                pipe.delete(self.key(session_key))
+                pipe.srem(self.changed_key, session_key)
+                pipe.execute()
+        transaction.on_commit(delete_hash)
+
+    def materialize(self, session_key):
+        """
+        Write the cart of ``session_key`` to its Cart row, for checkout; the
+        row is deleted, and None returned, if the cart is empty.
+
+        The cart stays marked as changed until the write commits, so a
+        rolled back write is retried by persist_guest_carts, and stays marked
+        if it changed again since it was read.
+        """
+        key = self.key(session_key)
+        read_at = self.client.hget(key, 'updated_at')
+        lines = valid_lines(self.get_lines(session_key))
+
+        def unmark():
+            if self.client.hget(key, 'updated_at') == read_at:
+                self.client.srem(self.changed_key, session_key)
+
+        with transaction.atomic():
+            transaction.on_commit(unmark)
+            cart = Cart.objects.filter(session_key=session_key, user=None).first()
+            if not lines:
+                if cart is not None:
+                    cart.delete()
+                return None
+            if cart is None:
+                cart = Cart.objects.create(session_key=session_key)
+            else:
+                cart.items.all().delete()
+                cart.save(update_fields=['updated_at'])
+            CartItem.objects.bulk_create([
+                CartItem(cart=cart, product_id=product_id, color_id=color_id, quantity=quantity)
+                for (product_id, color_id), quantity in lines.items()
+            ])
+        return cart
+
+    def persist_changed(self, batch_size):
+        """Write up to ``batch_size`` carts changed since they were last written to SQL."""
+        session_keys = self.client.spop(self.changed_key, batch_size) or []
+        for position, session_key in enumerate(session_keys):
+            try:
+                self.materialize(session_key)
+            except Exception:
+                # Leave the carts not written yet for the next run
+                self.client.sadd(self.changed_key, *session_keys[position:])
+                raise
+        return len(session_keys)
+
+
+_cart_store = None
+
+
+def get_cart_store():
+    global _cart_store
+    if _cart_store is None:
+        _cart_store = import_string(settings.CART_STORE_BACKEND)()
+    return _cart_store
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-17 02:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
+        ),
+    ]
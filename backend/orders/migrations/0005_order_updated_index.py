@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-17 02:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['updated_at'], name='order_updated_idx'),
+        ),
+    ]
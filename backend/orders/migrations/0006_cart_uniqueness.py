@@ -0,0 +1,68 @@
+# Generated by Django 4.2.10 on 2026-10-17 03:23
+
+from django.db import migrations, models
+
+
+def merge_duplicate_carts(apps, schema_editor):
+    """
+    Fold duplicate carts of a user or session key into the newest one, and
+    duplicate lines into one, adding quantities, before the constraints.
+    """
+    Cart = apps.get_model('orders', 'Cart')
+    CartItem = apps.get_model('orders', 'CartItem')
+    for field in ('user', 'session_key'):
+        duplicated = (
+            Cart.objects.filter(**{f'{field}__isnull': False})
+            .values(field).annotate(carts=models.Count('pk')).filter(carts__gt=1)
+            .values_list(field, flat=True)
+        )
+        for value in list(duplicated):
+            keep, *others = Cart.objects.filter(**{field: value}).order_by('-updated_at', '-pk')
+            kept = {(item.product_id, item.color_id): item for item in CartItem.objects.filter(cart=keep)}
+            for item in CartItem.objects.filter(cart__in=others).order_by('pk'):
+                line = (item.product_id, item.color_id)
+                if line in kept:
+                    kept[line].quantity += item.quantity
+                    kept[line].save(update_fields=['quantity'])
+                    item.delete()
+                else:
+                    item.cart = keep
+                    item.save(update_fields=['cart'])
+                    kept[line] = item
+            Cart.objects.filter(pk__in=[cart.pk for cart in others]).delete()
+
+    # Lines without a color, which unique_together let repeat
+    lines = (
+        CartItem.objects.filter(color__isnull=True).values('cart', 'product')
+        .annotate(items=models.Count('pk')).filter(items__gt=1)
+    )
+    for line in list(lines):
+        keep, *others = CartItem.objects.filter(
+            cart=line['cart'], product=line['product'], color__isnull=True
+        ).order_by('pk')
+        keep.quantity += sum(item.quantity for item in others)
+        keep.save(update_fields=['quantity'])
+        CartItem.objects.filter(pk__in=[item.pk for item in others]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_updated_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_carts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user',), name='cart_unique_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('session_key',), name='cart_unique_session_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('color__isnull', True)), fields=('cart', 'product'), name='cart_item_unique_colorless'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-17 03:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_cart_uniqueness'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(condition=models.Q(('user__isnull', True)), fields=['updated_at', 'id'], name='cart_guest_updated_idx'),
+        ),
+    ]
@@ -1,10 +1,47 @@
+from decimal import Decimal
 from django.db import models
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, When
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 from products.models import Product, ProductColor
 
 
-class Cart(models.Model):
+class CartTotals:
+    """Subtotal, item count and delivery fee of a cart, from its ``get_items()``."""
+    # Orders from this subtotal ship free; below it they pay DELIVERY_FEE
+    FREE_DELIVERY_THRESHOLD = 500
+    DELIVERY_FEE = 50
+    
+    def get_items(self):
+        raise NotImplementedError
+    
+    @cached_property
+    def summary(self):
+        """
+        ``(subtotal, item count)``, read in one pass over the items. Computed
+        once per instance: reload the cart after changing its items.
+        """
+        subtotal, item_count = Decimal('0'), 0
+        for item in self.get_items():
+            subtotal += item.total
+            item_count += item.quantity
+        return subtotal, item_count
+    
+    @property
+    def total(self):
+        return self.summary[0]
+    
+    @property
+    def item_count(self):
+        return self.summary[1]
+    
+    @property
+    def delivery_fee(self):
+        return 0 if self.total >= self.FREE_DELIVERY_THRESHOLD else self.DELIVERY_FEE
+
+
+class Cart(CartTotals, models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, 
         on_delete=models.CASCADE, 
@@ -19,17 +56,40 @@ class Cart(models.Model):
         verbose_name = _('cart')
         verbose_name_plural = _('carts')
         ordering = ['-updated_at']
+        constraints = [
+            # One cart per user and per guest session; NULLs do not collide
+            models.UniqueConstraint(fields=['user'], name='cart_unique_user'),
+            models.UniqueConstraint(fields=['session_key'], name='cart_unique_session_key'),
+        ]
+        indexes = [
+            # Guest carts by age, walked by orders.tasks.delete_stale_carts
+            models.Index(
+                fields=['updated_at', 'id'], condition=models.Q(user__isnull=True),
+                name='cart_guest_updated_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"Cart {self.id} - {self.user.phone if self.user else 'Anonymous'}"
     
-    @property
-    def total(self):
-        return sum(item.total for item in self.items.all())
-    
-    @property
-    def item_count(self):
-        return sum(item.quantity for item in self.items.all())
+    def get_items(self):
+        return self.items.all()
+
+
+class CartItemQuerySet(models.QuerySet):
+    def with_totals(self):
+        """Annotate ``unit_price`` and ``line_total`` in SQL, priced as CartItem.total is."""
+        unit_price = Case(
+            When(color__price__gt=0, then=F('color__price')),
+            default=F('product__price'),
+        )
+        return self.annotate(
+            unit_price=unit_price,
+            line_total=ExpressionWrapper(
+                unit_price * F('quantity'),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
 
 
 class CartItem(models.Model):
@@ -40,17 +100,28 @@ class CartItem(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = CartItemQuerySet.as_manager()
+    
     class Meta:
         verbose_name = _('cart item')
         verbose_name_plural = _('cart items')
         ordering = ['-created_at']
         unique_together = ('cart', 'product', 'color')
+        constraints = [
+            # unique_together lets lines without a color repeat, as NULLs never collide
+            models.UniqueConstraint(
+                fields=['cart', 'product'], condition=models.Q(color__isnull=True),
+                name='cart_item_unique_colorless',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
     
     @property
     def total(self):
+        if hasattr(self, 'line_total'):
+            return self.line_total
         if self.color and self.color.price:
             return self.color.price * self.quantity
         return self.product.price * self.quantity
@@ -104,6 +175,10 @@ class Order(models.Model):
         verbose_name = _('order')
         verbose_name_plural = _('orders')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
+            models.Index(fields=['updated_at'], name='order_updated_idx'),
+        ]
     
     def __str__(self):
         return f"Order #{self.order_number}"
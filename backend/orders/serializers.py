@@ -3,9 +3,10 @@ from django.utils.crypto import get_random_string
 from .models import Cart, CartItem, Order, OrderItem, OrderTimeline
 from products.models import Product, ProductColor
 from products.serializers import ProductListSerializer
+from rafal_backend.sparse import SparseFieldsetSerializerMixin
 
 
-class CartItemSerializer(serializers.ModelSerializer):
+class CartItemSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     product = ProductListSerializer(read_only=True)
     product_id = serializers.IntegerField(write_only=True)
     color_id = serializers.IntegerField(write_only=True, required=False, allow_null=True)
@@ -45,7 +46,14 @@ class CartItemSerializer(serializers.ModelSerializer):
         return attrs
 
 
-class CartSerializer(serializers.ModelSerializer):
+class CartItemQuantitySerializer(serializers.Serializer):
+    """The item and new quantity of update_quantity; zero removes the item."""
+    cartitem_id = serializers.IntegerField()
+    # Up to the largest value a PositiveIntegerField holds on every database
+    quantity = serializers.IntegerField(min_value=0, max_value=2 ** 31 - 1, default=1)
+
+
+class CartSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     items = CartItemSerializer(many=True, read_only=True)
     total = serializers.DecimalField(read_only=True, max_digits=10, decimal_places=2)
     item_count = serializers.IntegerField(read_only=True)
@@ -57,11 +65,7 @@ class CartSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'user', 'created_at', 'updated_at']
     
     def get_delivery(self, obj):
-        # Calculate delivery fee based on total
-        total = obj.total
-        if total >= 500:  # Free delivery for orders over 500 EGP
-            return 0
-        return 50  # Default delivery fee
+        return obj.delivery_fee
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -81,7 +85,7 @@ class OrderTimelineSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     timeline = OrderTimelineSerializer(many=True, read_only=True)
     
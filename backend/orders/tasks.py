@@ -0,0 +1,74 @@
+import time
+from datetime import timedelta
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from products.models import JobWatermark
+from .cart_store import get_cart_store
+from .models import Cart, CartItem
+
+
+# Empty guest carts are kept this long after their last change, so a cart
+# emptied a moment ago is not deleted under its visitor
+EMPTY_CART_GRACE = timedelta(hours=1)
+
+
+@shared_task
+def persist_guest_carts(batch_size=500):
+    """
+    Write-behind for the cart store: copy the guest carts changed since the
+    last run to SQL, ``batch_size`` carts per loop, until none are left.
+    """
+    store = get_cart_store()
+    persisted = 0
+    while True:
+        written = store.persist_changed(batch_size)
+        persisted += written
+        if written < batch_size:
+            return persisted
+
+
+@shared_task
+def delete_stale_carts(batch_size=1000):
+    """
+    Delete the guest carts that expired (unchanged for GUEST_CART_TTL) or
+    are empty (unchanged for EMPTY_CART_GRACE), oldest first.
+
+    Carts are walked along the guest cart index with a keyset cursor and
+    deleted ``batch_size`` per transaction, so each transaction stays
+    short. Returns the run's counts, which are also added to the
+    ``cart_gc`` JobWatermark.
+    """
+    started = time.monotonic()
+    now = timezone.now()
+    stale = (
+        Cart.objects.filter(user__isnull=True, updated_at__lt=now - EMPTY_CART_GRACE)
+        .filter(
+            Q(updated_at__lt=now - timedelta(seconds=settings.GUEST_CART_TTL))
+            | ~Exists(CartItem.objects.filter(cart=OuterRef('pk')))
+        )
+        .order_by('updated_at', 'id')
+    )
+    stats = {'carts': 0, 'items': 0, 'batches': 0}
+    cursor = Q()
+    while True:
+        with transaction.atomic():
+            batch = list(stale.filter(cursor).values_list('updated_at', 'id')[:batch_size])
+            if not batch:
+                break
+            _, deleted = Cart.objects.filter(pk__in=[pk for _, pk in batch]).delete()
+        stats['carts'] += deleted.get(Cart._meta.label, 0)
+        stats['items'] += deleted.get(CartItem._meta.label, 0)
+        stats['batches'] += 1
+        if len(batch) < batch_size:
+            break
+        updated_at, pk = batch[-1]
+        cursor = Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=pk)
+
+    watermark, _ = JobWatermark.objects.get_or_create(name='cart_gc')
+    watermark.processed += stats['carts']
+    watermark.save()
+    stats['seconds'] = round(time.monotonic() - started, 3)
+    return stats
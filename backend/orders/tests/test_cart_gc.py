@@ -0,0 +1,91 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from orders.models import Cart, CartItem
+from orders.tasks import EMPTY_CART_GRACE, delete_stale_carts
+from products.models import Category, JobWatermark, Product
+
+
+@override_settings(GUEST_CART_TTL=7 * 24 * 60 * 60)
+class DeleteStaleCartsTests(TestCase):
+    ttl = timedelta(days=7)
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Fans')
+        cls.product = Product.objects.create(name='Desk fan', price=Decimal('100'), category=category)
+
+    def cart(self, age, with_item=False, user=None):
+        """A cart last changed ``age`` ago; a guest's unless ``user`` is given."""
+        cart = Cart.objects.create(
+            user=user, session_key=None if user else f'guest-{Cart.objects.count()}'
+        )
+        if with_item:
+            CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+        Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now() - age)
+        return cart
+
+    def remaining(self, *carts):
+        return set(Cart.objects.filter(pk__in=[cart.pk for cart in carts]).values_list('pk', flat=True))
+
+    def test_deletes_stale_guest_carts_only(self):
+        User = get_user_model()
+        empty_old = self.cart(EMPTY_CART_GRACE + timedelta(minutes=5))
+        empty_new = self.cart(EMPTY_CART_GRACE - timedelta(minutes=5))
+        expired = self.cart(self.ttl + timedelta(hours=1), with_item=True)
+        active = self.cart(self.ttl - timedelta(hours=1), with_item=True)
+        user_empty = self.cart(
+            self.ttl * 2, user=User.objects.create(email='a@example.com', phone='01111111111')
+        )
+        user_full = self.cart(
+            self.ttl * 2, with_item=True,
+            user=User.objects.create(email='b@example.com', phone='01111111112')
+        )
+
+        stats = delete_stale_carts()
+        self.assertEqual(
+            self.remaining(empty_old, empty_new, expired, active, user_empty, user_full),
+            {empty_new.pk, active.pk, user_empty.pk, user_full.pk}
+        )
+        self.assertEqual((stats['carts'], stats['items'], stats['batches']), (2, 1, 1))
+        self.assertEqual(user_full.items.count(), 1)
+
+    def test_batches_cross_the_batch_size(self):
+        stale = [self.cart(EMPTY_CART_GRACE + timedelta(minutes=minutes)) for minutes in range(5)]
+        kept = self.cart(timedelta(minutes=5))
+        stats = delete_stale_carts(batch_size=2)
+        self.assertEqual((stats['carts'], stats['batches']), (5, 3))
+        self.assertEqual(self.remaining(*stale, kept), {kept.pk})
+
+    def test_batches_of_exactly_batch_size(self):
+        stale = [
+            self.cart(self.ttl + timedelta(minutes=minutes), with_item=True) for minutes in range(4)
+        ]
+        stats = delete_stale_carts(batch_size=2)
+        self.assertEqual((stats['carts'], stats['items'], stats['batches']), (4, 4, 2))
+        self.assertEqual(self.remaining(*stale), set())
+
+    def test_watermark_counts_deleted_carts(self):
+        for _ in range(3):
+            self.cart(EMPTY_CART_GRACE * 2)
+        delete_stale_carts()
+        self.assertEqual(JobWatermark.objects.get(name='cart_gc').processed, 3)
+        self.cart(EMPTY_CART_GRACE * 2)
+        delete_stale_carts()
+        delete_stale_carts()
+        self.assertEqual(JobWatermark.objects.get(name='cart_gc').processed, 4)
+
+
+class NewGuestCartTests(TestCase):
+
+    def test_current_cart_without_session_key_stores_nothing(self):
+        client = APIClient()
+        with self.assertNumQueries(0):
+            response = client.get('/api/orders/cart/current/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['items'], [])
+        self.assertTrue(response.json()['session_key'])
+        self.assertFalse(Cart.objects.exists())
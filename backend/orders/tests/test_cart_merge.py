@@ -0,0 +1,178 @@
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from orders.cart_store import DatabaseCartStore, RedisCartStore
+from orders.models import Cart, CartItem
+from products.models import Category, Product, ProductColor
+
+
+class LoginMergeTests(TestCase):
+    session_key = 'guest-session'
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Fans')
+        cls.fan, cls.heater, cls.lamp, cls.gone, cls.kettle = (
+            Product.objects.create(name=name, price=Decimal('100'), category=category)
+            for name in ('Fan', 'Heater', 'Lamp', 'Gone', 'Kettle')
+        )
+        cls.black, cls.red = (
+            ProductColor.objects.create(
+                product=product, name=name, hex_value='#000000', price=Decimal('120'), quantity=5
+            )
+            for product, name in ((cls.fan, 'Black'), (cls.kettle, 'Red'))
+        )
+        cls.user = get_user_model().objects.create(email='buyer@example.com', phone='01111111111')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=self.fan, color=self.black, quantity=1),
+            CartItem(cart=cart, product=self.heater, quantity=1),
+            CartItem(cart=cart, product=self.kettle, quantity=1),
+        ])
+
+    def use_store(self, store):
+        patcher = mock.patch('orders.cart_store._cart_store', store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def user_lines(self):
+        return {
+            (product_id, color_id): quantity
+            for product_id, color_id, quantity in CartItem.objects.filter(
+                cart__user=self.user
+            ).values_list('product_id', 'color_id', 'quantity')
+        }
+
+    def check_store(self, store):
+        self.use_store(store)
+        for product, color, quantity in (
+            (self.fan, self.black, 2),
+            (self.heater, None, 3),
+            (self.lamp, None, 1),
+            (self.gone, None, 1),
+            (self.kettle, self.red, 2),
+        ):
+            store.add_item(self.session_key, product, color, quantity)
+        # Keep a SQL copy of the Redis cart, which the merge must drop too
+        store.persist_changed(100)
+        self.gone.delete()
+        self.red.delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(f'/api/orders/cart/current/?session_key={self.session_key}')
+        self.assertEqual(response.status_code, 200, response.content)
+        expected = {
+            (self.fan.pk, self.black.pk): 3,
+            (self.heater.pk, None): 4,
+            (self.lamp.pk, None): 1,
+            # The deleted color falls back to the colorless line
+            (self.kettle.pk, None): 3,
+        }
+        self.assertEqual(self.user_lines(), expected)
+        self.assertEqual(
+            sorted(item['quantity'] for item in response.json()['items']), sorted(expected.values())
+        )
+        self.assertEqual(store.get_lines(self.session_key), {})
+        self.assertFalse(Cart.objects.filter(session_key=self.session_key).exists())
+
+    def test_database_store(self):
+        self.check_store(DatabaseCartStore())
+
+    def test_redis_store(self):
+        self.check_store(RedisCartStore(url=''))
+
+    def test_nothing_to_merge(self):
+        self.use_store(RedisCartStore(url=''))
+        before = self.user_lines()
+        response = self.client.get(f'/api/orders/cart/current/?session_key={self.session_key}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.user_lines(), before)
+
+
+class MergeDuplicateCartsMigrationTests(TransactionTestCase):
+    migrate_from = [('orders', '0005_order_updated_index')]
+    migrate_to = [('orders', '0006_cart_uniqueness')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        # Other apps stay at their latest migrations
+        state = self.migrate_from + [
+            node for node in executor.loader.graph.leaf_nodes() if node[0] != 'orders'
+        ]
+        self.apps = executor.loader.project_state(state).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_folds_duplicates_into_the_newest_cart(self):
+        User = self.apps.get_model('users', 'User')
+        Category = self.apps.get_model('products', 'Category')
+        Product = self.apps.get_model('products', 'Product')
+        ProductColor = self.apps.get_model('products', 'ProductColor')
+        Cart = self.apps.get_model('orders', 'Cart')
+        CartItem = self.apps.get_model('orders', 'CartItem')
+
+        category = Category.objects.create(name='Fans')
+        fan, heater, lamp = (
+            Product.objects.create(name=name, price=Decimal('100'), category=category)
+            for name in ('Fan', 'Heater', 'Lamp')
+        )
+        black = ProductColor.objects.create(
+            product=fan, name='Black', hex_value='#000000', price=Decimal('120'), quantity=5
+        )
+        user = User.objects.create(email='buyer@example.com', phone='01111111111')
+        now = timezone.now()
+
+        def cart(age, lines, **owner):
+            created = Cart.objects.create(**owner)
+            Cart.objects.filter(pk=created.pk).update(updated_at=now - timedelta(hours=age))
+            for product, color, quantity in lines:
+                CartItem.objects.create(cart=created, product=product, color=color, quantity=quantity)
+            return created
+
+        user_newest = cart(0, [(fan, black, 1), (heater, None, 1)], user=user)
+        cart(2, [(fan, black, 2), (lamp, None, 1)], user=user)
+        cart(1, [(heater, None, 3), (heater, None, 1)], user=user)
+        guest_newest = cart(0, [(lamp, None, 1)], session_key='guest')
+        cart(5, [(lamp, None, 2), (fan, None, 4)], session_key='guest')
+        single = cart(0, [(fan, None, 1), (fan, None, 2)], session_key='other')
+
+        migration = import_module('orders.migrations.0006_cart_uniqueness')
+        migration.merge_duplicate_carts(self.apps, None)
+
+        def lines(kept):
+            return {
+                (product_id, color_id): quantity
+                for product_id, color_id, quantity in CartItem.objects.filter(
+                    cart=kept
+                ).values_list('product_id', 'color_id', 'quantity')
+            }
+
+        self.assertEqual(
+            list(Cart.objects.filter(user=user).values_list('pk', flat=True)), [user_newest.pk]
+        )
+        self.assertEqual(lines(user_newest), {
+            (fan.pk, black.pk): 3, (heater.pk, None): 5, (lamp.pk, None): 1,
+        })
+        self.assertEqual(
+            list(Cart.objects.filter(session_key='guest').values_list('pk', flat=True)),
+            [guest_newest.pk]
+        )
+        self.assertEqual(lines(guest_newest), {(lamp.pk, None): 3, (fan.pk, None): 4})
+        self.assertEqual(lines(single), {(fan.pk, None): 3})
+
+        # The constraints the migration adds now hold
+        MigrationExecutor(connection).migrate(self.migrate_to)
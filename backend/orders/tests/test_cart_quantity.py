@@ -0,0 +1,70 @@
+from decimal import Decimal
+from unittest import mock
+from django.test import TestCase
+from rest_framework.test import APIClient
+from orders.cart_store import DatabaseCartStore, RedisCartStore
+from products.models import Category, Product
+
+
+class GuestCartQuantityTests(TestCase):
+    session_key = 'guest-session'
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Fans')
+        cls.product = Product.objects.create(name='Desk fan', price=Decimal('100'), category=category)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def use_store(self, store):
+        patcher = mock.patch('orders.cart_store._cart_store', store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def url(self, path):
+        return f'/api/orders/{path}?session_key={self.session_key}'
+
+    def add_item(self):
+        response = self.client.post(
+            self.url('cart-items/add_to_cart/'), {'product_id': self.product.pk, 'quantity': 1},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['items'][0]['id']
+
+    def update_quantity(self, item_id, quantity):
+        return self.client.patch(
+            self.url('cart-items/update_quantity/'),
+            {'cartitem_id': item_id, 'quantity': quantity}, format='json'
+        )
+
+    def cart_quantities(self):
+        response = self.client.get(self.url('cart/current/'))
+        self.assertEqual(response.status_code, 200, response.content)
+        return [item['quantity'] for item in response.json()['items']]
+
+    def check_store(self, store):
+        self.use_store(store)
+        item_id = self.add_item()
+        for quantity in ('2.5', 2.5, 'abc', -1, None, [3]):
+            with self.subTest(quantity=quantity):
+                response = self.update_quantity(item_id, quantity)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('quantity', response.json())
+        self.assertEqual(self.cart_quantities(), [1])
+
+        response = self.update_quantity('abc', 2)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cartitem_id', response.json())
+
+        self.assertEqual(self.update_quantity(item_id, '3').status_code, 200)
+        self.assertEqual(self.cart_quantities(), [3])
+        self.assertEqual(self.update_quantity(item_id, 0).status_code, 200)
+        self.assertEqual(self.cart_quantities(), [])
+
+    def test_redis_store(self):
+        self.check_store(RedisCartStore(url=''))
+
+    def test_database_store(self):
+        self.check_store(DatabaseCartStore())
@@ -0,0 +1,142 @@
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+from orders.cart_store import DatabaseCartStore, RedisCartStore
+from orders.models import Cart, CartItem
+from products.models import Category, Product, ProductColor
+
+
+LINE_COUNTS = (1, 5, 15)
+
+
+class CartQueryCountTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Fans')
+        cls.products = []
+        cls.colors = {}
+        # Even-numbered products have a color, so every cart has a line with
+        # one and the color read always runs
+        for number in range(max(LINE_COUNTS)):
+            product = Product.objects.create(
+                name=f'Fan {number}', price=Decimal('100'), category=category
+            )
+            cls.products.append(product)
+            if number % 2 == 0:
+                cls.colors[product.pk] = cls.create_color(product)
+        # Added by add_to_cart, never in a cart beforehand
+        cls.extra = Product.objects.create(name='Heater', price=Decimal('300'), category=category)
+        cls.colors[cls.extra.pk] = cls.create_color(cls.extra)
+
+    @classmethod
+    def create_color(cls, product):
+        return ProductColor.objects.create(
+            product=product, name='Black', hex_value='#000000', price=Decimal('120'), quantity=10
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def lines(self, count):
+        return [(product, self.colors.get(product.pk)) for product in self.products[:count]]
+
+    def request(self, expected_queries, method, path, data=None):
+        with self.assertNumQueries(expected_queries):
+            response = getattr(self.client, method)(path, data, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def check_query_counts(self, fill_cart, expected_queries):
+        """
+        Read and change carts of each size in LINE_COUNTS; ``fill_cart(count)``
+        fills a new cart and returns the query string addressing it.
+        """
+        for line_count in LINE_COUNTS:
+            with self.subTest(lines=line_count):
+                query = fill_cart(line_count)
+                cart = self.request(
+                    expected_queries['current'], 'get', f'/api/orders/cart/current/{query}'
+                )
+                self.assertEqual(len(cart['items']), line_count)
+                item_id = cart['items'][0]['id']
+
+                cart = self.request(
+                    expected_queries['add_to_cart'], 'post',
+                    f'/api/orders/cart-items/add_to_cart/{query}',
+                    {
+                        'product_id': self.extra.pk, 'color_id': self.colors[self.extra.pk].pk,
+                        'quantity': 1,
+                    }
+                )
+                self.assertEqual(len(cart['items']), line_count + 1)
+
+                cart = self.request(
+                    expected_queries['update_quantity'], 'patch',
+                    f'/api/orders/cart-items/update_quantity/{query}',
+                    {'cartitem_id': item_id, 'quantity': 3}
+                )
+                self.assertEqual(
+                    [item['quantity'] for item in cart['items'] if item['id'] == item_id], [3]
+                )
+
+                cart = self.request(
+                    expected_queries['remove_from_cart'], 'post',
+                    f'/api/orders/cart-items/remove_from_cart/{query}', {'cartitem_id': item_id}
+                )
+                self.assertEqual(len(cart['items']), line_count)
+                self.assertNotIn(item_id, [item['id'] for item in cart['items']])
+
+
+class UserCartQueryTests(CartQueryCountTestCase):
+    # Whatever the number of cart lines
+    expected_queries = {'current': 2, 'add_to_cart': 9, 'update_quantity': 5, 'remove_from_cart': 5}
+
+    def fill_cart(self, line_count):
+        user = get_user_model().objects.create(
+            email=f'buyer{line_count}@example.com', phone=f'0111111{line_count:04}'
+        )
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=product, color=color, quantity=2)
+            for product, color in self.lines(line_count)
+        ])
+        self.client.force_authenticate(user)
+        return ''
+
+    def test_query_count_is_constant(self):
+        self.check_query_counts(self.fill_cart, self.expected_queries)
+
+
+class GuestCartQueryTests(CartQueryCountTestCase):
+    # Whatever the number of cart lines; the Redis store writes lines to
+    # Redis and only reads products and colors from SQL
+    expected_queries = {
+        DatabaseCartStore: {
+            'current': 2, 'add_to_cart': 9, 'update_quantity': 5, 'remove_from_cart': 5,
+        },
+        RedisCartStore: {
+            'current': 2, 'add_to_cart': 6, 'update_quantity': 2, 'remove_from_cart': 2,
+        },
+    }
+
+    def check_store(self, store):
+        patcher = mock.patch('orders.cart_store._cart_store', store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        def fill_cart(line_count):
+            session_key = f'guest-{line_count}'
+            for product, color in self.lines(line_count):
+                store.add_item(session_key, product, color, 2)
+            return f'?session_key={session_key}'
+
+        self.check_query_counts(fill_cart, self.expected_queries[type(store)])
+
+    def test_database_store(self):
+        self.check_store(DatabaseCartStore())
+
+    def test_redis_store(self):
+        self.check_store(RedisCartStore(url=''))
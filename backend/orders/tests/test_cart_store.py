@@ -0,0 +1,67 @@
+from decimal import Decimal
+from unittest import mock
+from django.db import transaction
+from django.test import TestCase
+from orders.cart_store import RedisCartStore
+from orders.models import Cart
+from products.models import Category, Product
+
+
+class RedisWriteBehindTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Fans')
+        cls.product = Product.objects.create(name='Desk fan', price=Decimal('100'), category=category)
+
+    def setUp(self):
+        self.store = RedisCartStore(url='')
+
+    def fill(self, *session_keys):
+        for session_key in session_keys:
+            self.store.add_item(session_key, self.product, None, 1)
+
+    def changed(self):
+        """Session keys still marked as changed, taking them off the mark."""
+        return set(self.store.client.spop(self.store.changed_key, 100))
+
+    def test_committed_write_unmarks_the_cart(self):
+        self.fill('guest')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.store.materialize('guest')
+        self.assertEqual(self.changed(), set())
+        self.assertTrue(Cart.objects.filter(session_key='guest').exists())
+
+    def test_rolled_back_write_keeps_the_mark(self):
+        self.fill('guest')
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    self.store.materialize('guest')
+                    raise RuntimeError
+        self.assertFalse(Cart.objects.filter(session_key='guest').exists())
+        self.assertEqual(self.changed(), {'guest'})
+
+    def test_cart_changed_before_commit_keeps_the_mark(self):
+        self.fill('guest')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.store.materialize('guest')
+            self.fill('guest')
+        self.assertEqual(self.changed(), {'guest'})
+
+    def test_failed_batch_puts_back_unwritten_carts(self):
+        session_keys = ['first', 'second', 'third']
+        self.fill(*session_keys)
+        materialize = self.store.materialize
+        written = []
+
+        def fail_second(session_key):
+            if written:
+                raise RuntimeError
+            written.append(materialize(session_key))
+
+        with mock.patch.object(self.store, 'materialize', side_effect=fail_second):
+            with self.assertRaises(RuntimeError):
+                self.store.persist_changed(10)
+        self.assertEqual(len(written), 1)
+        self.assertEqual(self.changed(), set(session_keys) - {written[0].session_key})
@@ -0,0 +1,130 @@
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+from orders.cart_store import DatabaseCartStore, RedisCartStore
+from orders.models import Cart, CartItem, Order
+from products.models import Category, Product, ProductColor
+
+
+CHECKOUT_DATA = {
+    'first_name': 'Sara', 'second_name': 'Adel', 'phone': '01000000000',
+    'city': 'Cairo', 'region': 'Nasr City', 'address': '1 Main St',
+    'shipping_address': '1 Main St', 'payment_method': 'Cash',
+}
+LINE_COUNTS = (1, 5, 15)
+
+
+class CheckoutTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Fans')
+        cls.products = []
+        cls.colors = {}
+        for number in range(max(LINE_COUNTS)):
+            product = Product.objects.create(
+                name=f'Fan {number}', price=Decimal('100'), category=category
+            )
+            cls.products.append(product)
+            if number % 2 == 0:
+                cls.colors[product.pk] = ProductColor.objects.create(
+                    product=product, name='Black', hex_value='#000000',
+                    price=Decimal('120'), quantity=10,
+                )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def use_store(self, store):
+        patcher = mock.patch('orders.cart_store._cart_store', store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def lines(self, count):
+        return [(product, self.colors.get(product.pk)) for product in self.products[:count]]
+
+    def checkout(self, data=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/orders/checkout/', {**CHECKOUT_DATA, **(data or {})}, format='json'
+            )
+        return response
+
+    def assertOrderPlaced(self, response, line_count):
+        self.assertEqual(response.status_code, 201, response.content)
+        rendered = response.json()['order']
+        order = Order.objects.get(pk=rendered['id'])
+        self.assertEqual(order.items.count(), line_count)
+        self.assertEqual(
+            [item['id'] for item in rendered['items']],
+            list(order.items.order_by('pk').values_list('pk', flat=True))
+        )
+        self.assertEqual([entry['status'] for entry in rendered['timeline']], ['pending'])
+        subtotal = sum(
+            (color.price if color else product.price) * 2
+            for product, color in self.lines(line_count)
+        )
+        self.assertEqual(Decimal(rendered['subtotal']), subtotal)
+        self.assertEqual(order.subtotal, subtotal)
+        return order
+
+
+class UserCheckoutTests(CheckoutTestCase):
+    # Whatever the number of cart lines
+    expected_queries = 8
+
+    def test_query_count_is_constant(self):
+        for line_count in LINE_COUNTS:
+            with self.subTest(lines=line_count):
+                user = get_user_model().objects.create(
+                    email=f'buyer{line_count}@example.com', phone=f'0111111{line_count:04}'
+                )
+                cart = Cart.objects.create(user=user)
+                CartItem.objects.bulk_create([
+                    CartItem(cart=cart, product=product, color=color, quantity=2)
+                    for product, color in self.lines(line_count)
+                ])
+                self.client.force_authenticate(user)
+                with self.assertNumQueries(self.expected_queries):
+                    response = self.checkout()
+                order = self.assertOrderPlaced(response, line_count)
+                self.assertEqual(order.user, user)
+                self.assertFalse(cart.items.exists())
+
+
+class GuestCheckoutTests(CheckoutTestCase):
+    # Whatever the number of cart lines; the Redis store first writes the
+    # cart to its SQL row
+    expected_queries = {DatabaseCartStore: 9, RedisCartStore: 14}
+
+    def check_store(self, store):
+        self.use_store(store)
+        for line_count in LINE_COUNTS:
+            with self.subTest(lines=line_count):
+                session_key = f'guest-{line_count}'
+                for product, color in self.lines(line_count):
+                    store.add_item(session_key, product, color, 2)
+                with self.assertNumQueries(self.expected_queries[type(store)]):
+                    response = self.checkout({'session_key': session_key})
+                self.assertOrderPlaced(response, line_count)
+                self.assertEqual(store.get_lines(session_key), {})
+
+    def test_database_store(self):
+        self.check_store(DatabaseCartStore())
+
+    def test_redis_store(self):
+        self.check_store(RedisCartStore(url=''))
+
+    def test_rolled_back_order_keeps_the_cart(self):
+        store = RedisCartStore(url='')
+        self.use_store(store)
+        for product, color in self.lines(3):
+            store.add_item('guest', product, color, 2)
+        lines = store.get_lines('guest')
+        with mock.patch('orders.views.OrderSerializer', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.checkout({'session_key': 'guest'})
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(store.get_lines('guest'), lines)
@@ -1,18 +1,58 @@
+from functools import partial
 from rest_framework import viewsets, generics, status, permissions
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from django.utils.crypto import get_random_string
 from django.db import transaction
 from django.utils import timezone
+from .cart_store import (
+    GuestCart, add_cart_item, get_cart_store, merge_cart_lines, prefetch_cart_items,
+    set_cart_item_quantity, valid_lines
+)
 from .models import Cart, CartItem, Order, OrderItem, OrderTimeline
 from .serializers import (
-    CartSerializer, CartItemSerializer, OrderSerializer,
+    CartSerializer, CartItemSerializer, CartItemQuantitySerializer, OrderSerializer,
     CheckoutSerializer, DirectBuySerializer
 )
 from products.models import Product, ProductColor
+from rafal_backend.pagination import KeysetPageNumberPagination
+from rafal_backend.sparse import SparseFieldset
+
+
+class CartOwnerMixin:
+    """
+    Signed-in users' carts are Cart rows; guests' carts live in the cart
+    store (orders.cart_store) under the ``session_key`` query parameter.
+    """
+    
+    def get_session_key(self):
+        """The guest's session key; without one, a new key starts a new cart."""
+        if not hasattr(self, 'session_key'):
+            self.session_key = (
+                self.request.query_params.get('session_key') or get_random_string(length=32)
+            )
+        return self.session_key
+    
+    def get_user_cart(self):
+        cart, _ = Cart.objects.get_or_create(user=self.request.user)
+        return cart
+    
+    def load_cart(self):
+        """The request's cart, with its items loaded for CartSerializer."""
+        fieldset = SparseFieldset.from_request(self.request)
+        if self.request.user.is_authenticated:
+            return prefetch_cart_items(self.get_user_cart(), fieldset)
+        if (
+            self.request.method in permissions.SAFE_METHODS
+            and not self.request.query_params.get('session_key')
+        ):
+            # A new guest: nothing is stored until the first item is added
+            return GuestCart(self.get_session_key())
+        return get_cart_store().load(self.get_session_key(), fieldset)
 
 
-class CartViewSet(viewsets.ModelViewSet):
+class CartViewSet(CartOwnerMixin, viewsets.ModelViewSet):
     serializer_class = CartSerializer
     permission_classes = [permissions.AllowAny]
     
@@ -26,57 +66,43 @@ class CartViewSet(viewsets.ModelViewSet):
             return Cart.objects.filter(session_key=session_key)
         return Cart.objects.none()
     
-    def get_object(self):
-        user = self.request.user
+    def get_user_cart(self):
+        cart, created = Cart.objects.get_or_create(user=self.request.user)
         session_key = self.request.query_params.get('session_key')
         
-        # Try to get cart by user or session key
-        if user.is_authenticated:
-            cart, created = Cart.objects.get_or_create(user=user)
-            
-            # If we have a session key and a new cart was not created,
-            # merge any existing session cart with the user's cart
-            if session_key and not created:
-                self.merge_carts(session_key, cart)
-                
-            return cart
-        elif session_key:
-            cart, _ = Cart.objects.get_or_create(session_key=session_key)
-            return cart
-        
-        # If no user or session key, create a new cart with a new session key
-        new_session_key = get_random_string(length=32)
-        cart = Cart.objects.create(session_key=new_session_key)
+        # If we have a session key and a new cart was not created,
+        # merge any existing session cart with the user's cart
+        if session_key and not created:
+            self.merge_carts(session_key, cart)
         return cart
     
+    def get_object(self):
+        return self.load_cart()
+    
     def merge_carts(self, session_key, user_cart):
-        """Merge items from session cart into user cart"""
-        try:
-            session_cart = Cart.objects.get(session_key=session_key)
-            
-            # Transfer items from session cart to user cart
-            for item in session_cart.items.all():
-                # Check if this product+color combo already exists in user cart
-                existing_item = CartItem.objects.filter(
-                    cart=user_cart,
-                    product=item.product,
-                    color=item.color
-                ).first()
-                
-                if existing_item:
-                    # Update quantity of existing item
-                    existing_item.quantity += item.quantity
-                    existing_item.save()
-                else:
-                    # Create new item in user cart
-                    item.pk = None  # Create a new instance
-                    item.cart = user_cart
-                    item.save()
-            
-            # Delete the session cart
-            session_cart.delete()
-        except Cart.DoesNotExist:
-            pass
+        """
+        Move the guest cart's lines into the user's cart, adding quantities
+        of lines both have, then drop the guest cart; a fixed number of
+        statements in one transaction, whatever the cart sizes.
+        """
+        store = get_cart_store()
+        lines = valid_lines(store.get_lines(session_key))
+        if not lines:
+            return
+        with transaction.atomic():
+            merge_cart_lines(user_cart, lines)
+            store.delete(session_key)
+    
+    def perform_update(self, serializer):
+        if isinstance(serializer.instance, GuestCart):
+            raise ValidationError({'session_key': 'A guest cart keeps its session key.'})
+        serializer.save()
+    
+    def perform_destroy(self, instance):
+        if isinstance(instance, GuestCart):
+            get_cart_store().clear(instance.session_key)
+        else:
+            instance.delete()
     
     @action(detail=False, methods=['get'])
     def current(self, request):
@@ -86,55 +112,50 @@ class CartViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['post'])
     def clear(self, request, pk=None):
-        cart = self.get_object()
-        cart.items.all().delete()
-        serializer = self.get_serializer(cart)
+        if request.user.is_authenticated:
+            self.get_user_cart().items.all().delete()
+        elif request.query_params.get('session_key'):
+            get_cart_store().clear(self.get_session_key())
+        serializer = self.get_serializer(self.get_object())
         return Response(serializer.data)
 
 
-class CartItemViewSet(viewsets.ModelViewSet):
+class CartItemViewSet(CartOwnerMixin, viewsets.ModelViewSet):
     serializer_class = CartItemSerializer
+    # Guests call these with their session_key; the other routes need a signed-in user
+    guest_actions = ('add_to_cart', 'remove_from_cart', 'update_quantity')
     
-    def get_queryset(self):
-        cart = self.get_cart()
-        return CartItem.objects.filter(cart=cart)
+    def get_permissions(self):
+        if self.action in self.guest_actions:
+            return [permissions.AllowAny()]
+        return super().get_permissions()
     
-    def get_cart(self):
-        user = self.request.user
-        session_key = self.request.query_params.get('session_key')
-        
-        if user.is_authenticated:
-            cart, _ = Cart.objects.get_or_create(user=user)
-            return cart
-        elif session_key:
-            cart, _ = Cart.objects.get_or_create(session_key=session_key)
-            return cart
-        
-        # If no user or session key, create a new cart with a new session key
-        new_session_key = get_random_string(length=32)
-        cart = Cart.objects.create(session_key=new_session_key)
-        return cart
+    def get_queryset(self):
+        return CartItem.objects.filter(cart=self.get_user_cart())
     
     def perform_create(self, serializer):
-        cart = self.get_cart()
         product_id = serializer.validated_data['product_id']
         color_id = serializer.validated_data.get('color_id')
-        quantity = serializer.validated_data.get('quantity', 1)
+        quantity = serializer.validated_data['quantity']
         
         product = Product.objects.get(id=product_id)
         color = None
         if color_id:
             color = ProductColor.objects.get(id=color_id, product=product)
         
-        # Check if this product+color combo already exists in cart
-        try:
-            cart_item = CartItem.objects.get(cart=cart, product=product, color=color)
-            # Update quantity
-            cart_item.quantity += quantity
-            cart_item.save()
-        except CartItem.DoesNotExist:
-            # Create new cart item
-            serializer.save(cart=cart, product=product, color=color)
+        if self.request.user.is_authenticated:
+            serializer.instance = add_cart_item(self.get_user_cart(), product, color, quantity)
+        else:
+            get_cart_store().add_item(self.get_session_key(), product, color, quantity)
+    
+    def set_item_quantity(self, item_id, quantity):
+        """Set a cart item's quantity, removing it at zero; False if not in the cart."""
+        if self.request.user.is_authenticated:
+            return set_cart_item_quantity(self.get_user_cart(), item_id, quantity)
+        return get_cart_store().set_quantity(self.get_session_key(), item_id, quantity)
+    
+    def cart_response(self):
+        return Response(CartSerializer(self.load_cart()).data)
     
     @action(detail=False, methods=['post'])
     def add_to_cart(self, request):
@@ -143,59 +164,56 @@ class CartItemViewSet(viewsets.ModelViewSet):
         self.perform_create(serializer)
         
         # Return the updated cart
-        cart = self.get_cart()
-        cart_serializer = CartSerializer(cart)
-        return Response(cart_serializer.data)
+        return self.cart_response()
     
     @action(detail=False, methods=['post'])
     def remove_from_cart(self, request):
-        cart = self.get_cart()
-        item_id = request.data.get('cartitem_id')
+        serializer = CartItemQuantitySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        item_id = serializer.validated_data['cartitem_id']
         
-        try:
-            cart_item = CartItem.objects.get(id=item_id, cart=cart)
-            cart_item.delete()
-            
-            # Return the updated cart
-            cart_serializer = CartSerializer(cart)
-            return Response(cart_serializer.data)
-        except CartItem.DoesNotExist:
+        if not self.set_item_quantity(item_id, 0):
             return Response(
                 {"detail": "Cart item not found."},
                 status=status.HTTP_404_NOT_FOUND
             )
+        
+        # Return the updated cart
+        return self.cart_response()
     
     @action(detail=False, methods=['patch'])
     def update_quantity(self, request):
-        cart = self.get_cart()
-        item_id = request.data.get('cartitem_id')
-        quantity = request.data.get('quantity', 1)
+        serializer = CartItemQuantitySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        item_id = serializer.validated_data['cartitem_id']
+        quantity = serializer.validated_data['quantity']
         
-        try:
-            cart_item = CartItem.objects.get(id=item_id, cart=cart)
-            
-            if quantity <= 0:
-                cart_item.delete()
-            else:
-                cart_item.quantity = quantity
-                cart_item.save()
-            
-            # Return the updated cart
-            cart_serializer = CartSerializer(cart)
-            return Response(cart_serializer.data)
-        except CartItem.DoesNotExist:
+        if not self.set_item_quantity(item_id, quantity):
             return Response(
                 {"detail": "Cart item not found."},
                 status=status.HTTP_404_NOT_FOUND
             )
+        
+        # Return the updated cart
+        return self.cart_response()
 
 
 class OrderViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPageNumberPagination
     
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).order_by('-created_at')
+        queryset = Order.objects.filter(user=self.request.user).order_by('-created_at')
+        fieldset = SparseFieldset.from_request(self.request)
+        if fieldset.includes('items'):
+            queryset = queryset.prefetch_related('items')
+        if fieldset.includes('timeline'):
+            queryset = queryset.prefetch_related('timeline')
+        deferred = self.get_serializer_class().get_deferred_columns(fieldset, keep=['created_at'])
+        if deferred:
+            queryset = queryset.defer(*deferred)
+        return queryset
 
 
 class CheckoutView(generics.GenericAPIView):
@@ -214,14 +232,16 @@ class CheckoutView(generics.GenericAPIView):
         if user:
             cart = Cart.objects.filter(user=user).first()
         elif session_key:
-            cart = Cart.objects.filter(session_key=session_key).first()
+            cart = get_cart_store().materialize(session_key)
         else:
             return Response(
                 {"detail": "No cart found. Please provide a session_key or login."},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        if not cart or cart.items.count() == 0:
+        # One query for the lines, priced in SQL, with products and colors
+        items = list(prefetch_cart_items(cart).items.all()) if cart else []
+        if not items:
             return Response(
                 {"detail": "Your cart is empty."},
                 status=status.HTTP_400_BAD_REQUEST
@@ -229,7 +249,7 @@ class CheckoutView(generics.GenericAPIView):
         
         # Calculate totals
         subtotal = cart.total
-        delivery_fee = 0 if subtotal >= 500 else 50
+        delivery_fee = cart.delivery_fee
         total = subtotal + delivery_fee
         
         # Create order
@@ -251,28 +271,38 @@ class CheckoutView(generics.GenericAPIView):
             total=total
         )
         
-        # Create order items
-        for cart_item in cart.items.all():
-            OrderItem.objects.create(
+        # Create order items, in one insert
+        order_items = OrderItem.objects.bulk_create([
+            OrderItem(
                 order=order,
                 product=cart_item.product,
                 product_name=cart_item.product.name,
-                product_price=cart_item.product.price if not cart_item.color else cart_item.color.price,
+                product_price=cart_item.unit_price,
                 color_name=cart_item.color.name if cart_item.color else '',
                 color_hex=cart_item.color.hex_value if cart_item.color else '',
                 quantity=cart_item.quantity,
                 total=cart_item.total
             )
+            for cart_item in items
+        ])
         
         # Create initial timeline entry
-        OrderTimeline.objects.create(
+        timeline = OrderTimeline.objects.create(
             order=order,
             status='pending',
             description='Order placed successfully'
         )
         
-        # Clear the cart
+        # Clear the cart; the guest's stored cart only once the order is committed
         cart.items.all().delete()
+        if not user:
+            transaction.on_commit(partial(get_cart_store().clear, session_key))
+        
+        # The response renders the rows just written instead of reading them back
+        order._prefetched_objects_cache = {
+            'items': order_items,
+            'timeline': [timeline],
+        }
         
         # Return order details
         order_serializer = OrderSerializer(order)
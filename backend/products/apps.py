@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'products'
\ No newline at end of file
+    name = 'products'
+    
+    def ready(self):
+        import products.signals
+        if settings.SUGGEST_WARM_UP:
+            from products.suggest import suggest_index
+            suggest_index.warm_up_in_background()
@@ -0,0 +1,230 @@
+"""
+Response cache for anonymous catalog reads.
+
+Every cached entry is keyed on the current catalog *generation*, a counter
+bumped by products.signals whenever catalog data changes. Bumping it makes
+all previously stored entries unreachable at once, so nothing has to be
+deleted and no entry can outlive the data it was rendered from.
+
+That only holds when every process shares the cache (Redis, Memcached,
+database): with a process-local one, a bump in one process leaves the
+entries of the others in place. The catalog caches are then bypassed
+altogether, see catalog_cache_is_shared().
+"""
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.dummy import DummyCache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils import translation
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+
+GENERATION_KEY = 'catalog:generation'
+HITS_KEY = 'catalog:stats:hits'
+MISSES_KEY = 'catalog:stats:misses'
+
+# Response headers replayed from the cache alongside the body
+REPLAYED_HEADERS = ('Vary', 'Allow', 'ETag', 'Last-Modified')
+
+# Cache backends whose entries live in the memory of a single process
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Stands in for the default cache when it is process-local: stores nothing
+_bypass_cache = DummyCache('catalog', {})
+
+
+def catalog_cache_is_shared():
+    """
+    Whether the default cache is shared by every process, so that bumping
+    the generation invalidates the catalog entries of all of them.
+    """
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+
+
+def get_catalog_cache():
+    """The cache for catalog entries: the default one if shared, else a no-op."""
+    return cache if catalog_cache_is_shared() else _bypass_cache
+
+
+def get_catalog_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Seed from the clock so a fresh counter never reuses the number of an
+        # evicted one whose entries may still be stored.
+        cache.add(GENERATION_KEY, int(time.time() * 1000), None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def bump_catalog_generation():
+    try:
+        return cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, int(time.time() * 1000), None)
+        return cache.get(GENERATION_KEY)
+
+
+_deferral = threading.local()
+
+
+def invalidate_catalog():
+    """Bump the generation once the current transaction commits."""
+    if getattr(_deferral, 'pending', None) is not None:
+        _deferral.pending = True
+        return
+    transaction.on_commit(bump_catalog_generation)
+
+
+@contextmanager
+def deferred_invalidation():
+    """
+    Collapse every invalidate_catalog() inside the block into one generation
+    bump when the outermost block exits, for bulk writes that would otherwise
+    bump it once per row. Use it outside any transaction.
+    """
+    if getattr(_deferral, 'pending', None) is not None:
+        yield
+        return
+    _deferral.pending = False
+    try:
+        yield
+    finally:
+        pending, _deferral.pending = _deferral.pending, None
+        if pending:
+            bump_catalog_generation()
+
+
+def _increment(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def record_cache_access(hit):
+    _increment(HITS_KEY if hit else MISSES_KEY)
+
+
+def get_cache_stats():
+    stats = cache.get_many([HITS_KEY, MISSES_KEY, GENERATION_KEY])
+    hits = stats.get(HITS_KEY, 0)
+    misses = stats.get(MISSES_KEY, 0)
+    return {
+        'generation': stats.get(GENERATION_KEY),
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / (hits + misses) if hits + misses else 0.0,
+    }
+
+
+def reset_cache_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+def catalog_cache_key(prefix, request, ignored_params=()):
+    """
+    Build ``<prefix>:<generation>:<language>:<digest>`` where the digest covers
+    the path and the query parameters sorted by name and value.
+    """
+    generation = get_catalog_generation()
+    params = urlencode(sorted(
+        (key, value)
+        for key in request.GET if key not in ignored_params
+        for value in request.GET.getlist(key)
+    ))
+    language = translation.get_language_from_request(request)
+    digest = hashlib.sha1(f'{request.path}?{params}'.encode()).hexdigest()
+    return f'{prefix}:{generation}:{language}:{digest}'
+
+
+def catalog_fragment_prefix(prefix, request, variant=''):
+    """
+    Build ``<prefix>:<generation>:<language>:<digest>:`` for per-object
+    entries; append the object's pk. The digest covers the host (rendered
+    URLs are absolute) and ``variant``, whatever else shapes the
+    representation.
+    """
+    generation = get_catalog_generation()
+    language = translation.get_language_from_request(request)
+    digest = hashlib.sha1(f'{request.build_absolute_uri("/")}|{variant}'.encode()).hexdigest()
+    return f'{prefix}:{generation}:{language}:{digest}:'
+
+
+class CatalogResponseCacheMixin:
+    """
+    Serve anonymous GET requests for ``cached_actions`` from the cache.
+
+    A hit replays the stored bytes without authenticating, querying or
+    serializing anything, or answers 304 when the stored validators match. A miss runs the view normally and stores the
+    rendered body of a 200 response once it has been rendered. Nothing is
+    cached when the default cache is process-local.
+    """
+    cached_actions = ()
+    response_cache_timeout = getattr(settings, 'CATALOG_CACHE_TIMEOUT', 60 * 60)
+
+    def dispatch(self, request, *args, **kwargs):
+        cache_key = self.get_response_cache_key(request)
+        if cache_key is None:
+            return super().dispatch(request, *args, **kwargs)
+
+        cached = cache.get(cache_key)
+        if cached is not None:
+            record_cache_access(hit=True)
+            headers = cached['headers']
+            not_modified = get_conditional_response(
+                request,
+                etag=headers.get('ETag'),
+                last_modified=parse_http_date_safe(headers.get('Last-Modified'))
+            )
+            if not_modified is not None:
+                return not_modified
+            response = HttpResponse(cached['content'], content_type=cached['content_type'])
+            for header, value in cached['headers'].items():
+                response[header] = value
+            return response
+
+        record_cache_access(hit=False)
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200:
+            if getattr(response, 'is_rendered', True):
+                self.store_response(cache_key, response)
+            else:
+                response.add_post_render_callback(
+                    lambda rendered: self.store_response(cache_key, rendered)
+                )
+        return response
+
+    def get_response_cache_key(self, request):
+        """Return the cache key for this request, or None if it must not be cached."""
+        if request.method != 'GET' or not catalog_cache_is_shared():
+            return None
+        action = getattr(self, 'action_map', {}).get('get')
+        if action not in self.cached_actions:
+            return None
+        if 'HTTP_AUTHORIZATION' in request.META:
+            return None
+        if 'text/html' in request.META.get('HTTP_ACCEPT', ''):
+            # Browsable API pages embed per-request forms
+            return None
+        return catalog_cache_key('catalog:response', request)
+
+    def store_response(self, cache_key, response):
+        cache.set(cache_key, {
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'headers': {
+                header: response[header]
+                for header in REPLAYED_HEADERS if response.has_header(header)
+            },
+        }, self.response_cache_timeout)
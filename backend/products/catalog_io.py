@@ -0,0 +1,453 @@
+"""
+Bulk catalog import and export, one row per product keyed by SKU.
+
+Columns::
+
+    sku, name, description, price, original_price, category (id), image,
+    is_active, is_featured, is_best_seller, is_offer, in_stock,
+    stock_quantity, weight, dimensions, warranty, brand,
+    colors    [{"name", "hex_value", "price", "old_price", "quantity", "is_active"}]
+    features  ["feature", ...]          in display order
+    tags      ["tag name", ...]
+    images    ["products/gallery/a.jpg", ...]  gallery file names, in order
+
+JSONL rows carry the lists as JSON arrays, CSV rows as JSON text in the cell.
+On import a missing key (or an empty CSV cell for a list) leaves the stored
+value alone, so partial files such as ``sku,price`` update just that column.
+"""
+import csv
+import json
+import sys
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import partial
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models.fields.files import FieldFile
+from django.utils import timezone
+from django.utils.text import slugify
+from rafal_backend.images import generate_image_variants_batch, send_variant_task
+from .models import Category, Product, ProductColor, ProductFeature, ProductImage, ProductTag
+from .search import get_search_backend
+
+
+PRODUCT_FIELDS = (
+    'name', 'description', 'price', 'original_price', 'category', 'image',
+    'is_active', 'is_featured', 'is_best_seller', 'is_offer', 'in_stock',
+    'stock_quantity', 'weight', 'dimensions', 'warranty', 'brand',
+)
+REQUIRED_FIELDS = ('name', 'price', 'category', 'image')
+COLOR_FIELDS = ('name', 'hex_value', 'price', 'old_price', 'quantity', 'is_active')
+LIST_FIELDS = ('colors', 'features', 'tags', 'images')
+COLUMNS = ('sku',) + PRODUCT_FIELDS + LIST_FIELDS
+FORMATS = ('csv', 'jsonl')
+
+TRUE_VALUES = ('true', 't', '1', 'yes')
+FALSE_VALUES = ('false', 'f', '0', 'no')
+
+
+def guess_format(path):
+    if path.endswith('.csv'):
+        return 'csv'
+    if path.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return None
+
+
+@contextmanager
+def open_stream(path, mode):
+    """Open ``path`` as UTF-8 text, ``-`` meaning stdin or stdout."""
+    if path == '-':
+        yield sys.stdin if 'r' in mode else sys.stdout
+        return
+    with open(path, mode, encoding='utf-8', newline='') as stream:
+        yield stream
+
+
+def read_rows(stream, fmt, on_error=None):
+    """
+    Yield ``(line number, row)`` pairs without reading the whole file. Rows
+    holding invalid JSON are passed to ``on_error(line, message)`` and
+    skipped.
+    """
+    on_error = on_error or (lambda line, message: None)
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            try:
+                for field in LIST_FIELDS:
+                    cell = row.pop(field, None)
+                    if cell:
+                        row[field] = json.loads(cell)
+            except ValueError as exc:
+                on_error(reader.line_num, {field: [f'Invalid JSON: {exc}']})
+                continue
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                on_error(line_number, {'row': [f'Invalid JSON: {exc}']})
+                continue
+            yield line_number, row
+
+
+class RowWriter:
+    def __init__(self, stream, fmt):
+        self.stream = stream
+        self.fmt = fmt
+        if fmt == 'csv':
+            self.writer = csv.DictWriter(stream, fieldnames=COLUMNS)
+            self.writer.writeheader()
+
+    def write(self, row):
+        if self.fmt == 'csv':
+            self.writer.writerow({
+                key: json.dumps(value, ensure_ascii=False, default=str) if key in LIST_FIELDS else value
+                for key, value in row.items()
+            })
+        else:
+            self.stream.write(json.dumps(row, ensure_ascii=False, default=str) + '\n')
+
+
+def export_queryset():
+    return Product.objects.order_by('pk').prefetch_related(
+        'colors', 'features', 'tags', 'images'
+    )
+
+
+def product_row(product):
+    """Export row of a product fetched with export_queryset()."""
+    row = {'sku': product.sku}
+    for name in PRODUCT_FIELDS:
+        value = getattr(product, 'category_id' if name == 'category' else name)
+        row[name] = value.name if isinstance(value, FieldFile) else value
+    row['colors'] = [
+        {field: getattr(color, field) for field in COLOR_FIELDS}
+        for color in product.colors.all()
+    ]
+    row['features'] = [
+        feature.feature for feature in sorted(product.features.all(), key=lambda f: f.order)
+    ]
+    row['tags'] = sorted(tag.name for tag in product.tags.all())
+    row['images'] = [
+        image.image.name for image in sorted(product.images.all(), key=lambda i: i.order)
+    ]
+    return row
+
+
+def clean_value(model, name, value):
+    """Convert an imported value with the model field, raising ValidationError."""
+    field = model._meta.get_field(name)
+    if isinstance(value, str) and not isinstance(field, (models.CharField, models.TextField)):
+        value = value.strip()
+        if value == '':
+            value = None
+        elif isinstance(field, models.BooleanField):
+            lowered = value.lower()
+            if lowered in TRUE_VALUES:
+                value = True
+            elif lowered in FALSE_VALUES:
+                value = False
+    if isinstance(field, models.FileField):
+        if not value:
+            raise ValidationError({name: ['This field cannot be blank.']})
+        return str(value)
+    if isinstance(field, models.ForeignKey):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise ValidationError({name: [f'"{value}" is not a valid id.']})
+    if value is None and not field.null:
+        raise ValidationError({name: ['This field cannot be null.']})
+    try:
+        return field.clean(value, None)
+    except ValidationError as exc:
+        raise ValidationError({name: exc.messages})
+
+
+class CatalogImporter:
+    """
+    Upsert rows by SKU, ``batch_size`` products per transaction.
+
+    Products are fetched per batch, then written with one bulk_create for new
+    SKUs and one bulk_update of the changed columns for existing ones (SKU is
+    not unique in the schema, so there is no conflict target for an upsert).
+    Colors are upserted on their (product, name) key; features, tags and
+    gallery images are diffed against the stored rows. Rows that fail
+    validation are reported and skipped.
+    """
+
+    def __init__(self, batch_size=1000, on_error=None):
+        self.batch_size = batch_size
+        self.on_error = on_error or (lambda line, message: None)
+        self.stats = {'rows': 0, 'created': 0, 'updated': 0, 'unchanged': 0, 'errors': 0}
+        self.search_backend = get_search_backend()
+
+    def run(self, rows):
+        batch = []
+        for line, row in rows:
+            batch.append((line, row))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        return self.stats
+
+    def error(self, line, message):
+        self.stats['errors'] += 1
+        self.on_error(line, message)
+
+    def reject(self, line, message):
+        """Report a row that could not be read at all, e.g. from read_rows()."""
+        self.stats['rows'] += 1
+        self.error(line, message)
+
+    def parse(self, row):
+        sku = (row.get('sku') or '').strip()
+        if not sku:
+            raise ValidationError({'sku': ['This field is required.']})
+        values = {
+            name: clean_value(Product, name, row[name])
+            for name in PRODUCT_FIELDS if name in row
+        }
+        if 'category' in values:
+            values['category_id'] = values.pop('category')
+        lists = {}
+        if row.get('colors') is not None:
+            lists['colors'] = [
+                {
+                    field: clean_value(ProductColor, field, color[field])
+                    for field in COLOR_FIELDS if field in color
+                }
+                for color in row['colors']
+            ]
+            for color in lists['colors']:
+                missing = {'name', 'hex_value', 'price'} - color.keys()
+                if missing:
+                    raise ValidationError({'colors': [f"Missing {', '.join(sorted(missing))}."]})
+        for name in ('features', 'tags', 'images'):
+            if row.get(name) is not None:
+                lists[name] = [str(value).strip() for value in row[name] if str(value).strip()]
+        return sku, values, lists
+
+    def import_batch(self, batch):
+        self.stats['rows'] += len(batch)
+        parsed = {}
+        for line, row in batch:
+            try:
+                sku, values, lists = self.parse(row)
+            except (ValidationError, AttributeError, TypeError, KeyError) as exc:
+                messages = exc.message_dict if isinstance(exc, ValidationError) else str(exc)
+                self.error(line, messages)
+                continue
+            # A later row for the same SKU replaces an earlier one
+            parsed[sku] = (line, values, lists)
+
+        category_ids = {
+            values['category_id'] for _, values, _ in parsed.values() if 'category_id' in values
+        }
+        categories = set(Category.objects.filter(pk__in=category_ids).values_list('pk', flat=True))
+
+        with transaction.atomic():
+            existing = {}
+            # Of duplicate SKUs already stored, the oldest product is updated
+            for product in Product.objects.filter(sku__in=parsed).order_by('-pk'):
+                existing[product.sku] = product
+
+            now = timezone.now()
+            created, changed, update_fields, lists_by_product = [], [], set(), {}
+            for sku, (line, values, lists) in parsed.items():
+                if 'category_id' in values and values['category_id'] not in categories:
+                    self.error(line, {'category': [f"No category {values['category_id']}."]})
+                    continue
+                product = existing.get(sku)
+                if product is None:
+                    missing = [name for name in REQUIRED_FIELDS
+                               if ('category_id' if name == 'category' else name) not in values]
+                    if missing:
+                        self.error(line, {name: ['This field is required.'] for name in missing})
+                        continue
+                    product = Product(sku=sku, **values)
+                    created.append(product)
+                else:
+                    fields = [
+                        name for name, value in values.items()
+                        if getattr(product, name) != value
+                    ]
+                    for name in fields:
+                        setattr(product, name, values[name])
+                    if fields:
+                        product.updated_at = now
+                        update_fields.update(fields)
+                        changed.append(product)
+                lists_by_product[sku] = (product, lists)
+
+            Product.objects.bulk_create(created, batch_size=self.batch_size)
+            if changed:
+                Product.objects.bulk_update(
+                    changed, [*update_fields, 'updated_at'], batch_size=self.batch_size
+                )
+
+            lists_by_pk = {product.pk: lists for product, lists in lists_by_product.values()}
+            touched = set()
+            touched |= self.sync_colors(lists_by_pk)
+            touched |= self.sync_features(lists_by_pk)
+            touched |= self.sync_tags(lists_by_pk)
+            touched |= self.sync_images(lists_by_pk)
+            touched -= {product.pk for product in created + changed}
+            if touched:
+                Product.objects.filter(pk__in=touched).update(updated_at=now)
+
+            if self.search_backend is not None:
+                self.search_backend.index_products(created + changed)
+            # bulk_create and bulk_update skip post_save, so queue variants here
+            fresh = created + (changed if 'image' in update_fields else [])
+            self.queue_variants(Product, [product.pk for product in fresh])
+
+        self.stats['created'] += len(created)
+        self.stats['updated'] += len(changed) + len(touched)
+        self.stats['unchanged'] += len(lists_by_product) - len(created) - len(changed) - len(touched)
+
+    def queue_variants(self, model, pks):
+        if pks:
+            transaction.on_commit(partial(
+                send_variant_task, generate_image_variants_batch, model._meta.label, 'image', pks
+            ))
+
+    def sync_colors(self, lists_by_pk):
+        wanted = {pk: lists['colors'] for pk, lists in lists_by_pk.items() if 'colors' in lists}
+        if not wanted:
+            return set()
+        stored = defaultdict(dict)
+        for color in ProductColor.objects.filter(product_id__in=wanted):
+            stored[color.product_id][color.name] = color
+
+        touched, upserts, stale = set(), [], []
+        for pk, colors in wanted.items():
+            names = {color['name'] for color in colors}
+            for color in colors:
+                current = stored[pk].get(color['name'])
+                if current is None or any(
+                    getattr(current, field) != value for field, value in color.items()
+                ):
+                    upserts.append(ProductColor(product_id=pk, **color))
+                    touched.add(pk)
+            for name, color in stored[pk].items():
+                if name not in names:
+                    stale.append(color.pk)
+                    touched.add(pk)
+
+        if upserts:
+            ProductColor.objects.bulk_create(
+                upserts, batch_size=self.batch_size, update_conflicts=True,
+                unique_fields=['product', 'name'],
+                update_fields=[field for field in COLOR_FIELDS if field != 'name'],
+            )
+        if stale:
+            ProductColor.objects.filter(pk__in=stale).delete()
+        return touched
+
+    def sync_features(self, lists_by_pk):
+        wanted = {
+            pk: {(feature, order) for order, feature in enumerate(lists['features'])}
+            for pk, lists in lists_by_pk.items() if 'features' in lists
+        }
+        if not wanted:
+            return set()
+        stored = defaultdict(dict)
+        rows = ProductFeature.objects.filter(product_id__in=wanted).values_list(
+            'pk', 'product_id', 'feature', 'order'
+        )
+        for pk, product_id, feature, order in rows:
+            stored[product_id][(feature, order)] = pk
+
+        touched, new, stale = set(), [], []
+        for pk, features in wanted.items():
+            for feature, order in features - stored[pk].keys():
+                new.append(ProductFeature(product_id=pk, feature=feature, order=order))
+                touched.add(pk)
+            for key in stored[pk].keys() - features:
+                stale.append(stored[pk][key])
+                touched.add(pk)
+
+        if stale:
+            ProductFeature.objects.filter(pk__in=stale).delete()
+        ProductFeature.objects.bulk_create(new, batch_size=self.batch_size)
+        return touched
+
+    def sync_tags(self, lists_by_pk):
+        wanted = {pk: set(lists['tags']) for pk, lists in lists_by_pk.items() if 'tags' in lists}
+        if not wanted:
+            return set()
+        names = set().union(*wanted.values())
+        ProductTag.objects.bulk_create(
+            [ProductTag(name=name, slug=slugify(name)) for name in names],
+            batch_size=self.batch_size, ignore_conflicts=True
+        )
+        tag_ids = dict(ProductTag.objects.filter(name__in=names).values_list('name', 'pk'))
+
+        Through = Product.tags.through
+        stored = defaultdict(dict)
+        rows = Through.objects.filter(product_id__in=wanted).values_list(
+            'pk', 'product_id', 'producttag_id'
+        )
+        for pk, product_id, tag_id in rows:
+            stored[product_id][tag_id] = pk
+
+        touched, new, stale = set(), [], []
+        for pk, tags in wanted.items():
+            ids = {tag_ids[name] for name in tags if name in tag_ids}
+            for tag_id in ids - stored[pk].keys():
+                new.append(Through(product_id=pk, producttag_id=tag_id))
+                touched.add(pk)
+            for tag_id in stored[pk].keys() - ids:
+                stale.append(stored[pk][tag_id])
+                touched.add(pk)
+
+        if stale:
+            Through.objects.filter(pk__in=stale).delete()
+        Through.objects.bulk_create(new, batch_size=self.batch_size)
+        return touched
+
+    def sync_images(self, lists_by_pk):
+        wanted = {pk: lists['images'] for pk, lists in lists_by_pk.items() if 'images' in lists}
+        if not wanted:
+            return set()
+        stored = defaultdict(lambda: defaultdict(list))
+        for image in ProductImage.objects.filter(product_id__in=wanted).only(
+            'pk', 'product_id', 'image', 'order'
+        ):
+            stored[image.product_id][image.image.name].append(image)
+
+        touched, new, reordered, stale = set(), [], [], []
+        for pk, names in wanted.items():
+            # The same file may appear more than once; match rows one to one
+            unused = stored[pk]
+            for order, name in enumerate(names):
+                candidates = unused[name]
+                if not candidates:
+                    new.append(ProductImage(product_id=pk, image=name, order=order))
+                    touched.add(pk)
+                    continue
+                current = next((image for image in candidates if image.order == order), candidates[0])
+                candidates.remove(current)
+                if current.order != order:
+                    current.order = order
+                    reordered.append(current)
+                    touched.add(pk)
+            for images in unused.values():
+                stale.extend(image.pk for image in images)
+                if images:
+                    touched.add(pk)
+
+        if stale:
+            ProductImage.objects.filter(pk__in=stale).delete()
+        ProductImage.objects.bulk_update(reordered, ['order'], batch_size=self.batch_size)
+        ProductImage.objects.bulk_create(new, batch_size=self.batch_size)
+        self.queue_variants(ProductImage, [image.pk for image in new])
+        return touched
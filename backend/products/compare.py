@@ -0,0 +1,91 @@
+"""
+Attribute matrix for the product comparison page.
+
+Products come from one query that also aggregates the active colors' price
+range, plus one prefetch of their features. Every attribute becomes a row
+of values aligned with the product columns, and features become one row
+per distinct feature with a per-product flag. Rows whose values are all the
+same are marked ``identical`` so the page can hide or dim them.
+"""
+from django.db.models import Max, Min, Q
+
+
+def money(value):
+    return f'{value:.2f}' if value is not None else None
+
+
+# Attribute rows, in display order: key and the function reading the value
+ATTRIBUTES = (
+    ('brand', lambda product: product.brand),
+    ('category', lambda product: product.category.name),
+    ('price', lambda product: money(product.price)),
+    ('original_price', lambda product: money(product.original_price)),
+    ('price_range', lambda product: {
+        'min': money(product.color_price_min), 'max': money(product.color_price_max)
+    } if product.color_price_min is not None else None),
+    ('rating', lambda product: round(product.rating_avg, 1)),
+    ('reviews', lambda product: product.approved_review_count),
+    ('in_stock', lambda product: product.in_stock),
+    ('stock_quantity', lambda product: product.stock_quantity),
+    ('warranty', lambda product: product.warranty or None),
+    ('weight', lambda product: str(product.weight) if product.weight is not None else None),
+    ('dimensions', lambda product: product.dimensions or None),
+)
+
+
+def comparison_queryset(queryset):
+    active_colors = Q(colors__is_active=True)
+    return (
+        queryset.select_related('category')
+        .prefetch_related('features')
+        .annotate(
+            color_price_min=Min('colors__price', filter=active_colors),
+            color_price_max=Max('colors__price', filter=active_colors),
+        )
+        .order_by('pk')
+    )
+
+
+def row(values, **extra):
+    return {**extra, 'values': values, 'identical': all(value == values[0] for value in values)}
+
+
+def build_comparison_matrix(products, request=None):
+    """The matrix for ``products`` (from comparison_queryset), one column per product."""
+    def image_url(product):
+        if not product.image:
+            return None
+        return request.build_absolute_uri(product.image.url) if request else product.image.url
+
+    features = {}
+    for column, product in enumerate(products):
+        for feature in product.features.all():
+            features.setdefault(feature.feature, [False] * len(products))[column] = True
+
+    return {
+        'products': [
+            {'id': product.pk, 'name': product.name, 'image': image_url(product)}
+            for product in products
+        ],
+        'attributes': [
+            row([read(product) for product in products], key=key)
+            for key, read in ATTRIBUTES
+        ],
+        'features': [
+            row(values, feature=feature) for feature, values in features.items()
+        ],
+    }
+
+
+def reorder_columns(matrix, order):
+    """A copy of ``matrix`` with its columns rearranged; ``order`` lists column indexes."""
+    return {
+        'products': [matrix['products'][index] for index in order],
+        **{
+            section: [
+                {**item, 'values': [item['values'][index] for index in order]}
+                for item in matrix[section]
+            ]
+            for section in ('attributes', 'features')
+        },
+    }
@@ -0,0 +1,89 @@
+"""
+Facet counts for the product filter sidebar.
+
+All facets come from one grouped aggregate over the filtered queryset: rows
+are grouped by every faceted attribute at once (category, brand, the three
+flags and the price bucket), and the few resulting groups are folded into the
+individual facets in Python.
+"""
+from django.db.models import Case, Count, IntegerField, Max, Min, Value, When
+
+
+# Upper bounds (exclusive) of the price buckets, in EGP; the last bucket is open ended
+PRICE_BUCKET_BOUNDS = (500, 1000, 2500, 5000, 10000)
+
+FLAG_FIELDS = ('in_stock', 'is_offer', 'is_best_seller')
+
+
+def price_bucket_expression():
+    return Case(
+        *[
+            When(price__lt=bound, then=Value(index))
+            for index, bound in enumerate(PRICE_BUCKET_BOUNDS)
+        ],
+        default=Value(len(PRICE_BUCKET_BOUNDS)),
+        output_field=IntegerField()
+    )
+
+
+def price_bucket_range(index):
+    lower = PRICE_BUCKET_BOUNDS[index - 1] if index > 0 else 0
+    upper = PRICE_BUCKET_BOUNDS[index] if index < len(PRICE_BUCKET_BOUNDS) else None
+    return lower, upper
+
+
+def compute_product_facets(queryset):
+    groups = (
+        queryset.order_by()
+        .annotate(price_bucket=price_bucket_expression())
+        .values('category_id', 'category__name', 'brand', *FLAG_FIELDS, 'price_bucket')
+        .annotate(count=Count('pk'), min_price=Min('price'), max_price=Max('price'))
+        .order_by()
+    )
+
+    total = 0
+    categories = {}
+    brands = {}
+    flags = {field: 0 for field in FLAG_FIELDS}
+    buckets = [0] * (len(PRICE_BUCKET_BOUNDS) + 1)
+    min_price = max_price = None
+
+    for group in groups:
+        count = group['count']
+        total += count
+
+        category = categories.setdefault(
+            group['category_id'],
+            {'id': group['category_id'], 'name': group['category__name'], 'count': 0}
+        )
+        category['count'] += count
+        brands[group['brand']] = brands.get(group['brand'], 0) + count
+        for field in FLAG_FIELDS:
+            if group[field]:
+                flags[field] += count
+        buckets[group['price_bucket']] += count
+
+        if min_price is None or group['min_price'] < min_price:
+            min_price = group['min_price']
+        if max_price is None or group['max_price'] > max_price:
+            max_price = group['max_price']
+
+    price_buckets = []
+    for index, count in enumerate(buckets):
+        lower, upper = price_bucket_range(index)
+        price_buckets.append({'min': lower, 'max': upper, 'count': count})
+
+    return {
+        'total': total,
+        'categories': sorted(categories.values(), key=lambda c: (-c['count'], c['name'])),
+        'brands': [
+            {'name': name, 'count': count}
+            for name, count in sorted(brands.items(), key=lambda b: (-b[1], b[0]))
+        ],
+        'flags': flags,
+        'price_buckets': price_buckets,
+        'price': {
+            'min': str(min_price) if min_price is not None else None,
+            'max': str(max_price) if max_price is not None else None,
+        },
+    }
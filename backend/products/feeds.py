@@ -0,0 +1,148 @@
+"""
+Product feed for Google Merchant Center and Meta catalogs, as RSS 2.0 XML
+(``g:`` namespace) or CSV.
+
+One item per active color variant, grouped by ``item_group_id``, or one per
+product without colors. Rows are read with ``QuerySet.iterator()`` in
+chunks with their colors and images prefetched, and the output is
+generated item by item, so memory stays flat whatever the catalog size.
+products.tasks.render_product_feeds writes gzipped copies to storage.
+"""
+import csv
+from urllib.parse import urljoin
+from xml.sax.saxutils import escape
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Prefetch
+from .models import Product, ProductColor, ProductImage
+
+
+FEED_FIELDS = (
+    'id', 'item_group_id', 'title', 'description', 'link', 'image_link',
+    'additional_image_link', 'availability', 'price', 'sale_price', 'brand',
+    'mpn', 'condition', 'product_type', 'color',
+)
+FEED_FORMATS = {
+    'xml': 'application/rss+xml; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+FEED_CHUNK_SIZE = 500
+MAX_ADDITIONAL_IMAGES = 10
+CURRENCY = 'EGP'
+
+
+def feed_queryset():
+    return (
+        Product.objects.filter(is_active=True)
+        .select_related('category')
+        .prefetch_related(
+            Prefetch('colors', queryset=ProductColor.objects.filter(is_active=True).order_by('pk')),
+            Prefetch('images', queryset=ProductImage.objects.order_by('order', 'pk')),
+        )
+        .order_by('pk')
+    )
+
+
+def money(value):
+    return f'{value:.2f} {CURRENCY}'
+
+
+def prices(price, original_price):
+    """``price`` and ``sale_price``: Merchant expects the undiscounted price first."""
+    if original_price and original_price > price:
+        return {'price': money(original_price), 'sale_price': money(price)}
+    return {'price': money(price), 'sale_price': ''}
+
+
+def feed_items(products, media_base_url):
+    """Feed items, as dicts keyed by FEED_FIELDS, for the ``products`` iterable."""
+    storefront_url = settings.STOREFRONT_URL.rstrip('/')
+
+    def image_url(image):
+        return urljoin(media_base_url, default_storage.url(image.name)) if image else ''
+
+    for product in products:
+        images = list(product.images.all())
+        base = {
+            'item_group_id': '',
+            'title': product.name[:150],
+            'description': product.description[:5000],
+            'link': f'{storefront_url}/product/{product.pk}',
+            'image_link': image_url(product.image),
+            'additional_image_link': [
+                image_url(image.image) for image in images if image.color_id is None
+            ][:MAX_ADDITIONAL_IMAGES],
+            'availability': 'in stock' if product.in_stock else 'out of stock',
+            'brand': product.brand,
+            'mpn': product.sku,
+            'condition': 'new',
+            'product_type': product.category.name,
+            'color': '',
+        }
+        colors = list(product.colors.all())
+        if not colors:
+            yield {
+                **base,
+                'id': str(product.pk),
+                **prices(product.price, product.original_price),
+            }
+            continue
+        for color in colors:
+            color_images = [image for image in images if image.color_id == color.pk]
+            yield {
+                **base,
+                'id': f'{product.pk}-{color.pk}',
+                'item_group_id': str(product.pk),
+                'image_link': image_url(color_images[0].image) if color_images else base['image_link'],
+                'availability': (
+                    'in stock' if product.in_stock and color.quantity > 0 else 'out of stock'
+                ),
+                'color': color.name,
+                **prices(color.price, color.old_price),
+            }
+
+
+def iter_feed_xml(items):
+    storefront_url = escape(settings.STOREFRONT_URL)
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<rss version="2.0" xmlns:g="http://base.google.com/ns/1.0">\n<channel>\n'
+        f'<title>RAFAL</title>\n<link>{storefront_url}</link>\n'
+        '<description>RAFAL product catalog</description>\n'
+    )
+    for item in items:
+        parts = ['<item>']
+        for field in FEED_FIELDS:
+            values = item[field] if isinstance(item[field], list) else [item[field]]
+            parts.extend(f'<g:{field}>{escape(value)}</g:{field}>' for value in values if value)
+        parts.append('</item>\n')
+        yield ''.join(parts)
+    yield '</channel>\n</rss>\n'
+
+
+class Echo:
+    """A file-like object handing csv.writer's lines straight back."""
+
+    def write(self, value):
+        return value
+
+
+def iter_feed_csv(items):
+    writer = csv.writer(Echo())
+    yield writer.writerow(FEED_FIELDS)
+    for item in items:
+        yield writer.writerow([
+            ','.join(item[field]) if isinstance(item[field], list) else item[field]
+            for field in FEED_FIELDS
+        ])
+
+
+def iter_feed(format_name, media_base_url):
+    items = feed_items(feed_queryset().iterator(chunk_size=FEED_CHUNK_SIZE), media_base_url)
+    if format_name == 'xml':
+        return iter_feed_xml(items)
+    return iter_feed_csv(items)
+
+
+def feed_storage_name(format_name):
+    return f'feeds/products.{format_name}.gz'
@@ -1,10 +1,13 @@
 import django_filters
-from .models import Product
+from rest_framework import filters
+from .models import Category, Product
+from .search import get_search_backend
 
 
 class ProductFilter(django_filters.FilterSet):
     category = django_filters.NumberFilter(field_name='category__id')
     category_ids = django_filters.CharFilter(method='filter_category_ids')
+    category_tree = django_filters.NumberFilter(method='filter_category_tree')
     min_price = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
     max_price = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
     brand = django_filters.CharFilter(field_name='brand', lookup_expr='icontains')
@@ -23,9 +26,62 @@ class ProductFilter(django_filters.FilterSet):
                 return queryset.filter(category__id__in=category_ids)
         return queryset
     
+    def filter_category_tree(self, queryset, name, value):
+        """
+        Filter products by a category and all of its descendants, through an
+        indexed range on the materialized category path.
+        Example: ?category_tree=3
+        """
+        path = Category.objects.filter(pk=value).values_list('path', flat=True).first()
+        if not path:
+            return queryset.none()
+        return queryset.filter(Category.subtree_q(path, prefix='category__'))
+    
     class Meta:
         model = Product
         fields = [
-            'category', 'brand', 'in_stock', 'is_offer', 
+            'category', 'category_tree', 'brand', 'in_stock', 'is_offer', 
             'is_best_seller', 'min_price', 'max_price'
-        ]
\ No newline at end of file
+        ]
+
+
+class ProductOrderingFilter(filters.OrderingFilter):
+    """
+    OrderingFilter that accepts public aliases for the stored aggregate columns,
+    e.g. ?ordering=-rating or ?ordering=-reviews
+    """
+    ordering_aliases = {
+        'rating': 'rating_avg',
+        'reviews': 'approved_review_count',
+    }
+    
+    def get_ordering(self, request, queryset, view):
+        params = request.query_params.get(self.ordering_param)
+        if not params and 'search_rank' in queryset.query.annotations:
+            # Keep relevance order for ranked search results
+            return ['-search_rank'] + list(self.get_default_ordering(view) or [])
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+        resolved = []
+        for term in ordering:
+            prefix = '-' if term.startswith('-') else ''
+            field = term.lstrip('-')
+            resolved.append(prefix + self.ordering_aliases.get(field, field))
+        return resolved
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    Drop-in replacement for SearchFilter on ?search= that queries the
+    full-text index (see products.search) and ranks results by relevance.
+    Falls back to the icontains lookups over `search_fields` when the
+    database has no index.
+    """
+    
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        backend = get_search_backend(queryset.db)
+        if not query.strip() or backend is None:
+            return super().filter_queryset(request, queryset, view)
+        return backend.search(queryset, query)
\ No newline at end of file
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from products.cache import get_cache_stats, reset_cache_stats, bump_catalog_generation
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters of the catalog response cache.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the hit/miss counters')
+        parser.add_argument('--invalidate', action='store_true',
+                            help='Bump the catalog generation, retiring every cached response')
+    
+    def handle(self, *args, **options):
+        stats = get_cache_stats()
+        self.stdout.write(
+            f"generation={stats['generation']} hits={stats['hits']} "
+            f"misses={stats['misses']} hit_ratio={stats['hit_ratio']:.1%}"
+        )
+        if options['reset']:
+            reset_cache_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset.'))
+        if options['invalidate']:
+            generation = bump_catalog_generation()
+            self.stdout.write(self.style.SUCCESS(f'Catalog generation bumped to {generation}.'))
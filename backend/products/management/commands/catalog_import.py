@@ -0,0 +1,45 @@
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from products.cache import deferred_invalidation, invalidate_catalog
+from products.catalog_io import CatalogImporter, FORMATS, guess_format, open_stream, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Create or update products, keyed by SKU, from a CSV or JSONL file.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Input file, or - for stdin')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Input format (default: from the file extension)')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of products written per transaction (default: 1000)'
+        )
+    
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        if fmt is None:
+            raise CommandError('Cannot tell the format from the file name; pass --format.')
+        
+        def report_error(line, message):
+            self.stderr.write(f'line {line}: {json.dumps(message, ensure_ascii=False)}')
+        
+        importer = CatalogImporter(batch_size=options['batch_size'], on_error=report_error)
+        started = time.monotonic()
+        try:
+            with deferred_invalidation(), open_stream(path, 'r') as stream:
+                stats = importer.run(read_rows(stream, fmt, on_error=importer.reject))
+                if stats['created'] or stats['updated']:
+                    invalidate_catalog()
+        except (ValueError, OSError) as exc:
+            raise CommandError(f'{exc} (after {importer.stats["rows"]} rows)')
+        elapsed = time.monotonic() - started
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats['rows']} rows in {elapsed:.1f}s "
+            f"({stats['rows'] / elapsed if elapsed else 0:.0f} rows/s): "
+            f"{stats['created']} created, {stats['updated']} updated, "
+            f"{stats['unchanged']} unchanged, {stats['errors']} skipped."
+        ))
\ No newline at end of file
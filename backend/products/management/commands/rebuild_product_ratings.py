@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from products.models import Product
+from products.cache import bump_catalog_generation
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored rating and approved review count of every product.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Number of products updated per transaction (default: 5000)'
+        )
+    
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        ids = Product.objects.order_by('pk').values_list('pk', flat=True)
+        
+        updated = 0
+        last_id = 0
+        while True:
+            batch = list(ids.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                updated += Product.rebuild_review_aggregates(
+                    Product.objects.filter(pk__gte=batch[0], pk__lte=batch[-1])
+                )
+            last_id = batch[-1]
+        bump_catalog_generation()
+        
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt review aggregates for {updated} products.'))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from products.models import Product
+from products.search import SEARCH_FIELDS, get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Re-index every product in the full-text search table.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Number of products indexed per transaction (default: 2000)'
+        )
+    
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if backend is None:
+            raise CommandError('This database has no full-text search index; run migrate first.')
+        
+        batch_size = options['batch_size']
+        rows = Product.objects.order_by('pk').values_list('pk', *SEARCH_FIELDS)
+        
+        indexed = 0
+        last_id = 0
+        while True:
+            batch = list(rows.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                backend.index_rows(batch)
+            indexed += len(batch)
+            last_id = batch[-1][0]
+        
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} products for search.'))
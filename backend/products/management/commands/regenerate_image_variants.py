@@ -0,0 +1,74 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from rafal_backend.images import (
+    generate_image_variants, get_image_variant_models, variants_field_name
+)
+
+
+class Command(BaseCommand):
+    help = 'Generate missing (or, with --force, all) image variants across a pool of processes.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Number of worker processes (default: one per CPU)'
+        )
+        parser.add_argument('--force', action='store_true',
+                            help='Regenerate variants that are already up to date')
+        parser.add_argument('--model', action='append', dest='models', metavar='APP_LABEL.MODEL',
+                            help='Only process this model; may be repeated')
+    
+    def get_backlog(self, force, models):
+        backlog = []
+        for model, field_names in get_image_variant_models():
+            if models and model._meta.label_lower not in models:
+                continue
+            for field_name in field_names:
+                rows = model._default_manager.exclude(**{field_name: ''}).values_list(
+                    'pk', field_name, variants_field_name(field_name)
+                )
+                backlog.extend(
+                    (model._meta.label, pk, field_name)
+                    for pk, name, variants in rows
+                    if force or (variants or {}).get('source') != name
+                )
+        return backlog
+    
+    def handle(self, *args, **options):
+        force = options['force']
+        models = {label.lower() for label in options['models'] or ()}
+        known = {model._meta.label_lower for model, _ in get_image_variant_models()}
+        if models - known:
+            raise CommandError(f"No image variants on: {', '.join(sorted(models - known))}")
+        
+        backlog = self.get_backlog(force, models)
+        self.stdout.write(f'{len(backlog)} images to process.')
+        done = failed = 0
+        
+        if options['workers'] <= 1:
+            for job in backlog:
+                generate_image_variants(*job, force=force)
+                done += 1
+        else:
+            # Forked workers must open their own database connections
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=options['workers'], mp_context=multiprocessing.get_context('fork')
+            ) as pool:
+                futures = {
+                    pool.submit(generate_image_variants, *job, force=force): job
+                    for job in backlog
+                }
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                        done += 1
+                    except Exception as exc:
+                        failed += 1
+                        label, pk, field_name = futures[future]
+                        self.stderr.write(f'{label} #{pk} {field_name}: {exc}')
+        
+        self.stdout.write(self.style.SUCCESS(f'Processed {done} images, {failed} failed.'))
\ No newline at end of file
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.10 on 2026-10-17 02:29
+
+from django.db import migrations, models
+from django.db.models.functions import Cast, Coalesce
+
+
+def backfill_review_aggregates(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductReview = apps.get_model('products', 'ProductReview')
+    approved = ProductReview.objects.filter(
+        product=models.OuterRef('pk'), is_approved=True
+    ).order_by().values('product')
+    Product.objects.update(
+        rating_sum=Coalesce(
+            models.Subquery(approved.annotate(s=models.Sum('rating')).values('s')), 0
+        ),
+        approved_review_count=Coalesce(
+            models.Subquery(approved.annotate(c=models.Count('pk')).values('c')), 0
+        ),
+        rating_avg=Coalesce(
+            models.Subquery(
+                approved.annotate(a=models.Avg(Cast('rating', models.FloatField()))).values('a')
+            ),
+            0.0
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='approved_review_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='approved reviews'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.FloatField(default=0, editable=False, verbose_name='average rating'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='rating sum'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', '-rating_avg'], name='product_active_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', '-approved_review_count'], name='product_active_reviews_idx'),
+        ),
+        migrations.RunPython(backfill_review_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+from products.search import (
+    SEARCH_FIELDS, SEARCH_BACKENDS, create_search_index, drop_search_index
+)
+
+
+def forwards(apps, schema_editor):
+    if not create_search_index(schema_editor):
+        return
+    Product = apps.get_model('products', 'Product')
+    backend = SEARCH_BACKENDS[schema_editor.connection.vendor](schema_editor.connection.alias)
+    rows = Product.objects.order_by('pk').values_list('pk', *SEARCH_FIELDS)
+    batch = []
+    for row in rows.iterator(chunk_size=2000):
+        batch.append(row)
+        if len(batch) >= 2000:
+            backend.index_rows(batch)
+            batch = []
+    backend.index_rows(batch)
+
+
+def backwards(apps, schema_editor):
+    drop_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
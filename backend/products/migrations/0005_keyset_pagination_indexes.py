@@ -0,0 +1,25 @@
+# Generated by Django 4.2.10 on 2026-10-17 02:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'created_at', 'id'], name='product_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'price', 'id'], name='product_active_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'name', 'id'], name='product_active_name_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.10 on 2026-10-17 02:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='name')),
+                ('last_id', models.BigIntegerField(default=0, verbose_name='last processed id')),
+                ('processed', models.BigIntegerField(default=0, verbose_name='processed rows')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'job watermark',
+                'verbose_name_plural': 'job watermarks',
+            },
+        ),
+        migrations.CreateModel(
+            name='RelatedProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='rank')),
+                ('support', models.PositiveIntegerField(verbose_name='orders together')),
+                ('confidence', models.FloatField(verbose_name='confidence')),
+                ('lift', models.FloatField(verbose_name='lift')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_products', to='products.product')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_for', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'related product',
+                'verbose_name_plural': 'related products',
+                'ordering': ['product', 'rank'],
+                'indexes': [models.Index(fields=['product', 'rank'], name='related_product_rank_idx')],
+                'unique_together': {('product', 'related')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductPairCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orders', models.PositiveIntegerField(default=0, verbose_name='orders')),
+                ('product_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+                ('product_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'product pair count',
+                'verbose_name_plural': 'product pair counts',
+                'indexes': [models.Index(fields=['product_b', 'product_a'], name='pair_count_product_b_idx')],
+                'unique_together': {('product_a', 'product_b')},
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.10 on 2026-10-17 02:39
+
+from django.db import migrations, models
+
+
+def build_category_paths(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    parents = dict(Category.objects.values_list('pk', 'parent_id'))
+    paths = {}
+
+    def path_of(pk, seen=()):
+        if pk not in paths:
+            parent_id = parents[pk]
+            if parent_id is None or parent_id in seen:
+                paths[pk] = f'{pk}/'
+            else:
+                paths[pk] = path_of(parent_id, seen + (pk,)) + f'{pk}/'
+        return paths[pk]
+
+    categories = list(Category.objects.all())
+    for category in categories:
+        category.path = path_of(category.pk)
+        category.depth = category.path.count('/') - 1
+    Category.objects.bulk_update(categories, ['path', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_related_products'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='depth'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255, verbose_name='path'),
+        ),
+        migrations.RunPython(build_category_paths, migrations.RunPython.noop),
+    ]
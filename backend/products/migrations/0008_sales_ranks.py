@@ -0,0 +1,49 @@
+# Generated by Django 4.2.10 on 2026-10-17 02:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_category_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRank',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.PositiveSmallIntegerField(choices=[(7, 'Last 7 days'), (30, 'Last 30 days'), (90, 'Last 90 days')], verbose_name='window (days)')),
+                ('rank', models.PositiveIntegerField(verbose_name='rank')),
+                ('quantity', models.PositiveIntegerField(verbose_name='quantity')),
+                ('revenue', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='revenue')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_ranks', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'sales rank',
+                'verbose_name_plural': 'sales ranks',
+                'ordering': ['window', 'rank'],
+                'indexes': [models.Index(fields=['window', 'rank', 'product'], name='sales_rank_window_rank_idx')],
+                'unique_together': {('window', 'product')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSalesDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='day')),
+                ('quantity', models.PositiveIntegerField(default=0, verbose_name='quantity')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='revenue')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'product sales day',
+                'verbose_name_plural': 'product sales days',
+                'indexes': [models.Index(fields=['day'], name='sales_day_day_idx')],
+                'unique_together': {('product', 'day')},
+            },
+        ),
+    ]
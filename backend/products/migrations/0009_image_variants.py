@@ -0,0 +1,38 @@
+# Generated by Django 4.2.10 on 2026-10-17 02:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_sales_ranks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='cat_image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='category image variants'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='image variants'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='wall_image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='wall image variants'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='image variants'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='image variants'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 4.2.10 on 2026-10-17 03:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_image_variants'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_active_rating_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_active_reviews_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_active_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_active_price_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_active_name_idx',
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['created_at', 'id'], name='product_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['price', 'id'], name='product_active_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['name', 'id'], name='product_active_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-rating_avg'], name='product_active_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-approved_review_count'], name='product_active_reviews_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category', 'created_at', 'id'], name='product_category_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_featured', True)), fields=['created_at', 'id'], name='product_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_offer', True)), fields=['created_at', 'id'], name='product_offer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_best_seller', True)), fields=['created_at', 'id'], name='product_best_seller_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['sku'], name='product_sku_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productreview',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['product', 'created_at'], name='review_approved_idx'),
+        ),
+    ]
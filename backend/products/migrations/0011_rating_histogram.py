@@ -0,0 +1,57 @@
+# Generated by Django 4.2.10 on 2026-10-17 03:06
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_rating_histogram(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductReview = apps.get_model('products', 'ProductReview')
+    approved = ProductReview.objects.filter(
+        product=models.OuterRef('pk'), is_approved=True
+    ).order_by().values('product')
+    Product.objects.update(**{
+        f'rating_{star}_count': Coalesce(
+            models.Subquery(
+                approved.filter(rating=star).annotate(c=models.Count('pk')).values('c')
+            ),
+            0
+        )
+        for star in range(1, 6)
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_catalog_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='1-star reviews'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='2-star reviews'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='3-star reviews'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='4-star reviews'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='5-star reviews'),
+        ),
+        migrations.RunPython(backfill_rating_histogram, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.10 on 2026-10-17 03:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_rating_histogram'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SitemapShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('section', models.CharField(max_length=20, verbose_name='section')),
+                ('number', models.PositiveIntegerField(verbose_name='number')),
+                ('url_count', models.PositiveIntegerField(verbose_name='URL count')),
+                ('lastmod', models.DateTimeField(verbose_name='latest row update')),
+                ('written_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'sitemap shard',
+                'verbose_name_plural': 'sitemap shards',
+                'ordering': ['section', 'number'],
+                'unique_together': {('section', 'number')},
+            },
+        ),
+    ]
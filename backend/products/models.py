@@ -1,7 +1,11 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.utils.text import slugify
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models.functions import Cast, Coalesce, Concat, Substr
+from .cache import invalidate_catalog
 
 
 class Category(models.Model):
@@ -12,13 +16,23 @@ class Category(models.Model):
                                 help_text=_('Background image for category display'))
     cat_image = models.ImageField(_('category image'), upload_to='categories/cat/', blank=True,
                                 help_text=_('Icon or thumbnail for category'))
+    # Resized copies and placeholders, see rafal_backend.images
+    image_variants = models.JSONField(_('image variants'), default=dict, blank=True, editable=False)
+    wall_image_variants = models.JSONField(_('wall image variants'), default=dict, blank=True, editable=False)
+    cat_image_variants = models.JSONField(_('category image variants'), default=dict, blank=True, editable=False)
     parent = models.ForeignKey('self', on_delete=models.SET_NULL, blank=True, null=True, 
                              related_name='children')
     order = models.PositiveIntegerField(_('display order'), default=0)
     is_active = models.BooleanField(_('active'), default=True)
+    # Materialized path of ancestor ids including this one, e.g. "3/12/40/"
+    path = models.CharField(_('path'), max_length=255, blank=True, editable=False, db_index=True)
+    depth = models.PositiveSmallIntegerField(_('depth'), default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    PATH_SEPARATOR = '/'
+    IMAGE_VARIANT_FIELDS = ('image', 'wall_image', 'cat_image')
+    
     class Meta:
         verbose_name = _('category')
         verbose_name_plural = _('categories')
@@ -26,6 +40,65 @@ class Category(models.Model):
     
     def __str__(self):
         return self.name
+    
+    @classmethod
+    def subtree_q(cls, path, prefix=''):
+        """
+        Q matching a category path and all paths below it, as a range rather
+        than LIKE so a plain index serves it on every database: '0' is the
+        character right after the separator.
+        """
+        return models.Q(**{
+            f'{prefix}path__gte': path,
+            f'{prefix}path__lt': path[:-1] + chr(ord(cls.PATH_SEPARATOR) + 1),
+        })
+    
+    def get_tree_position(self):
+        """
+        ``(stored_path, stored_depth, parent_path)`` read from the database, as
+        in-memory instances go stale whenever an ancestor is moved.
+        """
+        stored_path, stored_depth = '', 0
+        if self.pk:
+            stored = Category.objects.filter(pk=self.pk).values_list('path', 'depth').first()
+            if stored:
+                stored_path, stored_depth = stored
+        parent_path = ''
+        if self.parent_id:
+            parent_path = Category.objects.filter(
+                pk=self.parent_id
+            ).values_list('path', flat=True).first() or ''
+        return stored_path, stored_depth, parent_path
+    
+    @staticmethod
+    def moves_below_itself(stored_path, parent_path):
+        return bool(stored_path) and parent_path.startswith(stored_path)
+    
+    def clean(self):
+        stored_path, _, parent_path = self.get_tree_position()
+        if self.moves_below_itself(stored_path, parent_path):
+            raise ValidationError({'parent': _('A category cannot be moved below itself.')})
+    
+    def save(self, *args, **kwargs):
+        old_path, old_depth, parent_path = self.get_tree_position()
+        if self.moves_below_itself(old_path, parent_path):
+            raise ValueError('A category cannot be moved below itself.')
+        # Write back the stored path; the subtree is re-rooted below
+        self.path, self.depth = old_path, old_depth
+        super().save(*args, **kwargs)
+        
+        self.path = f'{parent_path}{self.pk}{self.PATH_SEPARATOR}'
+        self.depth = self.path.count(self.PATH_SEPARATOR) - 1
+        if self.path == old_path:
+            return
+        
+        Category.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+        if old_path:
+            # Re-root the whole subtree in one statement
+            Category.objects.filter(self.subtree_q(old_path)).exclude(pk=self.pk).update(
+                path=Concat(models.Value(self.path), Substr('path', len(old_path) + 1)),
+                depth=models.F('depth') + (self.depth - old_depth)
+            )
 
 
 class Product(models.Model):
@@ -36,6 +109,7 @@ class Product(models.Model):
                                        blank=True, null=True)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
     image = models.ImageField(_('main image'), upload_to='products/')
+    image_variants = models.JSONField(_('image variants'), default=dict, blank=True, editable=False)
     is_active = models.BooleanField(_('active'), default=True)
     is_featured = models.BooleanField(_('featured'), default=False)
     is_best_seller = models.BooleanField(_('best seller'), default=False)
@@ -49,13 +123,55 @@ class Product(models.Model):
                                 help_text=_('Format: LxWxH in cm'))
     warranty = models.CharField(_('warranty'), max_length=100, blank=True)
     brand = models.CharField(_('brand'), max_length=100, default='RAFAL')
+    # Denormalized review aggregates, maintained by products.signals
+    rating_avg = models.FloatField(_('average rating'), default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(_('rating sum'), default=0, editable=False)
+    approved_review_count = models.PositiveIntegerField(_('approved reviews'), default=0,
+                                                        editable=False)
+    # Approved reviews per star rating, for the rating histogram
+    rating_1_count = models.PositiveIntegerField(_('1-star reviews'), default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(_('2-star reviews'), default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(_('3-star reviews'), default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(_('4-star reviews'), default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(_('5-star reviews'), default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    IMAGE_VARIANT_FIELDS = ('image',)
+    STAR_COUNT_FIELDS = {
+        star: f'rating_{star}_count' for star in range(1, 6)
+    }
+    # Newest approved reviews embedded in the product detail
+    EMBEDDED_REVIEWS = 5
+    
     class Meta:
         verbose_name = _('product')
         verbose_name_plural = _('products')
         ordering = ['-created_at']
+        # Listings only ever read active products, so the indexes are partial
+        # on is_active: a boolean leading column cannot serve the ORDER BY
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='product_active_created_idx',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['price', 'id'], name='product_active_price_idx',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['name', 'id'], name='product_active_name_idx',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['-rating_avg'], name='product_active_rating_idx',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['-approved_review_count'], name='product_active_reviews_idx',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['category', 'created_at', 'id'], name='product_category_created_idx',
+                         condition=models.Q(is_active=True)),
+            # Flag listings (featured, offers and ?is_best_seller=), newest first
+            models.Index(fields=['created_at', 'id'], name='product_featured_idx',
+                         condition=models.Q(is_active=True, is_featured=True)),
+            models.Index(fields=['created_at', 'id'], name='product_offer_idx',
+                         condition=models.Q(is_active=True, is_offer=True)),
+            models.Index(fields=['created_at', 'id'], name='product_best_seller_idx',
+                         condition=models.Q(is_active=True, is_best_seller=True)),
+            models.Index(fields=['sku'], name='product_sku_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -68,21 +184,111 @@ class Product(models.Model):
     
     @property
     def rating(self):
-        reviews = self.reviews.all()
-        if reviews:
-            return sum(review.rating for review in reviews) / reviews.count()
-        return 0
+        return self.rating_avg
+    
+    @property
+    def rating_histogram(self):
+        """Approved reviews per star, ``{1: count, ..., 5: count}``."""
+        return {star: getattr(self, field) for star, field in self.STAR_COUNT_FIELDS.items()}
+    
+    @property
+    def latest_reviews(self):
+        """
+        The EMBEDDED_REVIEWS newest approved reviews, from the
+        ``_latest_reviews`` prefetch when the view planned one.
+        """
+        if hasattr(self, '_latest_reviews'):
+            return self._latest_reviews
+        return list(
+            self.reviews.filter(is_approved=True).select_related('user')
+            .order_by('-created_at', '-pk')[:self.EMBEDDED_REVIEWS]
+        )
+    
+    @classmethod
+    def apply_review_delta(cls, product_id, rating_delta, count_delta, star_deltas=None):
+        """
+        Shift the stored review aggregates of one product in a single UPDATE.
+        The average is derived from the pre-update column values plus the deltas,
+        so concurrent writers never read-modify-write in Python. ``star_deltas``
+        maps star ratings to the change in their histogram count.
+        """
+        star_deltas = {star: delta for star, delta in (star_deltas or {}).items() if delta}
+        if not rating_delta and not count_delta and not star_deltas:
+            return
+        new_sum = models.F('rating_sum') + rating_delta
+        new_count = models.F('approved_review_count') + count_delta
+        cls.objects.filter(pk=product_id).update(
+            **{
+                cls.STAR_COUNT_FIELDS[star]: models.F(cls.STAR_COUNT_FIELDS[star]) + delta
+                for star, delta in star_deltas.items()
+            },
+            rating_sum=new_sum,
+            approved_review_count=new_count,
+            rating_avg=models.Case(
+                models.When(
+                    approved_review_count__gt=-count_delta,
+                    then=Cast(new_sum, models.FloatField()) / new_count
+                ),
+                default=models.Value(0.0),
+                output_field=models.FloatField()
+            )
+        )
+    
+    @classmethod
+    def rebuild_review_aggregates(cls, queryset=None):
+        """
+        Recompute the review aggregates from ProductReview with correlated
+        subqueries, in one UPDATE over ``queryset`` (all products by default).
+        """
+        approved = ProductReview.objects.filter(
+            product=models.OuterRef('pk'), is_approved=True
+        ).order_by().values('product')
+        rating_sum = Coalesce(
+            models.Subquery(approved.annotate(s=models.Sum('rating')).values('s')),
+            0
+        )
+        review_count = Coalesce(
+            models.Subquery(approved.annotate(c=models.Count('pk')).values('c')),
+            0
+        )
+        star_counts = {
+            field: Coalesce(
+                models.Subquery(
+                    approved.filter(rating=star).annotate(c=models.Count('pk')).values('c')
+                ),
+                0
+            )
+            for star, field in cls.STAR_COUNT_FIELDS.items()
+        }
+        if queryset is None:
+            queryset = cls.objects.all()
+        return queryset.update(
+            **star_counts,
+            rating_sum=rating_sum,
+            approved_review_count=review_count,
+            rating_avg=Coalesce(
+                models.Subquery(
+                    approved.annotate(
+                        a=models.Avg(Cast('rating', models.FloatField()))
+                    ).values('a')
+                ),
+                0.0
+            )
+        )
 
 
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(_('image'), upload_to='products/gallery/')
+    image_variants = models.JSONField(_('image variants'), default=dict, blank=True, editable=False)
     color = models.ForeignKey('ProductColor', on_delete=models.SET_NULL, 
                             related_name='images', blank=True, null=True)
     is_primary = models.BooleanField(_('primary image'), default=False)
     order = models.PositiveIntegerField(_('display order'), default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    IMAGE_VARIANT_FIELDS = ('image',)
+    
     class Meta:
         verbose_name = _('product image')
         verbose_name_plural = _('product images')
@@ -146,6 +352,32 @@ class ProductTag(models.Model):
         super().save(*args, **kwargs)
 
 
+class ProductReviewQuerySet(models.QuerySet):
+    # Fields whose bulk update changes the products' review aggregates
+    aggregate_fields = {'product', 'product_id', 'rating', 'is_approved'}
+    
+    def update(self, **kwargs):
+        """
+        Bulk updates skip the signals that keep the review aggregates current
+        (products.signals), so rebuild them for the products the reviews
+        belonged to and belong to now.
+        """
+        if not self.aggregate_fields & kwargs.keys():
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            product_ids = set(self.values_list('product_id', flat=True))
+            updated = super().update(**kwargs)
+            product = kwargs.get('product', kwargs.get('product_id'))
+            if product is not None:
+                product_ids.add(getattr(product, 'pk', product))
+            if product_ids:
+                products = Product.objects.filter(pk__in=product_ids)
+                Product.rebuild_review_aggregates(products)
+                products.update(updated_at=timezone.now())
+                invalidate_catalog()
+        return updated
+
+
 class ProductReview(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reviews')
     user = models.ForeignKey('users.User', on_delete=models.CASCADE, related_name='reviews')
@@ -157,11 +389,156 @@ class ProductReview(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ProductReviewQuerySet.as_manager()
+    
     class Meta:
         verbose_name = _('product review')
         verbose_name_plural = _('product reviews')
         ordering = ['-created_at']
         unique_together = ('product', 'user')
+        indexes = [
+            models.Index(fields=['product', 'created_at'], name='review_approved_idx',
+                         condition=models.Q(is_approved=True)),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.phone} - {self.product.name} ({self.rating}★)"
+    
+    @property
+    def rating_contribution(self):
+        """(rating, count) this review adds to its product's aggregates."""
+        if self.is_approved:
+            return self.rating, 1
+        return 0, 0
+
+
+class JobWatermark(models.Model):
+    """Progress of an incremental batch job over an append-only source table."""
+    name = models.CharField(_('name'), max_length=50, unique=True)
+    last_id = models.BigIntegerField(_('last processed id'), default=0)
+    processed = models.BigIntegerField(_('processed rows'), default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = _('job watermark')
+        verbose_name_plural = _('job watermarks')
+    
+    def __str__(self):
+        return f"{self.name} @ {self.last_id}"
+
+
+class ProductPairCount(models.Model):
+    """
+    Number of orders that contain both products, stored once per unordered pair
+    (product_a <= product_b). The diagonal row (a == b) holds the number of
+    orders containing the product.
+    """
+    product_a = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    product_b = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    orders = models.PositiveIntegerField(_('orders'), default=0)
+    
+    class Meta:
+        verbose_name = _('product pair count')
+        verbose_name_plural = _('product pair counts')
+        unique_together = ('product_a', 'product_b')
+        indexes = [
+            models.Index(fields=['product_b', 'product_a'], name='pair_count_product_b_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_a_id} + {self.product_b_id}: {self.orders}"
+
+
+class RelatedProduct(models.Model):
+    """Top-K "frequently bought together" neighbours, rebuilt by products.tasks."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_products')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommended_for')
+    rank = models.PositiveSmallIntegerField(_('rank'))
+    support = models.PositiveIntegerField(_('orders together'))
+    confidence = models.FloatField(_('confidence'))
+    lift = models.FloatField(_('lift'))
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = _('related product')
+        verbose_name_plural = _('related products')
+        ordering = ['product', 'rank']
+        unique_together = ('product', 'related')
+        indexes = [
+            models.Index(fields=['product', 'rank'], name='related_product_rank_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} (#{self.rank})"
+
+class ProductSalesDay(models.Model):
+    """
+    Units sold and revenue of a product on one day, counting only orders that
+    were not cancelled or refunded. Rebuilt per day by products.tasks.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    day = models.DateField(_('day'))
+    quantity = models.PositiveIntegerField(_('quantity'), default=0)
+    revenue = models.DecimalField(_('revenue'), max_digits=12, decimal_places=2, default=0)
+    
+    class Meta:
+        verbose_name = _('product sales day')
+        verbose_name_plural = _('product sales days')
+        unique_together = ('product', 'day')
+        indexes = [
+            models.Index(fields=['day'], name='sales_day_day_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id} on {self.day}: {self.quantity}"
+
+
+class SalesRank(models.Model):
+    """Best sellers per rolling window, ranked by units sold then revenue."""
+    WINDOW_CHOICES = (
+        (7, _('Last 7 days')),
+        (30, _('Last 30 days')),
+        (90, _('Last 90 days')),
+    )
+    DEFAULT_WINDOW = 30
+    
+    window = models.PositiveSmallIntegerField(_('window (days)'), choices=WINDOW_CHOICES)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='sales_ranks')
+    rank = models.PositiveIntegerField(_('rank'))
+    quantity = models.PositiveIntegerField(_('quantity'))
+    revenue = models.DecimalField(_('revenue'), max_digits=12, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = _('sales rank')
+        verbose_name_plural = _('sales ranks')
+        ordering = ['window', 'rank']
+        unique_together = ('window', 'product')
+        indexes = [
+            models.Index(fields=['window', 'rank', 'product'], name='sales_rank_window_rank_idx'),
+        ]
+    
+    def __str__(self):
+        return f"#{self.rank} over {self.window} days: {self.product_id}"
+
+
+class SitemapShard(models.Model):
+    """
+    A sitemap file written by products.sitemaps, holding the URLs of one
+    section's rows in one primary key range. ``url_count`` and ``lastmod``
+    are the state it was written from; ``written_at`` is its index lastmod.
+    """
+    section = models.CharField(_('section'), max_length=20)
+    number = models.PositiveIntegerField(_('number'))
+    url_count = models.PositiveIntegerField(_('URL count'))
+    lastmod = models.DateTimeField(_('latest row update'))
+    written_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = _('sitemap shard')
+        verbose_name_plural = _('sitemap shards')
+        ordering = ['section', 'number']
+        unique_together = ('section', 'number')
     
     def __str__(self):
-        return f"{self.user.phone} - {self.product.name} ({self.rating}★)"
\ No newline at end of file
+        return f"{self.section} #{self.number}: {self.url_count} URLs"
@@ -0,0 +1,245 @@
+"""
+Full-text product search.
+
+SQLite keeps an FTS5 virtual table and Postgres a tsvector side table with a
+GIN index. Both are keyed by product id, created by migration
+0004_product_search_index and kept in sync by products.signals. Text is
+normalized in Python before it is indexed and before it is queried, so Arabic
+and English fold the same way on every database.
+"""
+import re
+import unicodedata
+from django.db import connections, OperationalError
+from django.db.models.expressions import RawSQL
+
+
+SEARCH_FIELDS = ('name', 'sku', 'brand', 'description')
+
+ARABIC_FOLDING = str.maketrans({
+    'ٱ': 'ا',  # alef wasla
+    'ى': 'ي',  # alef maksura
+    'ة': 'ه',  # ta marbuta
+    'ـ': None,  # tatweel
+})
+
+WORD_RE = re.compile(r'\w+')
+
+
+def normalize_search_text(value):
+    """
+    Fold text into the form stored in the index: case-folded, diacritics and
+    Arabic tashkeel stripped, alef/hamza variants, ya and ta marbuta unified,
+    Arabic-Indic digits converted. Returns a space separated token string.
+    """
+    if not value:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(value))
+    stripped = ''.join(
+        char for char in decomposed if unicodedata.category(char) != 'Mn'
+    )
+    folded = stripped.translate(ARABIC_FOLDING).casefold()
+    tokens = []
+    for token in WORD_RE.findall(folded):
+        # Arabic-Indic and extended digits are \w and carry a decimal value
+        tokens.append(''.join(
+            str(unicodedata.decimal(char)) if char.isdecimal() else char
+            for char in token
+        ))
+    return ' '.join(tokens)
+
+
+def search_tokens(query):
+    return normalize_search_text(query).split()
+
+
+class BaseSearchBackend:
+    table_name = None
+
+    def __init__(self, using='default'):
+        self.using = using
+
+    @property
+    def connection(self):
+        return connections[self.using]
+
+    def is_available(self):
+        with self.connection.cursor() as cursor:
+            return self.table_name in self.connection.introspection.table_names(cursor)
+
+    def index_rows(self, rows):
+        """Index ``(id, name, sku, brand, description)`` tuples, replacing old entries."""
+        raise NotImplementedError
+
+    def remove(self, product_ids):
+        raise NotImplementedError
+
+    def search(self, queryset, query):
+        """Filter ``queryset`` to matching products, annotated and ordered by `search_rank`."""
+        raise NotImplementedError
+
+    def index_products(self, products):
+        self.index_rows(
+            (product.pk, *(getattr(product, field) for field in SEARCH_FIELDS))
+            for product in products
+        )
+
+    def normalized_rows(self, rows):
+        return [
+            (row[0], *(normalize_search_text(value) for value in row[1:]))
+            for row in rows
+        ]
+
+    def product_column(self, queryset):
+        quote_name = self.connection.ops.quote_name
+        return '%s.%s' % (quote_name(queryset.model._meta.db_table), quote_name('id'))
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    table_name = 'products_product_fts'
+    # bm25 column weights, in SEARCH_FIELDS order
+    weights = (10.0, 10.0, 4.0, 1.0)
+
+    def index_rows(self, rows):
+        rows = self.normalized_rows(rows)
+        if not rows:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {self.table_name} WHERE rowid = %s',
+                [(row[0],) for row in rows]
+            )
+            cursor.executemany(
+                f'INSERT INTO {self.table_name} (rowid, name, sku, brand, description) '
+                f'VALUES (%s, %s, %s, %s, %s)',
+                rows
+            )
+
+    def remove(self, product_ids):
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {self.table_name} WHERE rowid = %s',
+                [(pk,) for pk in product_ids]
+            )
+
+    def search(self, queryset, query):
+        tokens = search_tokens(query)
+        if not tokens:
+            return queryset
+        # Quoted prefix terms, implicitly ANDed: "sol"* "fan"*
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        weights = ', '.join(str(weight) for weight in self.weights)
+        return queryset.filter(
+            pk__in=RawSQL(
+                f'SELECT rowid FROM {self.table_name} WHERE {self.table_name} MATCH %s',
+                (match,)
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT -bm25({self.table_name}, {weights}) FROM {self.table_name} '
+                f'WHERE {self.table_name} MATCH %s AND rowid = {self.product_column(queryset)}',
+                (match,)
+            )
+        ).order_by('-search_rank')
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    table_name = 'products_product_search'
+    # tsvector weight labels, in SEARCH_FIELDS order
+    weights = ('A', 'A', 'B', 'C')
+
+    def index_rows(self, rows):
+        rows = self.normalized_rows(rows)
+        if not rows:
+            return
+        document = ' || '.join(
+            f"setweight(to_tsvector('simple', %s), '{weight}')" for weight in self.weights
+        )
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {self.table_name} (product_id, document) '
+                f'VALUES (%s, {document}) '
+                f'ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document',
+                rows
+            )
+
+    def remove(self, product_ids):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table_name} WHERE product_id = ANY(%s)',
+                (list(product_ids),)
+            )
+
+    def search(self, queryset, query):
+        tokens = search_tokens(query)
+        if not tokens:
+            return queryset
+        tsquery = ' & '.join(f"'{token}':*" for token in tokens)
+        return queryset.filter(
+            pk__in=RawSQL(
+                f"SELECT product_id FROM {self.table_name} "
+                f"WHERE document @@ to_tsquery('simple', %s)",
+                (tsquery,)
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f"SELECT ts_rank_cd(document, to_tsquery('simple', %s)) FROM {self.table_name} "
+                f"WHERE product_id = {self.product_column(queryset)}",
+                (tsquery,)
+            )
+        ).order_by('-search_rank')
+
+
+SEARCH_BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+_availability = {}
+
+
+def get_search_backend(using='default'):
+    """
+    Return the full-text backend for a database alias, or None when the vendor
+    is unsupported or its index table is missing (e.g. SQLite without FTS5).
+    """
+    backend_class = SEARCH_BACKENDS.get(connections[using].vendor)
+    if backend_class is None:
+        return None
+    backend = backend_class(using)
+    if using not in _availability:
+        _availability[using] = backend.is_available()
+    return backend if _availability[using] else None
+
+
+def create_search_index(schema_editor):
+    """Create the vendor's index table. Returns False if the database cannot host it."""
+    vendor = schema_editor.connection.vendor
+    _availability.pop(schema_editor.connection.alias, None)
+    if vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                f'CREATE VIRTUAL TABLE {SQLiteSearchBackend.table_name} USING fts5('
+                f"name, sku, brand, description, tokenize = 'unicode61 remove_diacritics 0')"
+            )
+        except OperationalError:
+            # SQLite compiled without FTS5; ProductSearchFilter falls back to icontains
+            return False
+        return True
+    if vendor == 'postgresql':
+        table = PostgresSearchBackend.table_name
+        schema_editor.execute(
+            f'CREATE TABLE {table} ('
+            f'product_id bigint PRIMARY KEY REFERENCES products_product (id) '
+            f'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            f'document tsvector NOT NULL)'
+        )
+        schema_editor.execute(f'CREATE INDEX {table}_document_gin ON {table} USING gin (document)')
+        return True
+    return False
+
+
+def drop_search_index(schema_editor):
+    backend_class = SEARCH_BACKENDS.get(schema_editor.connection.vendor)
+    if backend_class is not None:
+        schema_editor.execute(f'DROP TABLE IF EXISTS {backend_class.table_name}')
+    _availability.pop(schema_editor.connection.alias, None)
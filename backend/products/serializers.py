@@ -1,26 +1,35 @@
 from rest_framework import serializers
+from rafal_backend.images import ImageVariantsField
+from rafal_backend.sparse import SparseFieldsetSerializerMixin
 from .models import (
     Category, Product, ProductImage, ProductColor, 
     ProductFeature, ProductTag, ProductReview
 )
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+    wall_image_variants = ImageVariantsField()
+    cat_image_variants = ImageVariantsField()
+    
     class Meta:
         model = Category
         fields = [
             'id', 'name', 'description', 'image', 'wall_image', 
-            'cat_image', 'parent', 'order', 'is_active'
+            'cat_image', 'image_variants', 'wall_image_variants',
+            'cat_image_variants', 'parent', 'order', 'is_active'
         ]
 
 
 class ProductColorImageSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+    
     class Meta:
         model = ProductImage
-        fields = ['id', 'image', 'is_primary', 'order']
+        fields = ['id', 'image', 'image_variants', 'is_primary', 'order']
 
 
-class ProductColorSerializer(serializers.ModelSerializer):
+class ProductColorSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     images = ProductColorImageSerializer(many=True, read_only=True)
     
     class Meta:
@@ -63,63 +72,69 @@ class ProductReviewSerializer(serializers.ModelSerializer):
 
 
 class ProductImageSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+    
     class Meta:
         model = ProductImage
-        fields = ['id', 'image', 'color', 'is_primary', 'order']
+        fields = ['id', 'image', 'image_variants', 'color', 'is_primary', 'order']
 
 
 class ProductSerializer(serializers.ModelSerializer):
     """Basic product serializer for use in other apps"""
     category_name = serializers.CharField(source='category.name', read_only=True)
+    image_variants = ImageVariantsField()
     
     class Meta:
         model = Product
         fields = [
-            'id', 'name', 'price', 'original_price', 'image',
+            'id', 'name', 'price', 'original_price', 'image', 'image_variants',
             'category', 'category_name', 'in_stock'
         ]
 
 
-class ProductListSerializer(serializers.ModelSerializer):
+class ProductListSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     discount_percentage = serializers.IntegerField(read_only=True)
-    rating = serializers.FloatField(read_only=True)
-    reviews_count = serializers.SerializerMethodField()
+    rating = serializers.FloatField(source='rating_avg', read_only=True)
+    reviews_count = serializers.IntegerField(source='approved_review_count', read_only=True)
+    image_variants = ImageVariantsField()
     
     class Meta:
         model = Product
         fields = [
             'id', 'name', 'price', 'original_price', 'category', 
-            'category_name', 'image', 'is_best_seller', 'is_offer',
+            'category_name', 'image', 'image_variants', 'is_best_seller', 'is_offer',
             'in_stock', 'discount_percentage', 'rating', 'reviews_count'
         ]
-    
-    def get_reviews_count(self, obj):
-        return obj.reviews.filter(is_approved=True).count()
+        field_dependencies = {'discount_percentage': ('price', 'original_price')}
 
 
-class ProductDetailSerializer(serializers.ModelSerializer):
+class ProductDetailSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     images = ProductImageSerializer(many=True, read_only=True)
     colors = ProductColorSerializer(many=True, read_only=True)
     features = ProductFeatureSerializer(many=True, read_only=True)
     tags = ProductTagSerializer(many=True, read_only=True)
-    reviews = ProductReviewSerializer(many=True, read_only=True)
+    # The newest few approved reviews; the rest are paged through /reviews/
+    reviews = ProductReviewSerializer(source='latest_reviews', many=True, read_only=True)
     discount_percentage = serializers.IntegerField(read_only=True)
-    rating = serializers.FloatField(read_only=True)
-    reviews_count = serializers.SerializerMethodField()
+    rating = serializers.FloatField(source='rating_avg', read_only=True)
+    reviews_count = serializers.IntegerField(source='approved_review_count', read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
+    image_variants = ImageVariantsField()
     
     class Meta:
         model = Product
         fields = [
             'id', 'name', 'description', 'price', 'original_price', 
-            'category', 'category_name', 'image', 'images', 'colors',
+            'category', 'category_name', 'image', 'image_variants', 'images', 'colors',
             'features', 'tags', 'is_active', 'is_featured', 
             'is_best_seller', 'is_offer', 'in_stock', 'stock_quantity',
             'sku', 'weight', 'dimensions', 'warranty', 'brand',
-            'discount_percentage', 'rating', 'reviews_count', 'reviews',
+            'discount_percentage', 'rating', 'reviews_count', 'rating_histogram', 'reviews',
             'created_at', 'updated_at'
         ]
-    
-    def get_reviews_count(self, obj):
-        return obj.reviews.filter(is_approved=True).count()
\ No newline at end of file
+        field_dependencies = {
+            'discount_percentage': ('price', 'original_price'),
+            'rating_histogram': tuple(Product.STAR_COUNT_FIELDS.values()),
+        }
\ No newline at end of file
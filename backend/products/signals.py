@@ -0,0 +1,216 @@
+from collections import Counter
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.db.models import F
+from django.db.models.functions import Substr
+from django.utils import timezone
+from .models import (
+    Category, Product, ProductImage, ProductColor,
+    ProductFeature, ProductTag, ProductReview
+)
+from rafal_backend.images import queue_image_variants
+from .search import get_search_backend
+from .cache import invalidate_catalog
+from .suggest import suggest_index
+
+
+def touch_products(**filters):
+    """
+    Bump updated_at of the products whose representation embeds a changed
+    row, so conditional GET validators (max(updated_at)) see the change.
+    """
+    Product.objects.filter(**filters).update(updated_at=timezone.now())
+
+
+def published_reviews_changed(*product_ids):
+    invalidate_catalog()
+    touch_products(pk__in=product_ids)
+
+
+@receiver(pre_save, sender=ProductReview)
+def remember_review_contribution(sender, instance, raw=False, **kwargs):
+    """
+    Remember what the stored row contributed to its product's aggregates,
+    so post_save can apply only the difference.
+    """
+    instance._stored_contribution = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    stored = (
+        ProductReview.objects.filter(pk=instance.pk)
+        .values('product_id', 'rating', 'is_approved')
+        .first()
+    )
+    if stored:
+        rating = stored['rating'] if stored['is_approved'] else 0
+        count = 1 if stored['is_approved'] else 0
+        instance._stored_contribution = (stored['product_id'], rating, count)
+
+
+@receiver(post_save, sender=ProductReview)
+def update_product_rating_on_save(sender, instance, raw=False, **kwargs):
+    """
+    Apply the change in a review's contribution (new, edited, approved or
+    unapproved) to Product.rating_sum / approved_review_count / rating_avg
+    and the star histogram.
+    """
+    if raw:
+        return
+    rating, count = instance.rating_contribution
+    stored = getattr(instance, '_stored_contribution', None)
+    instance._stored_contribution = None
+    
+    if stored is None:
+        Product.apply_review_delta(instance.product_id, rating, count, {rating: count})
+        if instance.is_approved:
+            published_reviews_changed(instance.product_id)
+        return
+    
+    old_product_id, old_rating, old_count = stored
+    if old_product_id == instance.product_id:
+        star_deltas = Counter({rating: count})
+        star_deltas[old_rating] -= old_count
+        Product.apply_review_delta(
+            instance.product_id, rating - old_rating, count - old_count, star_deltas
+        )
+    else:
+        Product.apply_review_delta(old_product_id, -old_rating, -old_count, {old_rating: -old_count})
+        Product.apply_review_delta(instance.product_id, rating, count, {rating: count})
+    if instance.is_approved or old_count:
+        published_reviews_changed(old_product_id, instance.product_id)
+
+
+@receiver(post_delete, sender=ProductReview)
+def update_product_rating_on_delete(sender, instance, **kwargs):
+    rating, count = instance.rating_contribution
+    Product.apply_review_delta(instance.product_id, -rating, -count, {rating: -count})
+    if instance.is_approved:
+        published_reviews_changed(instance.product_id)
+
+
+@receiver(post_save, sender=Product)
+def index_product_for_search(sender, instance, using, **kwargs):
+    backend = get_search_backend(using)
+    if backend is not None:
+        backend.index_products([instance])
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_search(sender, instance, using, **kwargs):
+    backend = get_search_backend(using)
+    if backend is not None:
+        backend.remove([instance.pk])
+
+
+CATALOG_MODELS = (Category, Product, ProductColor, ProductImage, ProductFeature, ProductTag)
+
+
+def invalidate_catalog_on_change(sender, **kwargs):
+    """Any write to catalog data retires every cached catalog response."""
+    invalidate_catalog()
+
+
+for model in CATALOG_MODELS:
+    post_save.connect(invalidate_catalog_on_change, sender=model,
+                      dispatch_uid=f'invalidate_catalog_save_{model.__name__}')
+    post_delete.connect(invalidate_catalog_on_change, sender=model,
+                        dispatch_uid=f'invalidate_catalog_delete_{model.__name__}')
+
+
+for model in (Category, Product, ProductImage):
+    post_save.connect(queue_image_variants, sender=model,
+                      dispatch_uid=f'queue_image_variants_{model.__name__}')
+
+
+@receiver(m2m_changed, sender=ProductTag.products.through)
+def invalidate_catalog_on_tagging(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and not reverse:
+        touch_products(tags=instance)
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    invalidate_catalog()
+    if reverse:
+        touch_products(pk=instance.pk)
+    elif pk_set:
+        touch_products(pk__in=pk_set)
+
+
+def touch_parent_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        touch_products(pk=instance.product_id)
+
+
+for model in (ProductColor, ProductImage, ProductFeature):
+    post_save.connect(touch_parent_product, sender=model,
+                      dispatch_uid=f'touch_product_save_{model.__name__}')
+    post_delete.connect(touch_parent_product, sender=model,
+                        dispatch_uid=f'touch_product_delete_{model.__name__}')
+
+
+@receiver(pre_save, sender=Category)
+def remember_category_name(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Remember the stored name, so post_save can tell whether it changed."""
+    instance._stored_name = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    if update_fields is not None and 'name' not in update_fields:
+        instance._stored_name = instance.name
+        return
+    instance._stored_name = Category.objects.filter(pk=instance.pk).values_list(
+        'name', flat=True
+    ).first()
+
+
+@receiver(post_save, sender=Category)
+def touch_category_products(sender, instance, created, raw=False, **kwargs):
+    # Product representations embed category_name; other category fields
+    # leave them unchanged
+    if created or raw:
+        return
+    if getattr(instance, '_stored_name', None) != instance.name:
+        touch_products(category=instance)
+
+
+@receiver(post_delete, sender=Category)
+def reroot_orphaned_categories(sender, instance, **kwargs):
+    """
+    Children of a deleted category are detached (parent SET_NULL) by a bulk
+    UPDATE that bypasses Category.save, so strip the deleted prefix from
+    the materialized paths of the whole subtree here.
+    """
+    if not instance.path:
+        return
+    Category.objects.filter(Category.subtree_q(instance.path)).update(
+        path=Substr('path', len(instance.path) + 1),
+        depth=F('depth') - (instance.depth + 1)
+    )
+
+
+@receiver(post_save, sender=ProductTag)
+def touch_tagged_products(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        touch_products(tags=instance)
+
+
+@receiver(post_save, sender=Product)
+def update_product_suggestions(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(partial(suggest_index.update_product, instance))
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_suggestions(sender, instance, **kwargs):
+    transaction.on_commit(partial(suggest_index.remove_product, instance.pk))
+
+
+@receiver(post_save, sender=Category)
+def update_category_suggestions(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(partial(suggest_index.update_category, instance))
+
+
+@receiver(post_delete, sender=Category)
+def remove_category_suggestions(sender, instance, **kwargs):
+    transaction.on_commit(partial(suggest_index.remove_category, instance.pk))
\ No newline at end of file
@@ -0,0 +1,127 @@
+"""
+Sitemap files for the storefront's product and category pages, written to
+storage and served from there as static files, so crawlers never reach the
+application or the database.
+
+Each section is split into shards by primary key range, SITEMAP_SHARD_SIZE
+keys per shard, so a row always lands in the same shard and no shard passes
+the 50,000 URL limit of the protocol. Every run reads one grouped query per
+section: the URL count and latest ``updated_at`` of each shard. Only shards
+where either moved since they were written (rows were edited, added,
+deactivated or deleted) are rewritten, and the index is rewritten when any
+shard was.
+"""
+from datetime import timezone as dt_timezone
+from urllib.parse import urljoin
+from xml.sax.saxutils import escape
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, Max
+from django.db.models.functions import Cast
+from rafal_backend.storage import replace_file
+from .models import Category, Product, SitemapShard
+
+
+SITEMAP_SHARD_SIZE = 50000
+SITEMAP_NAMESPACE = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+SITEMAP_INDEX_NAME = 'sitemaps/sitemap.xml'
+ITERATOR_CHUNK_SIZE = 2000
+
+# Section name: the queryset of rows to list and the storefront path of a row
+SECTIONS = {
+    'categories': (lambda: Category.objects.filter(is_active=True), '/category/{pk}'),
+    'products': (lambda: Product.objects.filter(is_active=True), '/product/{pk}'),
+}
+
+
+def shard_name(section, number):
+    return f'sitemaps/{section}-{number}.xml.gz'
+
+
+def shard_range(number):
+    """The primary keys of shard ``number``, as an inclusive range."""
+    return number * SITEMAP_SHARD_SIZE + 1, (number + 1) * SITEMAP_SHARD_SIZE
+
+
+def w3c_datetime(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y-%m-%dT%H:%M:%S+00:00')
+
+
+def public_url(name):
+    return urljoin(settings.BACKEND_URL, default_storage.url(name))
+
+
+def shard_stats(queryset):
+    """``{number: (url_count, lastmod)}`` for the non-empty shards of ``queryset``."""
+    stats = (
+        queryset.annotate(
+            shard=Cast((F('pk') - 1) / SITEMAP_SHARD_SIZE, output_field=IntegerField())
+        )
+        .values('shard')
+        .annotate(url_count=Count('pk'), lastmod=Max('updated_at'))
+        .order_by()
+        .values_list('shard', 'url_count', 'lastmod')
+    )
+    return {shard: (url_count, lastmod) for shard, url_count, lastmod in stats}
+
+
+def iter_urlset(rows, path):
+    storefront_url = settings.STOREFRONT_URL.rstrip('/')
+    yield f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_NAMESPACE}">\n'
+    for pk, updated_at in rows:
+        location = escape(storefront_url + path.format(pk=pk))
+        yield f'<url><loc>{location}</loc><lastmod>{w3c_datetime(updated_at)}</lastmod></url>\n'
+    yield '</urlset>\n'
+
+
+def iter_sitemap_index(shards):
+    yield f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{SITEMAP_NAMESPACE}">\n'
+    for shard in shards:
+        location = escape(public_url(shard_name(shard.section, shard.number)))
+        yield (
+            f'<sitemap><loc>{location}</loc>'
+            f'<lastmod>{w3c_datetime(shard.written_at)}</lastmod></sitemap>\n'
+        )
+    yield '</sitemapindex>\n'
+
+
+def write_sitemaps(force=False):
+    """
+    Rewrite the shards whose rows changed since they were written, and then
+    the index; ``force`` rewrites everything. Returns the rewritten and the
+    removed shards as ``(section, number)`` pairs.
+    """
+    written, removed = [], []
+    for section, (get_queryset, path) in SECTIONS.items():
+        queryset = get_queryset()
+        stats = shard_stats(queryset)
+        stored = {shard.number: shard for shard in SitemapShard.objects.filter(section=section)}
+
+        for number, (url_count, lastmod) in sorted(stats.items()):
+            shard = stored.get(number)
+            if (
+                not force and shard is not None
+                and (shard.url_count, shard.lastmod) == (url_count, lastmod)
+            ):
+                continue
+            rows = (
+                queryset.filter(pk__range=shard_range(number)).order_by('pk')
+                .values_list('pk', 'updated_at').iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+            )
+            replace_file(shard_name(section, number), iter_urlset(rows, path), compress=True)
+            SitemapShard.objects.update_or_create(
+                section=section, number=number,
+                defaults={'url_count': url_count, 'lastmod': lastmod},
+            )
+            written.append((section, number))
+
+        for number in stored.keys() - stats.keys():
+            with transaction.atomic():
+                stored[number].delete()
+                default_storage.delete(shard_name(section, number))
+            removed.append((section, number))
+
+    if written or removed or force or not default_storage.exists(SITEMAP_INDEX_NAME):
+        replace_file(SITEMAP_INDEX_NAME, iter_sitemap_index(SitemapShard.objects.all()))
+    return written, removed
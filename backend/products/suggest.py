@@ -0,0 +1,364 @@
+"""
+In-process typeahead index over product names and SKUs, brands and
+category names.
+
+Every worker keeps its own SuggestIndex. Terms are normalized with the
+search normalizer (so Arabic and English fold as in full-text search) and
+every word suffix of a name is a key, so "fan" finds "Ceiling Fan". Keys
+sit in sorted lists searched with bisect; the ranked matches of one- and
+two-character prefixes, which would otherwise span much of the catalog,
+are kept precomputed. Products rank by units sold over the default sales
+window, then rating; brands by product count.
+
+Each process builds its own index lazily: the first suggest() builds it
+while holding a lock, so concurrent first requests wait for that one build
+rather than each running their own. With SUGGEST_WARM_UP set, web workers
+start the build in a background thread when the app loads instead (see
+products.apps), so Celery workers, management commands and tests never pay
+for an index they do not query.
+
+Writes in this process update the index through products.signals. Writes
+in other processes bump the catalog generation: the index polls it every
+few seconds and then re-reads only the rows updated since its last sync,
+falling back to a full rebuild when rows were deleted. When the default
+cache is process-local the generation says nothing about other processes,
+so the index syncs on every check instead. A periodic full rebuild picks up
+new sales ranks.
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import timedelta
+from operator import itemgetter
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, connections
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+from .cache import catalog_cache_is_shared, get_catalog_generation
+from .models import Category, Product, SalesRank
+from .search import normalize_search_text
+
+
+# Sorts after every character a key can continue a prefix with
+LAST_CHARACTER = '\U0010ffff'
+
+
+def suffix_keys(*texts):
+    """Normalized keys for ``texts``: each text from every word onwards."""
+    keys = set()
+    for text in texts:
+        tokens = normalize_search_text(text).split()
+        keys.update(' '.join(tokens[start:]) for start in range(len(tokens)))
+    return keys
+
+
+class PrefixIndex:
+    """
+    Entries with a set of string keys and a sortable rank, searchable by key
+    prefix in rank order.
+    """
+    # Prefixes up to this length keep their matches precomputed in rank order
+    short_prefix_length = 2
+    # Longer prefixes rank at most this many matching keys
+    max_candidates = 1000
+
+    def __init__(self):
+        self.keys = []
+        self.entries = {}
+        self.short = {}
+        # Position of each entry in rank order, recomputed after changes
+        self.order = None
+
+    @classmethod
+    def build(cls, entries):
+        """An index of ``(entry_id, keys, rank)`` triples, sorted once."""
+        index = cls()
+        short = {}
+        for entry_id, keys, rank in entries:
+            index.entries[entry_id] = (keys, rank)
+            index.keys.extend((key, entry_id) for key in keys)
+            for prefix in index.short_prefixes(keys):
+                short.setdefault(prefix, []).append((rank, entry_id))
+        index.keys.sort()
+        index.short = {prefix: sorted(ranked) for prefix, ranked in short.items()}
+        return index
+
+    def short_prefixes(self, keys):
+        return {
+            key[:length]
+            for key in keys
+            for length in range(1, min(len(key), self.short_prefix_length) + 1)
+        }
+
+    def add(self, entry_id, keys, rank):
+        self.remove(entry_id)
+        self.order = None
+        self.entries[entry_id] = (keys, rank)
+        for key in keys:
+            insort(self.keys, (key, entry_id))
+        for prefix in self.short_prefixes(keys):
+            insort(self.short.setdefault(prefix, []), (rank, entry_id))
+
+    def remove(self, entry_id):
+        stored = self.entries.pop(entry_id, None)
+        if stored is None:
+            return
+        self.order = None
+        keys, rank = stored
+        for key in keys:
+            del self.keys[bisect_left(self.keys, (key, entry_id))]
+        for prefix in self.short_prefixes(keys):
+            ranked = self.short[prefix]
+            del ranked[bisect_left(ranked, (rank, entry_id))]
+            if not ranked:
+                del self.short[prefix]
+
+    def search(self, prefix, limit):
+        if not prefix:
+            return []
+        if len(prefix) <= self.short_prefix_length:
+            return [entry_id for _, entry_id in self.short.get(prefix, ())[:limit]]
+        start = bisect_left(self.keys, (prefix,))
+        end = bisect_left(self.keys, (prefix + LAST_CHARACTER,), start)
+        matches = set(map(itemgetter(1), self.keys[start:min(end, start + self.max_candidates)]))
+        if self.order is None:
+            ranked = sorted(self.entries, key=lambda entry_id: (self.entries[entry_id][1], entry_id))
+            self.order = {entry_id: position for position, entry_id in enumerate(ranked)}
+        return heapq.nsmallest(limit, matches, key=self.order.__getitem__)
+
+
+class SuggestIndex:
+    # Seconds between checks of the shared catalog generation
+    generation_check_interval = 5
+    # Seconds between full rebuilds
+    rebuild_interval = 15 * 60
+    # Rows updated this long before the last sync are re-read, to cover
+    # transactions that committed after it started
+    sync_overlap = timedelta(seconds=30)
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.refresh_lock = threading.Lock()
+        self.built = False
+        self.products = PrefixIndex()
+        self.categories = PrefixIndex()
+        self.brands = PrefixIndex()
+        self.product_data = {}
+        self.category_data = {}
+        self.product_sales = {}
+        self.product_brands = {}
+        self.brand_counts = Counter()
+        self.brand_names = {}
+        self.generation = None
+        self.checked_at = self.built_at = 0
+        self.synced_at = None
+
+    # Reading the catalog
+
+    def product_queryset(self):
+        sales = SalesRank.objects.filter(
+            product=OuterRef('pk'), window=SalesRank.DEFAULT_WINDOW
+        ).values('quantity')[:1]
+        return Product.objects.annotate(units_sold=Subquery(sales)).only(
+            'pk', 'name', 'sku', 'brand', 'price', 'image', 'rating_avg', 'is_active'
+        )
+
+    def category_queryset(self):
+        return Category.objects.only('pk', 'name', 'is_active')
+
+    # Entries
+
+    def product_entry(self, product):
+        sales = self.product_sales.get(product.pk, 0)
+        rank = (-sales, -product.rating_avg, normalize_search_text(product.name))
+        return product.pk, suffix_keys(product.name, product.sku), rank
+
+    def category_entry(self, category):
+        return category.pk, suffix_keys(category.name), (normalize_search_text(category.name),)
+
+    def brand_entry(self, brand):
+        return brand, suffix_keys(self.brand_names[brand]), (-self.brand_counts[brand], brand)
+
+    def describe_product(self, product):
+        return {
+            'id': product.pk,
+            'name': product.name,
+            'sku': product.sku,
+            'price': str(product.price),
+            'image': product.image.name or None,
+        }
+
+    # Maintenance
+
+    def rebuild(self):
+        started = timezone.now()
+        generation = get_catalog_generation()
+        products = list(self.product_queryset().filter(is_active=True))
+        categories = list(self.category_queryset().filter(is_active=True))
+        with self.lock:
+            self.product_sales = {product.pk: product.units_sold or 0 for product in products}
+            self.product_data = {product.pk: self.describe_product(product) for product in products}
+            self.product_brands = {
+                product.pk: normalize_search_text(product.brand) for product in products
+            }
+            self.brand_counts = Counter(brand for brand in self.product_brands.values() if brand)
+            self.brand_names = {}
+            for product in products:
+                self.brand_names.setdefault(normalize_search_text(product.brand), product.brand)
+            self.category_data = {
+                category.pk: {'id': category.pk, 'name': category.name} for category in categories
+            }
+            self.products = PrefixIndex.build(self.product_entry(product) for product in products)
+            self.categories = PrefixIndex.build(
+                self.category_entry(category) for category in categories
+            )
+            self.brands = PrefixIndex.build(self.brand_entry(brand) for brand in self.brand_counts)
+            self.generation = generation
+            self.synced_at = started
+            self.checked_at = self.built_at = time.monotonic()
+            self.built = True
+
+    def sync(self):
+        """Re-read rows changed since the last sync; rebuild if any were deleted."""
+        started = timezone.now()
+        generation = get_catalog_generation()
+        since = self.synced_at - self.sync_overlap
+        for product in self.product_queryset().filter(updated_at__gte=since):
+            self.product_sales[product.pk] = product.units_sold or 0
+            self.update_product(product)
+        for category in self.category_queryset().filter(updated_at__gte=since):
+            self.update_category(category)
+        if (
+            Product.objects.filter(is_active=True).count() != len(self.product_data)
+            or Category.objects.filter(is_active=True).count() != len(self.category_data)
+        ):
+            self.rebuild()
+            return
+        with self.lock:
+            self.generation = generation
+            self.synced_at = started
+
+    def ensure_current(self):
+        now = time.monotonic()
+        stale = not self.built or now - self.built_at > self.rebuild_interval
+        if not stale and now - self.checked_at < self.generation_check_interval:
+            return
+        # Once built, one thread refreshes while the others keep answering
+        if not self.refresh_lock.acquire(blocking=not self.built):
+            return
+        try:
+            if not self.built or time.monotonic() - self.built_at > self.rebuild_interval:
+                self.rebuild()
+            elif time.monotonic() - self.checked_at >= self.generation_check_interval:
+                self.checked_at = time.monotonic()
+                if not catalog_cache_is_shared() or get_catalog_generation() != self.generation:
+                    self.sync()
+        finally:
+            self.refresh_lock.release()
+
+    def warm_up(self):
+        """Build the index now, e.g. when a worker starts; on database errors, at first use."""
+        try:
+            with self.refresh_lock:
+                if not self.built:
+                    self.rebuild()
+        except DatabaseError:
+            pass
+
+    def warm_up_in_background(self):
+        """warm_up() in a daemon thread, so the process starts serving at once."""
+        def run():
+            try:
+                self.warm_up()
+            finally:
+                connections.close_all()
+
+        threading.Thread(target=run, name='suggest-warm-up', daemon=True).start()
+
+    def update_product(self, product):
+        if not self.built:
+            return
+        with self.lock:
+            if not product.is_active:
+                self.remove_product(product.pk)
+                return
+            self.set_product_brand(product.pk, normalize_search_text(product.brand), product.brand)
+            self.product_data[product.pk] = self.describe_product(product)
+            self.products.add(*self.product_entry(product))
+
+    def remove_product(self, pk):
+        if not self.built:
+            return
+        with self.lock:
+            self.set_product_brand(pk, None)
+            self.product_data.pop(pk, None)
+            self.product_sales.pop(pk, None)
+            self.products.remove(pk)
+
+    def set_product_brand(self, pk, brand, name=None):
+        previous = self.product_brands.pop(pk, None)
+        if brand:
+            self.product_brands[pk] = brand
+        if previous == brand:
+            return
+        if previous:
+            self.brand_counts[previous] -= 1
+            if self.brand_counts[previous] <= 0:
+                del self.brand_counts[previous]
+                self.brand_names.pop(previous, None)
+                self.brands.remove(previous)
+            else:
+                self.brands.add(*self.brand_entry(previous))
+        if brand:
+            self.brand_counts[brand] += 1
+            self.brand_names.setdefault(brand, name)
+            self.brands.add(*self.brand_entry(brand))
+
+    def update_category(self, category):
+        if not self.built:
+            return
+        with self.lock:
+            if not category.is_active:
+                self.remove_category(category.pk)
+                return
+            self.category_data[category.pk] = {'id': category.pk, 'name': category.name}
+            self.categories.add(*self.category_entry(category))
+
+    def remove_category(self, pk):
+        if not self.built:
+            return
+        with self.lock:
+            self.category_data.pop(pk, None)
+            self.categories.remove(pk)
+
+    # Queries
+
+    def suggest(self, query, limit=8, request=None):
+        self.ensure_current()
+        prefix = normalize_search_text(query)
+
+        def image_url(name):
+            if not name:
+                return None
+            location = default_storage.url(name)
+            return request.build_absolute_uri(location) if request is not None else location
+
+        with self.lock:
+            products = [self.product_data[pk] for pk in self.products.search(prefix, limit)]
+            categories = [
+                self.category_data[pk] for pk in self.categories.search(prefix, min(limit, 5))
+            ]
+            brands = [
+                {'name': self.brand_names[brand], 'count': self.brand_counts[brand]}
+                for brand in self.brands.search(prefix, min(limit, 5))
+            ]
+        return {
+            'products': [{**product, 'image': image_url(product['image'])} for product in products],
+            'categories': categories,
+            'brands': brands,
+        }
+
+
+suggest_index = SuggestIndex()
@@ -0,0 +1,295 @@
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+from itertools import combinations
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from orders.models import Order, OrderItem
+from rafal_backend.storage import replace_file
+from .models import (
+    JobWatermark, ProductPairCount, ProductSalesDay, RelatedProduct, SalesRank
+)
+from .cache import catalog_cache_is_shared, get_catalog_generation, invalidate_catalog
+from .feeds import FEED_FORMATS, feed_storage_name, iter_feed
+from .sitemaps import write_sitemaps
+
+
+# Orders that never turned into a sale do not count as co-purchases
+EXCLUDED_ORDER_STATUSES = ('cancelled', 'refunded')
+
+# Keep IN (...) lists below the SQLite bound-parameter limit
+QUERY_CHUNK_SIZE = 500
+
+# Orders saved while the previous sales run was in flight are rescanned
+SALES_RESCAN_OVERLAP = timedelta(minutes=10)
+
+
+def chunked(values, size=QUERY_CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def add_pair_counts(deltas):
+    """Add ``{(product_a, product_b): orders}`` deltas to ProductPairCount."""
+    totals = dict(deltas)
+    firsts = {a for a, _ in deltas}
+    seconds = {b for _, b in deltas}
+    for first_chunk in chunked(firsts):
+        for second_chunk in chunked(seconds):
+            existing = ProductPairCount.objects.filter(
+                product_a__in=first_chunk, product_b__in=second_chunk
+            ).values_list('product_a', 'product_b', 'orders')
+            for a, b, orders in existing:
+                if (a, b) in totals:
+                    totals[(a, b)] += orders
+    ProductPairCount.objects.bulk_create(
+        [
+            ProductPairCount(product_a_id=a, product_b_id=b, orders=orders)
+            for (a, b), orders in totals.items()
+        ],
+        batch_size=QUERY_CHUNK_SIZE,
+        update_conflicts=True,
+        unique_fields=['product_a', 'product_b'],
+        update_fields=['orders'],
+    )
+
+
+def rebuild_neighbours(product_ids, total_orders, top_k, min_support):
+    """Recompute the ranked RelatedProduct rows of ``product_ids``."""
+    for chunk in chunked(product_ids):
+        chunk = set(chunk)
+        pairs = list(
+            ProductPairCount.objects.filter(
+                Q(product_a__in=chunk) | Q(product_b__in=chunk),
+                orders__gte=min_support
+            ).exclude(product_a=F('product_b')).values_list('product_a', 'product_b', 'orders')
+        )
+        involved = {a for a, _, _ in pairs} | {b for _, b, _ in pairs}
+        singles = {}
+        for ids in chunked(involved):
+            singles.update(
+                ProductPairCount.objects.filter(product_a__in=ids, product_b=F('product_a'))
+                .values_list('product_a', 'orders')
+            )
+
+        candidates = defaultdict(list)
+        for a, b, together in pairs:
+            for product, other in ((a, b), (b, a)):
+                if product not in chunk:
+                    continue
+                confidence = together / singles[product]
+                lift = together * total_orders / (singles[product] * singles[other])
+                candidates[product].append((lift, confidence, together, other))
+
+        rows = []
+        for product, scored in candidates.items():
+            scored.sort(key=lambda c: (-c[0], -c[1], -c[2], c[3]))
+            for rank, (lift, confidence, together, other) in enumerate(scored[:top_k], start=1):
+                rows.append(RelatedProduct(
+                    product_id=product, related_id=other, rank=rank,
+                    support=together, confidence=confidence, lift=lift
+                ))
+
+        with transaction.atomic():
+            RelatedProduct.objects.filter(product_id__in=chunk).delete()
+            RelatedProduct.objects.bulk_create(rows, batch_size=QUERY_CHUNK_SIZE)
+
+
+@shared_task
+def build_related_products(batch_size=1000, top_k=12, min_support=2):
+    """
+    Fold orders placed since the last run into the product pair counts, then
+    re-rank the "frequently bought together" neighbours of every product those
+    orders touched. Lift is P(A and B) / (P(A) * P(B)), confidence P(B | A).
+    """
+    touched = set()
+    while True:
+        with transaction.atomic():
+            watermark, _ = JobWatermark.objects.select_for_update().get_or_create(
+                name='related_products'
+            )
+            order_ids = list(
+                Order.objects.filter(pk__gt=watermark.last_id)
+                .order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not order_ids:
+                break
+
+            baskets = defaultdict(set)
+            items = OrderItem.objects.filter(
+                order_id__in=order_ids
+            ).exclude(order__status__in=EXCLUDED_ORDER_STATUSES).values_list('order_id', 'product_id')
+            for order_id, product_id in items:
+                baskets[order_id].add(product_id)
+
+            deltas = Counter()
+            for basket in baskets.values():
+                ordered = sorted(basket)
+                for product in ordered:
+                    deltas[(product, product)] += 1
+                for pair in combinations(ordered, 2):
+                    deltas[pair] += 1
+            if deltas:
+                add_pair_counts(deltas)
+
+            watermark.last_id = order_ids[-1]
+            watermark.processed += len(baskets)
+            watermark.save()
+            for basket in baskets.values():
+                touched.update(basket)
+
+    if touched:
+        total_orders = JobWatermark.objects.get(name='related_products').processed
+        rebuild_neighbours(touched, total_orders, top_k, min_support)
+        invalidate_catalog()
+    return len(touched)
+
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def rebuild_sales_days(days):
+    """Recompute the ProductSalesDay rows of ``days`` from their orders."""
+    for chunk in chunked(sorted(days)):
+        totals = (
+            OrderItem.objects.filter(
+                # Bound the scan with an index-friendly range first
+                order__created_at__gte=day_start(chunk[0]),
+                order__created_at__lt=day_start(chunk[-1] + timedelta(days=1))
+            )
+            .annotate(day=TruncDate('order__created_at'))
+            .filter(day__in=chunk)
+            .exclude(order__status__in=EXCLUDED_ORDER_STATUSES)
+            .values('product_id', 'day')
+            .annotate(quantity=Sum('quantity'), revenue=Sum('total'))
+            .order_by()
+        )
+        rows = [
+            ProductSalesDay(
+                product_id=row['product_id'], day=row['day'],
+                quantity=row['quantity'], revenue=row['revenue']
+            )
+            for row in totals
+        ]
+        with transaction.atomic():
+            ProductSalesDay.objects.filter(day__in=chunk).delete()
+            ProductSalesDay.objects.bulk_create(rows, batch_size=QUERY_CHUNK_SIZE)
+
+
+def rank_window(window, today):
+    """
+    Rewrite the SalesRank rows of ``window`` from the daily totals; returns
+    whether the ranking changed, leaving the rows untouched when it did not.
+    """
+    totals = (
+        ProductSalesDay.objects.filter(day__gt=today - timedelta(days=window))
+        .values('product_id')
+        .annotate(quantity=Sum('quantity'), revenue=Sum('revenue'))
+        .filter(quantity__gt=0)
+        .order_by('-quantity', '-revenue', 'product_id')
+    )
+    ranking = [
+        (rank, row['product_id'], row['quantity'], row['revenue'])
+        for rank, row in enumerate(totals, start=1)
+    ]
+    current = list(
+        SalesRank.objects.filter(window=window).order_by('rank')
+        .values_list('rank', 'product_id', 'quantity', 'revenue')
+    )
+    if current == ranking:
+        return False
+    with transaction.atomic():
+        SalesRank.objects.filter(window=window).delete()
+        SalesRank.objects.bulk_create(
+            [
+                SalesRank(window=window, product_id=product, rank=rank,
+                          quantity=quantity, revenue=revenue)
+                for rank, product, quantity, revenue in ranking
+            ],
+            batch_size=QUERY_CHUNK_SIZE
+        )
+    return True
+
+
+@shared_task
+def build_sales_ranks():
+    """
+    Refresh the best-seller ranking of every SalesRank window.
+
+    Daily totals are rebuilt only for the days of orders placed since the last
+    run or changed since then (a later cancellation or refund drops out of its
+    day), then each rolling window is re-ranked from those daily totals.
+    """
+    today = timezone.localdate()
+    longest = max(window for window, _ in SalesRank.WINDOW_CHOICES)
+    cutoff = day_start(today - timedelta(days=longest - 1))
+    with transaction.atomic():
+        watermark, _ = JobWatermark.objects.select_for_update().get_or_create(name='sales_ranks')
+        last_id = Order.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        new_orders = Order.objects.filter(pk__gt=watermark.last_id, pk__lte=last_id)
+        changed_orders = new_orders.filter(created_at__gte=cutoff)
+        if watermark.last_id:
+            changed_orders |= Order.objects.filter(
+                pk__lte=watermark.last_id, created_at__gte=cutoff,
+                updated_at__gte=watermark.updated_at - SALES_RESCAN_OVERLAP
+            )
+        days = set(
+            changed_orders.annotate(day=TruncDate('created_at'))
+            .order_by().values_list('day', flat=True).distinct()
+        )
+        if days:
+            rebuild_sales_days(days)
+
+        ProductSalesDay.objects.filter(day__lte=today - timedelta(days=longest)).delete()
+        changed = [
+            window for window, _ in SalesRank.WINDOW_CHOICES
+            if rank_window(window, today)
+        ]
+
+        watermark.processed += new_orders.count()
+        watermark.last_id = last_id
+        watermark.save()
+
+    if changed:
+        invalidate_catalog()
+    return changed
+
+
+@shared_task
+def render_product_feeds(force=False):
+    """
+    Write gzipped XML and CSV product feeds to storage for crawlers, when
+    the catalog generation moved since the last render, or on every run
+    when the cache is process-local and the generation misses other
+    processes' writes. Each file is spooled through a temporary file, so
+    memory stays flat, and replaces the previous one only once complete.
+    """
+    generation = get_catalog_generation()
+    watermark, _ = JobWatermark.objects.get_or_create(name='product_feeds')
+    if not force and catalog_cache_is_shared() and watermark.last_id == generation:
+        return False
+    for format_name in FEED_FORMATS:
+        replace_file(
+            feed_storage_name(format_name), iter_feed(format_name, settings.BACKEND_URL),
+            compress=True
+        )
+    watermark.last_id = generation
+    watermark.processed += 1
+    watermark.save()
+    return True
+
+
+@shared_task
+def build_sitemaps(force=False):
+    """
+    Rewrite the sitemap shards whose products or categories changed since
+    they were written, then the sitemap index.
+    """
+    written, removed = write_sitemaps(force=force)
+    return {'written': len(written), 'removed': len(removed)}
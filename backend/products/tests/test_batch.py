@@ -0,0 +1,44 @@
+from decimal import Decimal
+from django.test import TestCase
+from rest_framework.test import APIClient
+from products.models import Category, Product
+
+
+class BatchTests(TestCase):
+    url = '/api/products/batch/?view=list'
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Fans')
+        cls.first, cls.second = (
+            Product.objects.create(name=name, price=Decimal('100'), category=category)
+            for name in ('Desk fan', 'Ceiling fan')
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def post(self, data):
+        return self.client.post(self.url, data, format='json')
+
+    def test_post_object(self):
+        response = self.post({'ids': [self.second.pk, self.first.pk, 0]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [product['id'] for product in response.json()['results']],
+            [self.second.pk, self.first.pk]
+        )
+        self.assertEqual(response.json()['missing'], [0])
+
+    def test_post_bare_list(self):
+        response = self.post([self.first.pk, self.second.pk])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [product['id'] for product in response.json()['results']],
+            [self.first.pk, self.second.pk]
+        )
+
+    def test_post_scalar_is_rejected(self):
+        response = self.post(5)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ids', response.json())
@@ -0,0 +1,68 @@
+from decimal import Decimal
+from unittest import mock
+from django.test import TestCase
+from rest_framework.test import APIClient
+from rafal_backend.pagination import KeysetPageNumberPagination
+from products.models import Category, Product, SalesRank
+
+
+class BestSellersTests(TestCase):
+    url = '/api/products/best_sellers/'
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Fans')
+        cls.flagged = Product.objects.create(
+            name='Flagged fan', price=Decimal('100'), category=category, is_best_seller=True
+        )
+        cls.top = Product.objects.create(name='Top fan', price=Decimal('200'), category=category)
+        cls.second = Product.objects.create(name='Second fan', price=Decimal('300'), category=category)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def result_ids(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [product['id'] for product in response.json()['results']]
+
+    def test_falls_back_to_flag_before_ranks_are_built(self):
+        self.assertEqual(self.result_ids(self.client.get(self.url)), [self.flagged.pk])
+
+    def rank(self, *products):
+        for rank, product in enumerate(products, start=1):
+            SalesRank.objects.create(
+                window=SalesRank.DEFAULT_WINDOW, product=product, rank=rank,
+                quantity=10 - rank, revenue=Decimal('1000'),
+            )
+
+    def test_ranks_by_sales_window(self):
+        self.rank(self.top, self.second)
+        self.assertEqual(
+            self.result_ids(self.client.get(self.url)), [self.top.pk, self.second.pk]
+        )
+
+    def test_falls_back_per_window(self):
+        SalesRank.objects.create(
+            window=7, product=self.top, rank=1, quantity=5, revenue=Decimal('1000')
+        )
+        self.assertEqual(self.result_ids(self.client.get(self.url, {'window': 7})), [self.top.pk])
+        self.assertEqual(
+            self.result_ids(self.client.get(self.url, {'window': 90})), [self.flagged.pk]
+        )
+
+    @mock.patch.object(KeysetPageNumberPagination, 'page_size', 1)
+    def test_cursor_pages_through_ranks(self):
+        self.rank(self.second, self.flagged, self.top)
+        seen = []
+        url = self.url + '?cursor='
+        while url:
+            response = self.client.get(url)
+            seen += self.result_ids(response)
+            self.assertNotIn('count', response.json())
+            url = response.json()['next']
+        self.assertEqual(seen, [self.second.pk, self.flagged.pk, self.top.pk])
+
+    def test_cursor_before_ranks_are_built(self):
+        response = self.client.get(self.url, {'cursor': ''})
+        self.assertEqual(self.result_ids(response), [self.flagged.pk])
+        self.assertIsNone(response.json()['next'])
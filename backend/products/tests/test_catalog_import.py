@@ -0,0 +1,52 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from products.models import Category, Product
+
+
+class CatalogImportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Fans')
+
+    def import_file(self, suffix, content):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False, encoding='utf-8') as file:
+            file.write(content)
+        self.addCleanup(os.remove, file.name)
+        stdout, stderr = StringIO(), StringIO()
+        call_command('catalog_import', file.name, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_jsonl_skips_malformed_line(self):
+        def row(sku):
+            return json.dumps({
+                'sku': sku, 'name': f'Fan {sku}', 'price': '100',
+                'category': self.category.pk, 'image': 'products/fan.jpg',
+            }) + '\n'
+
+        stdout, stderr = self.import_file(
+            '.jsonl', row('FAN-1') + '{"sku": "FAN-2", "name": \n' + row('FAN-3')
+        )
+        self.assertIn('line 2:', stderr)
+        self.assertIn('Invalid JSON', stderr)
+        self.assertIn('2 created', stdout)
+        self.assertIn('1 skipped', stdout)
+        self.assertEqual(
+            sorted(Product.objects.values_list('sku', flat=True)), ['FAN-1', 'FAN-3']
+        )
+
+    def test_csv_skips_row_with_malformed_list_cell(self):
+        stdout, stderr = self.import_file('.csv', (
+            'sku,name,price,category,image,features\n'
+            f'FAN-1,Fan 1,100,{self.category.pk},products/fan.jpg,"[""Quiet""]"\n'
+            f'FAN-2,Fan 2,100,{self.category.pk},products/fan.jpg,"[""Quiet"""\n'
+        ))
+        self.assertIn('line 3:', stderr)
+        self.assertIn('features', stderr)
+        self.assertIn('1 created', stdout)
+        self.assertIn('1 skipped', stdout)
+        self.assertEqual(list(Product.objects.values_list('sku', flat=True)), ['FAN-1'])
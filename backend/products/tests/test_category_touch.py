@@ -0,0 +1,44 @@
+from decimal import Decimal
+from django.test import TestCase
+from rest_framework.test import APIClient
+from products.models import Category, Product
+
+
+class CategoryTouchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Fans')
+        cls.product = Product.objects.create(
+            name='Desk fan', price=Decimal('100'), category=cls.category
+        )
+
+    def updated_at(self):
+        return Product.objects.values_list('updated_at', flat=True).get(pk=self.product.pk)
+
+    def test_edits_without_a_rename_keep_product_validators(self):
+        client = APIClient()
+        url = f'/api/products/{self.product.pk}/'
+        etag = client.get(url)['ETag']
+        before = self.updated_at()
+
+        self.category.order = 3
+        self.category.is_active = False
+        self.category.save()
+        self.category.order = 4
+        self.category.save(update_fields=['order'])
+
+        self.assertEqual(self.updated_at(), before)
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_rename_touches_the_products(self):
+        before = self.updated_at()
+        self.category.name = 'Cooling'
+        self.category.save()
+        self.assertGreater(self.updated_at(), before)
+
+    def test_rename_with_update_fields_touches_the_products(self):
+        before = self.updated_at()
+        self.category.name = 'Cooling'
+        self.category.save(update_fields=['name'])
+        self.assertGreater(self.updated_at(), before)
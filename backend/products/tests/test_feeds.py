@@ -0,0 +1,109 @@
+import csv
+import gzip
+import io
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from unittest import mock
+from xml.etree import ElementTree
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from products.feeds import feed_storage_name
+from products.models import Category, Product, ProductColor
+from products.tasks import render_product_feeds
+
+
+G = '{http://base.google.com/ns/1.0}'
+
+
+class ProductFeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Fans')
+        cls.plain = Product.objects.create(
+            name='Desk fan', price=Decimal('100'), original_price=Decimal('150'),
+            category=category, sku='DF-1',
+        )
+        cls.colored = Product.objects.create(name='Ceiling fan', price=Decimal('300'), category=category)
+        cls.black, cls.white = (
+            ProductColor.objects.create(
+                product=cls.colored, name=name, hex_value='#000000', price=Decimal('320'),
+                quantity=quantity,
+            )
+            for name, quantity in (('Black', 4), ('White', 0))
+        )
+        ProductColor.objects.create(
+            product=cls.colored, name='Red', hex_value='#ff0000', price=Decimal('320'),
+            is_active=False,
+        )
+        Product.objects.create(name='Hidden fan', price=Decimal('100'), category=category, is_active=False)
+
+    def stream(self, format_name):
+        response = self.client.get(f'/api/products/feed.{format_name}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def assertFeedItems(self, items):
+        self.assertEqual(items[str(self.plain.pk)], {
+            'item_group_id': '', 'title': 'Desk fan', 'price': '150.00 EGP',
+            'sale_price': '100.00 EGP', 'availability': 'in stock', 'color': '', 'mpn': 'DF-1',
+        })
+        self.assertEqual(items[f'{self.colored.pk}-{self.black.pk}'], {
+            'item_group_id': str(self.colored.pk), 'title': 'Ceiling fan', 'price': '320.00 EGP',
+            'sale_price': '', 'availability': 'in stock', 'color': 'Black', 'mpn': '',
+        })
+        self.assertEqual(items[f'{self.colored.pk}-{self.white.pk}']['availability'], 'out of stock')
+        self.assertEqual(len(items), 3)
+
+    def test_xml(self):
+        channel = ElementTree.fromstring(self.stream('xml')).find('channel')
+        items = {}
+        for item in channel.findall('item'):
+            values = {field: item.findtext(f'{G}{field}', '') for field in (
+                'id', 'item_group_id', 'title', 'price', 'sale_price', 'availability', 'color', 'mpn'
+            )}
+            items[values.pop('id')] = values
+        self.assertFeedItems(items)
+
+    def test_csv(self):
+        rows = csv.DictReader(io.StringIO(self.stream('csv')))
+        fields = ('item_group_id', 'title', 'price', 'sale_price', 'availability', 'color', 'mpn')
+        self.assertFeedItems({row['id']: {field: row[field] for field in fields} for row in rows})
+
+
+class RenderProductFeedsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            name='Desk fan', price=Decimal('100'), category=Category.objects.create(name='Fans')
+        )
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def stored_feed(self, format_name):
+        with default_storage.open(feed_storage_name(format_name)) as stored:
+            return gzip.decompress(stored.read()).decode()
+
+    def test_rerender_replaces_files_in_place(self):
+        render_product_feeds(force=True)
+        self.assertIn('Desk fan', self.stored_feed('csv'))
+
+        Product.objects.filter(pk=self.product.pk).update(name='Pedestal fan')
+        with mock.patch.object(default_storage, 'delete') as delete:
+            render_product_feeds(force=True)
+        delete.assert_not_called()
+        for format_name in ('xml', 'csv'):
+            self.assertIn('Pedestal fan', self.stored_feed(format_name))
+            self.assertNotIn('Desk fan', self.stored_feed(format_name))
+        self.assertEqual(sorted(os.listdir(default_storage.path('feeds'))), [
+            'products.csv.gz', 'products.xml.gz'
+        ])
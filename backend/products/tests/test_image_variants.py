@@ -0,0 +1,37 @@
+from decimal import Decimal
+from unittest import mock
+from django.test import TestCase, override_settings
+from kombu.exceptions import OperationalError
+from products.models import Category, Product
+from rafal_backend.images import generate_image_variants
+
+
+class QueueImageVariantsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Fans')
+
+    def create_product(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Product.objects.create(
+                name='Ceiling fan', price=Decimal('100'), category=self.category,
+                image='products/fan.jpg',
+            )
+
+    @override_settings(IMAGE_VARIANTS_QUEUE=True)
+    def test_save_succeeds_when_broker_is_unreachable(self):
+        refused = OperationalError('Error 111 connecting to localhost:6379. Connection refused.')
+        with mock.patch.object(generate_image_variants, 'apply_async', side_effect=refused) as send:
+            with self.assertLogs('rafal_backend.images', 'WARNING'):
+                product = self.create_product()
+        send.assert_called_once_with(
+            ('products.Product', product.pk, 'image'), ignore_result=True, retry=False
+        )
+        self.assertTrue(Product.objects.filter(pk=product.pk).exists())
+
+    @override_settings(IMAGE_VARIANTS_QUEUE=False)
+    def test_nothing_is_queued_without_a_broker(self):
+        with mock.patch.object(generate_image_variants, 'apply_async') as send:
+            self.create_product()
+        send.assert_not_called()
@@ -0,0 +1,141 @@
+"""
+EXPLAIN QUERY PLAN regression tests for the catalog's hot queries: each
+endpoint's page query must be served by its index, without a full table
+scan or a temporary B-tree for the ORDER BY, so dropping or reshaping one
+of the indexes fails here.
+"""
+import unittest
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from products.models import Category, Product, ProductReview
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Plans are read with SQLite EXPLAIN QUERY PLAN.')
+class QueryPlanTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Fans')
+        other = Category.objects.create(name='Lighting')
+        cls.products = [
+            Product.objects.create(
+                name=f'Product {number:02}', price=Decimal(50 + number * 10),
+                category=cls.category if number % 2 else other,
+                is_featured=number % 3 == 0, is_offer=number % 4 == 0,
+                is_best_seller=number % 5 == 0, sku=f'SKU-{number:02}',
+            )
+            for number in range(30)
+        ]
+        User = get_user_model()
+        product = cls.products[1]
+        for number in range(12):
+            user = User.objects.create(
+                email=f'reviewer{number}@example.com', phone=f'0100000{number:04}'
+            )
+            ProductReview.objects.create(
+                product=product, user=user, rating=4, comment='Good', is_approved=True
+            )
+        # Distinct review dates, so cursors move through them
+        for offset, review in enumerate(ProductReview.objects.order_by('pk')):
+            ProductReview.objects.filter(pk=review.pk).update(
+                created_at=timezone.now() - timedelta(hours=offset)
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def get_page(self, url, table='products_product'):
+        """The response for ``url`` and the plan of its query reading a page of ``table``."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        pages = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT') and f'FROM "{table}"' in query['sql']
+            and ' LIMIT ' in query['sql'] and ' ORDER BY ' in query['sql']
+        ]
+        self.assertTrue(pages, f'No page query on {table} for {url}')
+        return response, self.explain(pages[-1])
+
+    def assertUsesIndex(self, plan, index, table='products_product'):
+        self.assertTrue(
+            any(f'{table} USING INDEX {index}' in step for step in plan),
+            f'{index} is not used: {plan}'
+        )
+        self.assertFalse(
+            any('USE TEMP B-TREE' in step for step in plan), f'Sorts in a temp B-tree: {plan}'
+        )
+
+    def assertIndexedPage(self, url, index, table='products_product'):
+        response, plan = self.get_page(url, table)
+        self.assertUsesIndex(plan, index, table)
+        return response
+
+    def test_featured(self):
+        self.assertIndexedPage('/api/products/featured/', 'product_featured_idx')
+
+    def test_offers(self):
+        self.assertIndexedPage('/api/products/offers/', 'product_offer_idx')
+
+    def test_best_seller_flag(self):
+        self.assertIndexedPage('/api/products/?is_best_seller=true', 'product_best_seller_idx')
+
+    def test_default_listing(self):
+        self.assertIndexedPage('/api/products/', 'product_active_created_idx')
+
+    def test_price_range_ordered_by_price(self):
+        response, plan = self.get_page(
+            '/api/products/?min_price=100&max_price=250&ordering=price'
+        )
+        self.assertUsesIndex(plan, 'product_active_price_idx')
+        self.assertTrue(any('price>? AND price<?' in step for step in plan), plan)
+
+    def test_ordered_by_rating(self):
+        self.assertIndexedPage('/api/products/?ordering=-rating', 'product_active_rating_idx')
+
+    def test_ordered_by_reviews(self):
+        self.assertIndexedPage('/api/products/?ordering=-reviews', 'product_active_reviews_idx')
+
+    def test_category_filter(self):
+        response, plan = self.get_page(f'/api/products/?category={self.category.pk}')
+        self.assertUsesIndex(plan, 'product_category_created_idx')
+        self.assertTrue(any('(category_id=?)' in step for step in plan), plan)
+
+    def test_reviews(self):
+        self.assertIndexedPage(
+            f'/api/products/{self.products[1].pk}/reviews/?page_size=5',
+            'review_approved_idx', table='products_productreview'
+        )
+
+    def test_reviews_cursor(self):
+        url = f'/api/products/{self.products[1].pk}/reviews/?page_size=5'
+        response = self.assertIndexedPage(url, 'review_approved_idx', 'products_productreview')
+        self.assertIndexedPage(
+            response.json()['next'], 'review_approved_idx', 'products_productreview'
+        )
+
+    def test_keyset_cursors(self):
+        for ordering, index in (
+            ('-created_at', 'product_active_created_idx'),
+            ('price', 'product_active_price_idx'),
+            ('-price', 'product_active_price_idx'),
+            ('name', 'product_active_name_idx'),
+        ):
+            with self.subTest(ordering=ordering):
+                response = self.assertIndexedPage(
+                    f'/api/products/?ordering={ordering}&cursor=', index
+                )
+                next_url = response.json()['next']
+                self.assertTrue(next_url)
+                self.assertIndexedPage(next_url, index)
@@ -0,0 +1,39 @@
+from decimal import Decimal
+from django.test import TestCase
+from rest_framework.test import APIClient
+from products.models import Category, Product, RelatedProduct
+
+
+class RelatedConditionalGetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        fans = Category.objects.create(name='Fans')
+        lighting = Category.objects.create(name='Lighting')
+        cls.product = Product.objects.create(name='Ceiling fan', price=Decimal('100'), category=fans)
+        cls.neighbour = Product.objects.create(name='LED bulb', price=Decimal('20'), category=lighting)
+        RelatedProduct.objects.create(
+            product=cls.product, related=cls.neighbour, rank=1, support=3, confidence=0.5, lift=2.0
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = f'/api/products/{self.product.pk}/related/'
+
+    def get(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(self.url, **headers)
+
+    def test_unchanged_related_products_are_not_modified(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([product['id'] for product in response.json()], [self.neighbour.pk])
+        self.assertEqual(self.get(response['ETag']).status_code, 304)
+
+    def test_edited_neighbour_in_another_category_changes_etag(self):
+        etag = self.get()['ETag']
+        self.neighbour.price = Decimal('25')
+        self.neighbour.save()
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['price'], '25.00')
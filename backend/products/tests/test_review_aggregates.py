@@ -0,0 +1,107 @@
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase
+from products.models import Category, Product, ProductReview
+
+
+AGGREGATE_FIELDS = (
+    'rating_sum', 'approved_review_count', 'rating_avg', *Product.STAR_COUNT_FIELDS.values()
+)
+
+
+class ReviewAggregateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Fans')
+        cls.fan, cls.heater = (
+            Product.objects.create(name=name, price=Decimal('100'), category=category)
+            for name in ('Desk fan', 'Heater')
+        )
+        User = get_user_model()
+        cls.users = [
+            User.objects.create(email=f'reviewer{number}@example.com', phone=f'0100000{number:04}')
+            for number in range(5)
+        ]
+
+    def review(self, user, rating, is_approved=True, product=None):
+        return ProductReview.objects.create(
+            product=product or self.fan, user=self.users[user], rating=rating,
+            is_approved=is_approved
+        )
+
+    def stored(self):
+        return {
+            pk: (*values[:2], round(values[2], 6), *values[3:])
+            for pk, *values in Product.objects.order_by('pk').values_list('pk', *AGGREGATE_FIELDS)
+        }
+
+    def assertAggregatesCurrent(self):
+        """The stored aggregates equal what rebuild_review_aggregates computes."""
+        stored = self.stored()
+        savepoint = transaction.savepoint()
+        Product.rebuild_review_aggregates()
+        rebuilt = self.stored()
+        transaction.savepoint_rollback(savepoint)
+        self.assertEqual(stored, rebuilt)
+
+    def test_saves_and_deletes(self):
+        pending = self.review(0, 4, is_approved=False)
+        self.assertAggregatesCurrent()
+        self.assertEqual(Product.objects.get(pk=self.fan.pk).approved_review_count, 0)
+
+        five = self.review(1, 5)
+        three = self.review(2, 3)
+        self.assertAggregatesCurrent()
+        fan = Product.objects.get(pk=self.fan.pk)
+        self.assertEqual((fan.rating_sum, fan.approved_review_count, fan.rating_avg), (8, 2, 4.0))
+        self.assertEqual((fan.rating_3_count, fan.rating_5_count), (1, 1))
+
+        pending.is_approved = True
+        pending.save()
+        self.assertAggregatesCurrent()
+
+        five.is_approved = False
+        five.save()
+        self.assertAggregatesCurrent()
+
+        three.rating = 1
+        three.save()
+        self.assertAggregatesCurrent()
+
+        three.product = self.heater
+        three.save()
+        self.assertAggregatesCurrent()
+        self.assertEqual(Product.objects.get(pk=self.heater.pk).rating_1_count, 1)
+
+        pending.delete()
+        self.assertAggregatesCurrent()
+        ProductReview.objects.all().delete()
+        self.assertAggregatesCurrent()
+        fan = Product.objects.get(pk=self.fan.pk)
+        self.assertEqual((fan.rating_sum, fan.approved_review_count, fan.rating_avg), (0, 0, 0.0))
+
+    def test_queryset_updates(self):
+        self.review(0, 4, is_approved=False)
+        self.review(1, 2, is_approved=False)
+        self.review(2, 5, product=self.heater)
+        before = Product.objects.get(pk=self.fan.pk).updated_at
+
+        ProductReview.objects.filter(product=self.fan).update(is_approved=True)
+        self.assertAggregatesCurrent()
+        fan = Product.objects.get(pk=self.fan.pk)
+        self.assertEqual((fan.approved_review_count, fan.rating_avg), (2, 3.0))
+        self.assertGreater(fan.updated_at, before)
+
+        ProductReview.objects.filter(rating=2).update(rating=5)
+        self.assertAggregatesCurrent()
+
+        ProductReview.objects.filter(product=self.heater).update(product=self.fan)
+        self.assertAggregatesCurrent()
+        self.assertEqual(Product.objects.get(pk=self.heater.pk).approved_review_count, 0)
+
+        ProductReview.objects.update(is_approved=False)
+        self.assertAggregatesCurrent()
+        ProductReview.objects.update(comment='Checked')
+        self.assertAggregatesCurrent()
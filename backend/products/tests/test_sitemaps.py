@@ -0,0 +1,91 @@
+import gzip
+import shutil
+import tempfile
+from decimal import Decimal
+from unittest import mock
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from products.models import Category, Product, SitemapShard
+from products.sitemaps import SITEMAP_INDEX_NAME, shard_name, write_sitemaps
+
+
+SHARD_SIZE = 2
+
+
+@mock.patch('products.sitemaps.SITEMAP_SHARD_SIZE', SHARD_SIZE)
+class WriteSitemapsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Fans')
+        cls.products = [
+            Product.objects.create(name=f'Fan {number}', price=Decimal('100'), category=cls.category)
+            for number in range(6)
+        ]
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def shard(self, row):
+        return (row.pk - 1) // SHARD_SIZE
+
+    def full_shard(self):
+        """The number and products of a shard holding SHARD_SIZE products."""
+        shards = {}
+        for product in self.products:
+            shards.setdefault(self.shard(product), []).append(product)
+        return next(
+            (number, products) for number, products in shards.items()
+            if len(products) == SHARD_SIZE
+        )
+
+    def stored(self, name):
+        with default_storage.open(name) as stored:
+            content = stored.read()
+        return (gzip.decompress(content) if name.endswith('.gz') else content).decode()
+
+    def test_first_run_writes_every_shard_and_the_index(self):
+        written, removed = write_sitemaps()
+        shards = {self.shard(product) for product in self.products}
+        self.assertEqual(
+            sorted(written), [('categories', self.shard(self.category))]
+            + [('products', number) for number in sorted(shards)]
+        )
+        self.assertEqual(removed, [])
+        index = self.stored(SITEMAP_INDEX_NAME)
+        for number in shards:
+            self.assertIn(shard_name('products', number), index)
+        product = self.products[0]
+        self.assertIn(
+            f'/product/{product.pk}</loc>',
+            self.stored(shard_name('products', self.shard(product)))
+        )
+
+    def test_unchanged_run_writes_nothing(self):
+        write_sitemaps()
+        self.assertEqual(write_sitemaps(), ([], []))
+
+    def test_edited_row_rewrites_only_its_shard(self):
+        write_sitemaps()
+        product = self.products[3]
+        product.price = Decimal('120')
+        product.save()
+        self.assertEqual(write_sitemaps(), ([('products', self.shard(product))], []))
+
+    def test_emptied_shard_is_removed(self):
+        write_sitemaps()
+        number, (deleted, deactivated) = self.full_shard()
+        name = shard_name('products', number)
+        self.assertTrue(default_storage.exists(name))
+
+        deleted.delete()
+        deactivated.is_active = False
+        deactivated.save()
+        self.assertEqual(write_sitemaps(), ([], [('products', number)]))
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(SitemapShard.objects.filter(section='products', number=number).exists())
+        self.assertNotIn(name, self.stored(SITEMAP_INDEX_NAME))
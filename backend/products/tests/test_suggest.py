@@ -0,0 +1,138 @@
+from decimal import Decimal
+from unittest import mock
+from django.test import TestCase
+from django.utils import timezone
+from products.models import Category, Product, SalesRank
+from products.suggest import PrefixIndex, SuggestIndex
+
+
+class PrefixIndexTests(TestCase):
+
+    def test_add_and_remove_match_a_fresh_build(self):
+        entries = [
+            (1, {'ceiling fan', 'fan'}, (2,)),
+            (2, {'desk fan', 'fan'}, (1,)),
+            (3, {'fridge'}, (3,)),
+        ]
+        index = PrefixIndex()
+        for entry in entries:
+            index.add(*entry)
+        index.add(4, {'fan heater', 'heater'}, (0,))
+        index.remove(3)
+        index.remove(4)
+        index.remove(5)
+        built = PrefixIndex.build(entries[:2])
+        self.assertEqual(index.keys, built.keys)
+        self.assertEqual(index.short, built.short)
+        self.assertEqual(index.search('f', 5), [2, 1])
+        self.assertEqual(index.search('fan', 5), [2, 1])
+        self.assertEqual(index.search('fri', 5), [])
+        self.assertEqual(index.search('', 5), [])
+
+
+class SuggestIndexTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fans = Category.objects.create(name='Fans')
+        cls.ceiling = cls.create_product('Ceiling Fan', 'CF-100', 'Tornado', rating_avg=4.0)
+        cls.desk = cls.create_product('Desk Fan', 'DF-200', 'Tornado', rating_avg=3.0)
+        cls.stand = cls.create_product('Stand Fan', 'SF-300', 'Fresh', rating_avg=5.0)
+        cls.arabic = cls.create_product('مروحة سقف', 'AR-400', 'Fresh')
+        SalesRank.objects.create(
+            window=SalesRank.DEFAULT_WINDOW, product=cls.desk, rank=1, quantity=50,
+            revenue=Decimal('5000'),
+        )
+
+    @classmethod
+    def create_product(cls, name, sku, brand, **fields):
+        return Product.objects.create(
+            name=name, sku=sku, brand=brand, price=Decimal('100'), category=cls.fans, **fields
+        )
+
+    def setUp(self):
+        self.index = SuggestIndex()
+        self.index.rebuild()
+
+    def product_ids(self, query, limit=8):
+        return [product['id'] for product in self.index.suggest(query, limit)['products']]
+
+    def brands(self, query):
+        return {brand['name']: brand['count'] for brand in self.index.suggest(query)['brands']}
+
+    def test_word_suffix_and_sku_matches(self):
+        self.assertIn(self.ceiling.pk, self.product_ids('fan'))
+        self.assertEqual(self.product_ids('ceil'), [self.ceiling.pk])
+        self.assertEqual(self.product_ids('df 2'), [self.desk.pk])
+        self.assertEqual(self.product_ids('200'), [self.desk.pk])
+        self.assertEqual(self.index.suggest('fa')['categories'], [
+            {'id': self.fans.pk, 'name': 'Fans'}
+        ])
+
+    def test_arabic_folding(self):
+        self.assertEqual(self.product_ids('مروحه'), [self.arabic.pk])
+        self.assertEqual(self.product_ids('سقف'), [self.arabic.pk])
+
+    def test_ranks_by_units_sold_then_rating(self):
+        expected = [self.desk.pk, self.stand.pk, self.ceiling.pk]
+        # Long prefixes rank on demand, short ones are precomputed
+        self.assertEqual(self.product_ids('fan'), expected)
+        self.assertEqual(self.product_ids('f'), expected)
+        self.assertEqual(self.product_ids('fan', limit=2), expected[:2])
+
+    def test_brand_counts_follow_updates_and_removals(self):
+        self.assertEqual(self.brands('tor'), {'Tornado': 2})
+        self.assertEqual(self.brands('fr'), {'Fresh': 2})
+
+        self.ceiling.brand = 'Fresh'
+        self.index.update_product(self.ceiling)
+        self.assertEqual(self.brands('tor'), {'Tornado': 1})
+        self.assertEqual(self.brands('fr'), {'Fresh': 3})
+
+        self.index.remove_product(self.desk.pk)
+        self.assertEqual(self.brands('t'), {})
+        self.assertEqual(self.brands('fresh'), {'Fresh': 3})
+        self.assertNotIn(self.desk.pk, self.product_ids('fan'))
+
+        self.ceiling.is_active = False
+        self.index.update_product(self.ceiling)
+        self.assertEqual(self.brands('fresh'), {'Fresh': 2})
+        self.assertEqual(self.product_ids('ceil'), [])
+
+    def test_sync_reads_updated_rows(self):
+        Product.objects.filter(pk=self.ceiling.pk).update(
+            name='Pedestal Fan', brand='Kiriazi', updated_at=timezone.now()
+        )
+        built_at = self.index.built_at
+        self.index.sync()
+        self.assertEqual(self.index.built_at, built_at)
+        self.assertEqual(self.product_ids('pedestal'), [self.ceiling.pk])
+        self.assertEqual(self.product_ids('ceil'), [])
+        self.assertEqual(self.brands('kir'), {'Kiriazi': 1})
+        self.assertEqual(self.brands('tor'), {'Tornado': 1})
+
+    def test_sync_rebuilds_after_a_delete(self):
+        Product.objects.filter(pk=self.stand.pk).delete()
+        built_at = self.index.built_at
+        self.index.sync()
+        self.assertGreater(self.index.built_at, built_at)
+        self.assertNotIn(self.stand.pk, self.product_ids('fan'))
+        self.assertEqual(self.brands('fresh'), {'Fresh': 1})
+
+    def test_signals_update_the_index_on_commit(self):
+        with mock.patch('products.signals.suggest_index', self.index):
+            with self.captureOnCommitCallbacks(execute=True):
+                product = self.create_product('Wall Fan', 'WF-500', 'Tornado')
+            self.assertEqual(self.product_ids('wall'), [product.pk])
+            self.assertEqual(self.brands('tor'), {'Tornado': 3})
+
+            with self.captureOnCommitCallbacks(execute=True):
+                product.delete()
+            self.assertEqual(self.product_ids('wall'), [])
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.fans.name = 'Cooling'
+                self.fans.save()
+            self.assertEqual(self.index.suggest('cool')['categories'], [
+                {'id': self.fans.pk, 'name': 'Cooling'}
+            ])
@@ -1,11 +1,12 @@
-from django.urls import path, include
+from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
-from .views import CategoryViewSet, ProductViewSet
+from .views import CategoryViewSet, ProductViewSet, product_feed
 
 router = DefaultRouter()
 router.register(r'categories', CategoryViewSet)
 router.register(r'', ProductViewSet)
 
 urlpatterns = [
+    re_path(r'^feed\.(?P<format_name>xml|csv)$', product_feed, name='product-feed'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,18 +1,33 @@
 from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from django.http import StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from django.db.models import Count, F, Max, Prefetch, Q, Subquery
 from django_filters.rest_framework import DjangoFilterBackend
+from rafal_backend.pagination import KeysetPageNumberPagination, KeysetPagination
+from rafal_backend.conditional import ConditionalGetMixin
+from rafal_backend.sparse import SparseFieldset
 from .models import (
-    Category, Product, ProductReview
+    Category, Product, ProductImage, ProductColor, ProductReview, RelatedProduct,
+    SalesRank
 )
 from .serializers import (
     CategorySerializer, ProductListSerializer, ProductDetailSerializer,
     ProductReviewSerializer
 )
-from .filters import ProductFilter
+from .filters import ProductFilter, ProductOrderingFilter, ProductSearchFilter
+from .facets import compute_product_facets
+from .compare import build_comparison_matrix, comparison_queryset, reorder_columns
+from .suggest import suggest_index
+from .feeds import FEED_FORMATS, iter_feed
+from .cache import (
+    CatalogResponseCacheMixin, catalog_cache_key, catalog_fragment_prefix, get_catalog_cache
+)
 
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(CatalogResponseCacheMixin, ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Category.objects.filter(is_active=True)
     serializer_class = CategorySerializer
     permission_classes = [permissions.AllowAny]
@@ -20,25 +35,237 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ['name', 'description']
     ordering_fields = ['name', 'order']
     ordering = ['order', 'name']
+    cached_actions = ('list', 'retrieve', 'tree')
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            fieldset = SparseFieldset.from_request(self.request)
+            deferred = self.get_serializer_class().get_deferred_columns(fieldset)
+            if deferred:
+                queryset = queryset.defer(*deferred)
+        return queryset
+    
+    @action(detail=False, methods=['get'])
+    def tree(self, request):
+        """
+        Active categories as a nested tree. Each node carries `product_count`
+        (its own active products) and `tree_product_count` (including every
+        descendant), all from one query; the materialized path tells which
+        categories sit below an inactive one.
+        """
+        categories = list(
+            self.get_queryset().annotate(
+                own_product_count=Count('products', filter=Q(products__is_active=True))
+            ).order_by('order', 'name')
+        )
+        data = self.get_serializer(categories, many=True).data
+        nodes = {
+            category.pk: dict(item, product_count=category.own_product_count,
+                              tree_product_count=category.own_product_count, children=[])
+            for category, item in zip(categories, data)
+        }
+        visible = [
+            category for category in categories
+            if all(int(pk) in nodes for pk in category.path.split(Category.PATH_SEPARATOR)[:-1])
+        ]
+        
+        # Deepest first, so each subtree total is complete before it is added
+        for category in sorted(visible, key=lambda category: -category.depth):
+            if category.parent_id is not None:
+                nodes[category.parent_id]['tree_product_count'] += nodes[category.pk]['tree_product_count']
+        
+        roots = []
+        # Categories arrive in display order, so every children list is sorted
+        for category in visible:
+            node = nodes[category.pk]
+            if category.parent_id is None:
+                roots.append(node)
+            else:
+                nodes[category.parent_id]['children'].append(node)
+        return Response(roots)
 
 
-class ProductViewSet(viewsets.ReadOnlyModelViewSet):
+class ProductViewSet(CatalogResponseCacheMixin, ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Product.objects.filter(is_active=True)
     permission_classes = [permissions.AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    pagination_class = KeysetPageNumberPagination
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, ProductOrderingFilter]
     filterset_class = ProductFilter
     search_fields = ['name', 'description', 'sku', 'brand']
-    ordering_fields = ['name', 'price', 'created_at']
+    ordering_fields = ['name', 'price', 'created_at', 'rating', 'reviews']
     ordering = ['-created_at']
+    cached_actions = (
+        'list', 'retrieve', 'featured', 'best_sellers', 'offers', 'related', 'batch', 'compare'
+    )
+    conditional_actions = cached_actions
+    related_limit = 6
+    batch_max_ids = 50
+    compare_max_ids = 6
+    review_pagination_class = KeysetPagination
+    suggest_limit = 8
+    suggest_max_limit = 20
+    batch_views = ('detail', 'list')
+    # Boolean flag each listing action filters on
+    action_flags = {
+        'featured': 'is_featured',
+        'offers': 'is_offer',
+    }
+    # Annotations `?cursor=` pages may be ordered by
+    keyset_annotations = ('sales_rank',)
+    # Sort keys stay loaded: keyset pagination reads them off the last row
+    sort_columns = ('name', 'price', 'created_at', 'rating_avg', 'approved_review_count')
+    facets_cache_timeout = 60 * 5
+    # Query parameters that change paging or order but never the facet counts
+    facets_ignored_params = ('page', 'page_size', 'cursor', 'ordering')
+    
+    def get_queryset(self):
+        """
+        Per-action query plan. Every action joins the category for
+        `category_name`; retrieve additionally prefetches each relation that
+        ProductDetailSerializer renders, so a detail view costs 7 queries no
+        matter how many images, colors or reviews the product has. Columns the
+        serializer does not render are deferred, and fields dropped with
+        `?fields=` / `?omit=` also skip their join, prefetch or column.
+        """
+        fieldset = SparseFieldset.from_request(self.request)
+        queryset = super().get_queryset()
+        if fieldset.includes('category_name'):
+            queryset = queryset.select_related('category')
+        if self.action in self.action_flags:
+            queryset = queryset.filter(**{self.action_flags[self.action]: True})
+        if self.action == 'best_sellers':
+            queryset = self.rank_best_sellers(queryset)
+        if self.action == 'batch':
+            queryset = queryset.filter(pk__in=self.get_batch_ids())
+        if self.get_serializer_class() is ProductDetailSerializer:
+            queryset = queryset.prefetch_related(*self.get_detail_prefetches(fieldset))
+        deferred = self.get_serializer_class().get_deferred_columns(fieldset, keep=self.sort_columns)
+        if deferred:
+            queryset = queryset.defer(*deferred)
+        return queryset
+    
+    def get_sales_window(self):
+        """The SalesRank window selected with `?window=` (days)."""
+        window = self.request.query_params.get('window', SalesRank.DEFAULT_WINDOW)
+        windows = [choice for choice, _ in SalesRank.WINDOW_CHOICES]
+        try:
+            window = int(window)
+        except (TypeError, ValueError):
+            window = None
+        if window not in windows:
+            raise ValidationError({
+                'window': f"Choose one of {', '.join(str(choice) for choice in windows)}."
+            })
+        return window
+    
+    def rank_best_sellers(self, queryset):
+        """
+        Rank by the SalesRank rows of the selected window, annotated as
+        `sales_rank` so keyset pagination can key on it. Until
+        products.tasks.build_sales_ranks has filled the window, fall back to
+        the products flagged `is_best_seller`, like the featured and offers
+        listings.
+        """
+        window = self.get_sales_window()
+        if not hasattr(self, 'sales_window_ranked'):
+            self.sales_window_ranked = SalesRank.objects.filter(window=window).exists()
+        if not self.sales_window_ranked:
+            return queryset.filter(is_best_seller=True)
+        return queryset.filter(sales_ranks__window=window).annotate(
+            sales_rank=F('sales_ranks__rank')
+        ).order_by('sales_rank')
+    
+    def get_batch_ids(self, max_ids=None):
+        """
+        Distinct ids from `?ids=1,2,3` or a POSTed `{"ids": [...]}` or bare
+        `[...]`, in request order.
+        """
+        max_ids = max_ids or self.batch_max_ids
+        if self.request.method == 'POST':
+            data = self.request.data
+            ids = data.get('ids', []) if isinstance(data, dict) else data
+        else:
+            ids = self.request.query_params.get('ids', '')
+        if isinstance(ids, str):
+            ids = [value for value in ids.split(',') if value.strip()]
+        if not isinstance(ids, list):
+            raise ValidationError({'ids': 'Expected a list of product ids.'})
+        try:
+            ids = list(dict.fromkeys(int(value) for value in ids))
+        except (TypeError, ValueError):
+            raise ValidationError({'ids': 'Product ids must be integers.'})
+        if not ids:
+            raise ValidationError({'ids': 'This field is required.'})
+        if len(ids) > max_ids:
+            raise ValidationError({'ids': f'At most {max_ids} ids per request.'})
+        return ids
+    
+    def get_batch_view(self):
+        view = self.request.query_params.get('view', 'detail')
+        if view not in self.batch_views:
+            raise ValidationError({'view': f"Choose one of {', '.join(self.batch_views)}."})
+        return view
+    
+    def get_validator_queryset(self):
+        if self.action in self.action_flags or self.action in ('best_sellers', 'batch'):
+            return self.get_queryset()
+        if self.action == 'compare':
+            return self.get_queryset().filter(pk__in=self.get_batch_ids(self.compare_max_ids))
+        if self.action == 'related':
+            # The product itself, its category siblings and its co-purchased
+            # neighbours from any category
+            category = Product.objects.filter(pk=self.kwargs['pk']).values('category_id')
+            return self.get_queryset().filter(
+                Q(category_id=Subquery(category)) | Q(recommended_for__product_id=self.kwargs['pk'])
+            ).distinct()
+        return super().get_validator_queryset()
+    
+    def get_validator_stats(self):
+        stats = super().get_validator_stats()
+        if self.action == 'related':
+            ranked = RelatedProduct.objects.filter(product_id=self.kwargs['pk']).aggregate(
+                count=Count('pk'), last_modified=Max('updated_at')
+            )
+            stats.append((ranked['count'], ranked['last_modified']))
+        if self.action == 'best_sellers':
+            ranked = SalesRank.objects.filter(window=self.get_sales_window()).aggregate(
+                count=Count('pk'), last_modified=Max('updated_at')
+            )
+            stats.append((ranked['count'], ranked['last_modified']))
+        return stats
+    
+    def get_detail_prefetches(self, fieldset):
+        colors = ProductColor.objects.all()
+        if fieldset.includes('colors.images'):
+            colors = colors.prefetch_related(
+                Prefetch('images', queryset=ProductImage.objects.order_by('order'))
+            )
+        prefetches = {
+            'images': 'images',
+            'colors': Prefetch('colors', queryset=colors),
+            'features': 'features',
+            'tags': 'tags',
+            'reviews': Prefetch(
+                'reviews',
+                queryset=ProductReview.objects.filter(is_approved=True).select_related('user')
+                .order_by('-created_at', '-pk')[:Product.EMBEDDED_REVIEWS],
+                to_attr='_latest_reviews'
+            ),
+        }
+        return [
+            prefetch for name, prefetch in prefetches.items()
+            if fieldset.includes(name)
+        ]
     
     def get_serializer_class(self):
-        if self.action == 'retrieve':
+        if self.action == 'retrieve' or (self.action == 'batch' and self.get_batch_view() == 'detail'):
             return ProductDetailSerializer
         return ProductListSerializer
     
     @action(detail=False, methods=['get'])
     def featured(self, request):
-        featured = Product.objects.filter(is_active=True, is_featured=True)
+        featured = self.get_queryset()
         page = self.paginate_queryset(featured)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -46,9 +273,28 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
         serializer = self.get_serializer(featured, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Sidebar counts per category, brand, flag and price bucket, plus the
+        price range, for the products matching the current filters and search.
+        """
+        cache = get_catalog_cache()
+        cache_key = catalog_cache_key('products:facets', request, self.facets_ignored_params)
+        data = cache.get(cache_key)
+        if data is None:
+            data = compute_product_facets(self.filter_queryset(self.get_queryset()))
+            cache.set(cache_key, data, self.facets_cache_timeout)
+        return Response(data)
+    
     @action(detail=False, methods=['get'])
     def best_sellers(self, request):
-        best_sellers = Product.objects.filter(is_active=True, is_best_seller=True)
+        """
+        Products ranked by units sold over the last 7, 30 or 90 days
+        (`?window=`, default 30), as computed by products.tasks.build_sales_ranks,
+        or the products flagged as best sellers before the window is ranked.
+        """
+        best_sellers = self.get_queryset()
         page = self.paginate_queryset(best_sellers)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -58,7 +304,7 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
     
     @action(detail=False, methods=['get'])
     def offers(self, request):
-        offers = Product.objects.filter(is_active=True, is_offer=True)
+        offers = self.get_queryset()
         page = self.paginate_queryset(offers)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -66,14 +312,98 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
         serializer = self.get_serializer(offers, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get', 'post'])
+    def batch(self, request):
+        """
+        Up to `batch_max_ids` products in one round trip: `?ids=1,2,3`, or a
+        POST of `{"ids": [...]}` (or a bare list) for long lists, rendered as details or with
+        `?view=list` as list items. Results follow the request order; ids
+        that are unknown or inactive are returned under `missing`.
+
+        Each product's representation is cached on its own, so only the ids
+        missing from the cache are queried, with the same prefetch plan as
+        retrieve regardless of how many there are.
+        """
+        ids = self.get_batch_ids()
+        cache = get_catalog_cache()
+        fieldset = SparseFieldset.from_request(request)
+        prefix = catalog_fragment_prefix(
+            'catalog:product', request,
+            f'{self.get_batch_view()}|{sorted(fieldset.fields or ())}|{sorted(fieldset.omit)}'
+        )
+        cached = cache.get_many([f'{prefix}{pk}' for pk in ids])
+        rendered = {pk: cached[f'{prefix}{pk}'] for pk in ids if f'{prefix}{pk}' in cached}
+        if len(rendered) < len(ids):
+            queryset = self.get_queryset().filter(pk__in=[pk for pk in ids if pk not in rendered])
+            products = list(queryset)
+            fresh = dict(zip(
+                (product.pk for product in products),
+                self.get_serializer(products, many=True).data
+            ))
+            cache.set_many(
+                {f'{prefix}{pk}': data for pk, data in fresh.items()},
+                self.response_cache_timeout
+            )
+            rendered.update(fresh)
+        return Response({
+            'results': [rendered[pk] for pk in ids if pk in rendered],
+            'missing': [pk for pk in ids if pk not in rendered],
+        })
+    
+    @action(detail=False, methods=['get'], authentication_classes=[])
+    def suggest(self, request):
+        """
+        Typeahead matches for `?q=` among product names and SKUs, category
+        names and brands, from this worker's in-memory index (see
+        products.suggest); `?limit=` caps the product matches.
+        """
+        try:
+            limit = int(request.query_params.get('limit', self.suggest_limit))
+        except ValueError:
+            raise ValidationError({'limit': 'A valid integer is required.'})
+        limit = max(1, min(limit, self.suggest_max_limit))
+        return Response(suggest_index.suggest(request.query_params.get('q', ''), limit, request))
+    
+    @action(detail=False, methods=['get'])
+    def compare(self, request):
+        """
+        Attribute matrix for up to `compare_max_ids` products (`?ids=1,2,3`),
+        with a column per product in request order and identical rows
+        flagged (see products.compare). The matrix is cached per set of ids,
+        whatever their order.
+        """
+        ids = self.get_batch_ids(self.compare_max_ids)
+        cache = get_catalog_cache()
+        cache_key = catalog_fragment_prefix('catalog:compare', request) + ','.join(
+            str(pk) for pk in sorted(ids)
+        )
+        matrix = cache.get(cache_key)
+        if matrix is None:
+            products = comparison_queryset(Product.objects.filter(is_active=True, pk__in=ids))
+            matrix = build_comparison_matrix(list(products), request)
+            cache.set(cache_key, matrix, self.response_cache_timeout)
+        columns = {product['id']: index for index, product in enumerate(matrix['products'])}
+        return Response({
+            **reorder_columns(matrix, [columns[pk] for pk in ids if pk in columns]),
+            'missing': [pk for pk in ids if pk not in columns],
+        })
+    
     @action(detail=True, methods=['get', 'post'])
     def reviews(self, request, pk=None):
+        """
+        GET pages through the approved reviews, newest first, with a
+        `?cursor=` taken from `next`; POST adds the user's review.
+        """
         product = self.get_object()
         
         if request.method == 'GET':
-            reviews = product.reviews.filter(is_approved=True)
-            serializer = ProductReviewSerializer(reviews, many=True)
-            return Response(serializer.data)
+            reviews = product.reviews.filter(is_approved=True).select_related('user').order_by(
+                '-created_at'
+            )
+            paginator = self.review_pagination_class()
+            page = paginator.paginate_queryset(reviews, request, view=self)
+            serializer = ProductReviewSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
         
         # POST method - add a review
         if not request.user.is_authenticated:
@@ -100,10 +430,34 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
     
     @action(detail=True, methods=['get'])
     def related(self, request, pk=None):
+        """
+        "Frequently bought together" neighbours precomputed by
+        products.tasks.build_related_products, topped up with the newest
+        products of the same category.
+        """
         product = self.get_object()
-        related = Product.objects.filter(
-            category=product.category,
-            is_active=True
-        ).exclude(id=product.id)[:6]
-        serializer = ProductListSerializer(related, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        related = list(
+            self.get_queryset().filter(recommended_for__product=product)
+            .order_by('recommended_for__rank')[:self.related_limit]
+        )
+        if len(related) < self.related_limit:
+            related += self.get_queryset().filter(
+                category_id=product.category_id
+            ).exclude(
+                id__in=[product.id] + [item.id for item in related]
+            )[:self.related_limit - len(related)]
+        serializer = self.get_serializer(related, many=True)
+        return Response(serializer.data)
+
+
+@require_GET
+def product_feed(request, format_name):
+    """
+    The whole active catalog as a Merchant/Meta product feed, streamed as it
+    is read (see products.feeds). Crawlers should prefer the gzipped copies
+    products.tasks.render_product_feeds keeps in storage.
+    """
+    return StreamingHttpResponse(
+        iter_feed(format_name, request.build_absolute_uri('/')),
+        content_type=FEED_FORMATS[format_name]
+    )
\ No newline at end of file
@@ -13,6 +13,7 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 
 # Load task modules from all registered Django app configs.
 app.autodiscover_tasks()
+app.autodiscover_tasks(['rafal_backend'], related_name='images')
 
 @app.task(bind=True)
 def debug_task(self):
@@ -0,0 +1,89 @@
+import hashlib
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+class NotModified(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """
+    Answer conditional GETs (If-None-Match / If-Modified-Since) with 304 Not
+    Modified before the action queries or serializes its rows.
+
+    The validators come from one aggregate query over the rows the action
+    renders: their count and max(``last_modified_field``). Any change that
+    alters the representation must therefore bump that field on the rows
+    (see products.signals.touch_products); deletions change the count.
+    """
+    conditional_actions = ('list', 'retrieve')
+    last_modified_field = 'updated_at'
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.validators = None
+        if request.method not in ('GET', 'HEAD') or self.action not in self.conditional_actions:
+            return
+        self.validators = self.get_validators()
+        if self.validators is None:
+            return
+        etag, last_modified = self.validators
+        response = get_conditional_response(
+            request._request,
+            etag=etag,
+            last_modified=int(last_modified.timestamp()) if last_modified else None
+        )
+        if response is not None:
+            raise NotModified(response)
+
+    def get_validator_queryset(self):
+        """
+        The rows the current action renders. list and retrieve go through the
+        filter backends like the generic views do; other actions override this.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.detail:
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        return queryset
+
+    def get_validator_stats(self):
+        """
+        ``(count, last_modified)`` pairs the validators are derived from; views
+        whose output also depends on other tables append their own.
+        """
+        stats = self.get_validator_queryset().order_by().aggregate(
+            count=Count('pk'), last_modified=Max(self.last_modified_field)
+        )
+        return [(stats['count'], stats['last_modified'])]
+
+    def get_validators(self):
+        """Return ``(etag, last_modified)``, or None when the action renders no rows."""
+        stats = self.get_validator_stats()
+        if not stats[0][0]:
+            return None
+        stamps = [last_modified for _, last_modified in stats if last_modified]
+        fingerprint = ';'.join(
+            f"{count}:{last_modified.isoformat() if last_modified else ''}"
+            for count, last_modified in stats
+        )
+        digest = hashlib.sha1(fingerprint.encode()).hexdigest()
+        return f'"{digest}"', max(stamps) if stamps else None
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        validators = getattr(self, 'validators', None)
+        if validators is not None and response.status_code == 200:
+            etag, last_modified = validators
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
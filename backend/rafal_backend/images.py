@@ -0,0 +1,249 @@
+"""
+Image variants: resized WebP (and AVIF, where Pillow can encode it) copies
+of uploaded images, a fallback JPEG/PNG at the same widths, and an inline
+blur-up placeholder.
+
+A model opts in with ``IMAGE_VARIANT_FIELDS = ('image', ...)`` and a
+``<field>_variants`` JSONField per listed ImageField. Saving a new upload
+queues generate_image_variants, which stores::
+
+    {"source": "products/fan.jpg", "width": 2400, "height": 1600,
+     "placeholder": "data:image/webp;base64,...",
+     "formats": {"webp": {"320": "variants/products/fan/320w.webp", ...},
+                 "jpeg": {"320": "variants/products/fan/320w.jpg", ...}}}
+
+and ImageVariantsField renders it as URL maps and srcset strings.
+
+Variants are derived data: when no broker is configured
+(IMAGE_VARIANTS_QUEUE) or it cannot be reached, nothing is queued and the
+save goes through; ``manage.py regenerate_image_variants`` fills them in.
+"""
+import base64
+import io
+import logging
+import os
+from functools import partial
+from celery import shared_task
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from kombu.exceptions import OperationalError
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+
+logger = logging.getLogger(__name__)
+
+
+VARIANT_WIDTHS = getattr(settings, 'IMAGE_VARIANT_WIDTHS', (160, 320, 640, 1024, 1600))
+VARIANT_ROOT = 'variants'
+PLACEHOLDER_WIDTH = 16
+
+# Pillow format name, file extension and encoder options per output format
+ENCODINGS = {
+    'avif': ('AVIF', 'avif', {'quality': 60}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'png': ('PNG', 'png', {'optimize': True}),
+}
+
+
+def modern_formats():
+    Image.init()
+    return [name for name in ('avif', 'webp') if ENCODINGS[name][0] in Image.SAVE]
+
+
+def variants_field_name(field_name):
+    return f'{field_name}_variants'
+
+
+def get_image_variant_models():
+    """``(model, image field names)`` of every model that opts in."""
+    return [
+        (model, model.IMAGE_VARIANT_FIELDS)
+        for model in apps.get_models()
+        if getattr(model, 'IMAGE_VARIANT_FIELDS', None)
+    ]
+
+
+def variant_widths(width):
+    """Target widths below the original, plus the original when it is not too large."""
+    widths = [target for target in VARIANT_WIDTHS if target < width]
+    if width <= VARIANT_WIDTHS[-1]:
+        widths.append(width)
+    return widths or [width]
+
+
+def encode(image, format_name):
+    pillow_format, _, options = ENCODINGS[format_name]
+    buffer = io.BytesIO()
+    image.save(buffer, pillow_format, **options)
+    return buffer.getvalue()
+
+
+def render_variants(name, storage=default_storage):
+    """Generate and store every variant of the stored image ``name``."""
+    with storage.open(name, 'rb') as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    width, height = image.size
+    has_alpha = image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    formats = modern_formats() + ['png' if has_alpha else 'jpeg']
+
+    stem = os.path.join(VARIANT_ROOT, os.path.splitext(name)[0])
+    stored = {format_name: {} for format_name in formats}
+    # Shrink step by step from the largest width: each resize starts from
+    # the previous, much smaller result instead of the full original.
+    resized = image
+    for target in sorted(variant_widths(width), reverse=True):
+        size = (target, max(1, round(height * target / width)))
+        if size != resized.size:
+            resized = resized.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        for format_name in formats:
+            path = f'{stem}/{target}w.{ENCODINGS[format_name][1]}'
+            if storage.exists(path):
+                storage.delete(path)
+            stored[format_name][str(target)] = storage.save(
+                path, ContentFile(encode(resized, format_name))
+            )
+
+    tiny = resized.resize(
+        (PLACEHOLDER_WIDTH, max(1, round(height * PLACEHOLDER_WIDTH / width))),
+        Image.Resampling.BILINEAR
+    )
+    placeholder_format = 'webp' if 'webp' in formats else formats[-1]
+    placeholder = base64.b64encode(encode(tiny, placeholder_format)).decode()
+    return {
+        'source': name,
+        'width': width,
+        'height': height,
+        'placeholder': f'data:image/{placeholder_format};base64,{placeholder}',
+        'formats': stored,
+    }
+
+
+def stored_variant_names(variants):
+    return {
+        path
+        for paths in (variants or {}).get('formats', {}).values()
+        for path in paths.values()
+    }
+
+
+def refresh_image_variants(instance, field_name, force=False, storage=default_storage):
+    """
+    Bring ``<field>_variants`` of ``instance`` in line with its current file,
+    deleting variants of a replaced file. Returns whether anything changed.
+    """
+    target = variants_field_name(field_name)
+    name = getattr(instance, field_name).name or ''
+    current = getattr(instance, target) or {}
+    if not force and current.get('source', '') == name:
+        return False
+
+    variants = {}
+    if name:
+        try:
+            variants = render_variants(name, storage)
+        except OSError:
+            # Missing or unreadable file: remember it so saves stop retrying;
+            # `regenerate_image_variants --force` tries again.
+            variants = {'source': name}
+    for path in stored_variant_names(current) - stored_variant_names(variants):
+        storage.delete(path)
+
+    setattr(instance, target, variants)
+    update_fields = [target]
+    if any(field.name == 'updated_at' for field in instance._meta.concrete_fields):
+        update_fields.append('updated_at')
+    instance.save(update_fields=update_fields)
+    return True
+
+
+@shared_task
+def generate_image_variants(model_label, pk, field_name, force=False):
+    instance = apps.get_model(model_label)._default_manager.filter(pk=pk).first()
+    if instance is None:
+        return False
+    return refresh_image_variants(instance, field_name, force=force)
+
+
+@shared_task
+def generate_image_variants_batch(model_label, field_name, pks, force=False):
+    """generate_image_variants for many rows in one task, e.g. after a bulk import."""
+    refreshed = 0
+    for instance in apps.get_model(model_label)._default_manager.filter(pk__in=pks).iterator():
+        refreshed += refresh_image_variants(instance, field_name, force=force)
+    return refreshed
+
+
+def send_variant_task(task, *args):
+    """
+    Queue ``task`` without waiting on the broker; failures are logged, not
+    raised, so they never fail the write that uploaded the image.
+    """
+    if not getattr(settings, 'IMAGE_VARIANTS_QUEUE', True):
+        return
+    try:
+        task.apply_async(args, ignore_result=True, retry=False)
+    except (OperationalError, RuntimeError) as exc:
+        logger.warning('Could not queue %s%r: %s', task.name, args, exc)
+
+
+def queue_image_variants(sender, instance, raw=False, **kwargs):
+    """post_save receiver: queue variants for every newly uploaded or cleared image."""
+    if raw:
+        return
+    for field_name in sender.IMAGE_VARIANT_FIELDS:
+        name = getattr(instance, field_name).name or ''
+        current = getattr(instance, variants_field_name(field_name)) or {}
+        if current.get('source', '') != name:
+            transaction.on_commit(partial(
+                send_variant_task, generate_image_variants,
+                sender._meta.label, instance.pk, field_name
+            ))
+
+
+class ImageVariantsField(serializers.Field):
+    """
+    Read-only rendering of a ``<field>_variants`` JSONField: intrinsic size,
+    placeholder, a ``{width: url}`` map and a srcset string per format.
+    None until the variants have been generated.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value or not value.get('formats'):
+            return None
+        request = self.context.get('request')
+
+        def url(path):
+            location = default_storage.url(path)
+            return request.build_absolute_uri(location) if request is not None else location
+
+        urls = {
+            format_name: {width: url(path) for width, path in paths.items()}
+            for format_name, paths in value['formats'].items()
+        }
+        return {
+            'width': value['width'],
+            'height': value['height'],
+            'placeholder': value['placeholder'],
+            'urls': urls,
+            'srcset': {
+                format_name: ', '.join(
+                    f'{location} {width}w'
+                    for width, location in sorted(paths.items(), key=lambda item: int(item[0]))
+                )
+                for format_name, paths in urls.items()
+            },
+        }
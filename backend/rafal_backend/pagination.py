@@ -0,0 +1,137 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPageNumberPagination(PageNumberPagination):
+    """
+    Page-number pagination with an opt-in keyset mode.
+
+    Passing ``?cursor=`` (empty for the first page) switches to keyset
+    pagination: each page is read with ``WHERE (key, id)`` beyond the last row
+    of the previous page and ``LIMIT page_size + 1``, so there is no COUNT and
+    no OFFSET and deep pages cost the same as the first one. The response
+    carries an opaque ``next`` cursor instead of ``count``.
+
+    The key is the queryset's single ordering field (e.g. ``-created_at``,
+    ``price``, ``name``) with the primary key as tie-breaker in the same
+    direction, which a composite ``(key, id)`` index serves in either direction.
+    The key may also be an annotation the view lists in ``keyset_annotations``
+    (e.g. a rank joined from another table), as long as it is never NULL.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor.'
+    unsupported_ordering_message = 'Cursor pagination is not available for this ordering.'
+
+    def use_keyset(self, request):
+        return self.cursor_query_param in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.use_keyset(request)
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        self.request = request
+
+        ordering, field = self.get_keyset_ordering(queryset, getattr(view, 'keyset_annotations', ()))
+        key = ordering.lstrip('-')
+        descending = ordering.startswith('-')
+        tie_breaker = '-pk' if descending else 'pk'
+        queryset = queryset.order_by(ordering, tie_breaker)
+
+        position = self.decode_cursor(request.query_params.get(self.cursor_query_param, ''), ordering)
+        if position is not None:
+            value, pk = position
+            lookup = 'lt' if descending else 'gt'
+            try:
+                queryset = queryset.filter(
+                    Q(**{f'{key}__{lookup}': value}) |
+                    Q(**{key: value, f'pk__{lookup}': pk})
+                )
+            except (DjangoValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+
+        rows = list(queryset[:page_size + 1])
+        page = rows[:page_size]
+        self.next_cursor = None
+        if len(rows) > page_size:
+            last = page[-1]
+            if key in queryset.query.annotations:
+                value = str(getattr(last, key))
+            else:
+                value = field.value_to_string(last)
+            self.next_cursor = self.encode_cursor(ordering, value, last.pk)
+        return page
+
+    def get_keyset_ordering(self, queryset, annotations=()):
+        """The single ordering term and the field its values are typed by."""
+        ordering = [
+            term for term in (queryset.query.order_by or queryset.model._meta.ordering)
+            if isinstance(term, str) and term.lstrip('-') not in ('pk', 'id')
+        ]
+        if len(ordering) != 1:
+            raise ValidationError({self.cursor_query_param: self.unsupported_ordering_message})
+        key = ordering[0].lstrip('-')
+        if key in queryset.query.annotations:
+            if key not in annotations:
+                raise ValidationError({self.cursor_query_param: self.unsupported_ordering_message})
+            field = queryset.query.annotations[key].output_field
+        else:
+            try:
+                field = queryset.model._meta.get_field(key)
+            except FieldDoesNotExist:
+                raise ValidationError({self.cursor_query_param: self.unsupported_ordering_message})
+        if field.null or field.is_relation:
+            raise ValidationError({self.cursor_query_param: self.unsupported_ordering_message})
+        return ordering[0], field
+
+    def encode_cursor(self, ordering, value, pk):
+        payload = json.dumps({'o': ordering, 'v': value, 'pk': pk}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, encoded, ordering):
+        """Return ``(value, pk)`` of the last row seen, or None for the first page."""
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            if payload['o'] != ordering:
+                raise NotFound(self.invalid_cursor_message)
+            return payload['v'], int(payload['pk'])
+        except (TypeError, ValueError, KeyError, binascii.Error, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+
+class KeysetPagination(KeysetPageNumberPagination):
+    """Keyset pagination only: the first page is the request without ``?cursor=``."""
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def use_keyset(self, request):
+        return True
@@ -5,6 +5,7 @@ Django settings for rafal_backend project.
 import os
 from pathlib import Path
 from datetime import timedelta
+from celery.schedules import crontab
 import dj_database_url
 from dotenv import load_dotenv
 
@@ -162,6 +163,14 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Widths (px) of the resized copies generated for uploaded images
+IMAGE_VARIANT_WIDTHS = (160, 320, 640, 1024, 1600)
+# Queue variant generation on Celery; without a broker (REDIS_URL) the
+# variants are left to `manage.py regenerate_image_variants`
+IMAGE_VARIANTS_QUEUE = os.environ.get(
+    "IMAGE_VARIANTS_QUEUE", "True" if os.environ.get("REDIS_URL") else "False"
+) == "True"
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -222,6 +231,38 @@ DEFAULT_FROM_EMAIL = os.environ.get(
     "DEFAULT_FROM_EMAIL", "RAFAL Electric <noreply@rafalelectric.com>"
 )
 
+# Cache
+# Shared through Redis when configured, so catalog cache invalidation reaches
+# every worker process; falls back to the per-process local-memory cache, with
+# which the catalog response caches are disabled (products.cache).
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+            "KEY_PREFIX": "rafal",
+        }
+    }
+CATALOG_CACHE_TIMEOUT = int(os.environ.get("CATALOG_CACHE_TIMEOUT", 60 * 60))
+
+# Guest carts (orders.cart_store): Redis hashes when Redis is configured,
+# written to SQL at checkout, at login and by a write-behind beat task
+CART_STORE_BACKEND = os.environ.get(
+    "CART_STORE_BACKEND",
+    "orders.cart_store.RedisCartStore" if os.environ.get("REDIS_URL")
+    else "orders.cart_store.DatabaseCartStore",
+)
+CART_STORE_REDIS_URL = os.environ.get("REDIS_URL", "")
+GUEST_CART_TTL = int(os.environ.get("GUEST_CART_TTL", 30 * 24 * 60 * 60))
+
+# Build the typeahead index (products.suggest) in the background as soon as a
+# process loads; set it for web workers only, otherwise it is built at first use
+SUGGEST_WARM_UP = os.environ.get("SUGGEST_WARM_UP", "False") == "True"
+
+# Public base URLs, for links rendered outside a request (product feeds)
+STOREFRONT_URL = os.environ.get("STOREFRONT_URL", "http://localhost:5173")
+BACKEND_URL = os.environ.get("BACKEND_URL", "http://localhost:8000")
+
 # Celery settings
 CELERY_BROKER_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
 CELERY_RESULT_BACKEND = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
@@ -229,6 +270,32 @@ CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    "build-related-products": {
+        "task": "products.tasks.build_related_products",
+        "schedule": crontab(minute=15),
+    },
+    "build-sales-ranks": {
+        "task": "products.tasks.build_sales_ranks",
+        "schedule": crontab(minute=45),
+    },
+    "render-product-feeds": {
+        "task": "products.tasks.render_product_feeds",
+        "schedule": crontab(minute="*/10"),
+    },
+    "persist-guest-carts": {
+        "task": "orders.tasks.persist_guest_carts",
+        "schedule": crontab(minute="*/5"),
+    },
+    "delete-stale-carts": {
+        "task": "orders.tasks.delete_stale_carts",
+        "schedule": crontab(hour=4, minute=30),
+    },
+    "build-sitemaps": {
+        "task": "products.tasks.build_sitemaps",
+        "schedule": crontab(minute="5,35"),
+    },
+}
 
 # Payment gateway settings
 PAYMOB_API_KEY = os.environ.get("PAYMOB_API_KEY", "")
@@ -0,0 +1,122 @@
+"""
+Sparse fieldsets: ``?fields=`` and ``?omit=``.
+
+Both take comma-separated, dot-separated paths from the top-level
+representation, e.g. ``?fields=id,name,price,image`` or
+``?fields=id,items.quantity,items.product.name`` and ``?omit=reviews``.
+Naming a nested field in ``fields`` without any of its subfields keeps it
+whole. Unknown names are ignored.
+
+Serializers with SparseFieldsetSerializerMixin drop the excluded fields
+before rendering, and views consult the same SparseFieldset to skip the
+columns, joins and prefetches only those fields needed.
+"""
+
+
+def parse_paths(value):
+    return {path.strip() for path in (value or '').split(',') if path.strip()}
+
+
+class SparseFieldset:
+    fields_query_param = 'fields'
+    omit_query_param = 'omit'
+
+    def __init__(self, fields=None, omit=()):
+        self.fields = set(fields) if fields is not None else None
+        self.omit = set(omit)
+
+    @classmethod
+    def from_request(cls, request):
+        """The fieldset of a GET request; writes always see every field."""
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return cls()
+        params = request.query_params
+        fields = None
+        if cls.fields_query_param in params:
+            fields = parse_paths(params[cls.fields_query_param]) or None
+        return cls(fields, parse_paths(params.get(cls.omit_query_param)))
+
+    @property
+    def is_sparse(self):
+        return self.fields is not None or bool(self.omit)
+
+    def requested_at(self, prefix):
+        """Names requested directly below ``prefix``, or None for all of them."""
+        if self.fields is None:
+            return None
+        if not prefix:
+            return {path.split('.')[0] for path in self.fields}
+        names = {
+            path[len(prefix) + 1:].split('.')[0]
+            for path in self.fields if path.startswith(prefix + '.')
+        }
+        return names or None
+
+    def includes(self, path):
+        """Whether the field at dotted ``path`` is rendered."""
+        parts = path.split('.')
+        for depth, name in enumerate(parts):
+            prefix = '.'.join(parts[:depth])
+            requested = self.requested_at(prefix)
+            if requested is not None and name not in requested:
+                return False
+            if '.'.join(parts[:depth + 1]) in self.omit:
+                return False
+        return True
+
+    def includes_any(self, *paths):
+        return any(self.includes(path) for path in paths)
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    Drop the fields a request's sparse fieldset excludes, at whatever depth
+    the serializer is nested. ``Meta.field_dependencies`` lists the model
+    columns read by fields whose source is not itself a column (properties).
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self.get_sparse_fieldset()
+        if not fieldset.is_sparse:
+            return fields
+        prefix = self.get_field_path()
+        return {
+            name: field for name, field in fields.items()
+            if fieldset.includes(f'{prefix}.{name}' if prefix else name)
+        }
+
+    def get_sparse_fieldset(self):
+        return SparseFieldset.from_request(self.context.get('request'))
+
+    def get_field_path(self):
+        """Dotted path of this serializer from the root serializer."""
+        names = []
+        node = self
+        while node.parent is not None:
+            if node.field_name and getattr(node.parent, 'child', None) is not node:
+                names.append(node.field_name)
+            node = node.parent
+        return '.'.join(reversed(names))
+
+    @classmethod
+    def get_deferred_columns(cls, fieldset, keep=()):
+        """
+        Model columns no rendered field reads, suitable for ``QuerySet.defer()``.
+        Relations, the primary key and ``keep`` (e.g. sort keys the view reads
+        itself) are never deferred.
+        """
+        model = cls.Meta.model
+        dependencies = getattr(cls.Meta, 'field_dependencies', {})
+        needed = set(keep)
+        for name, field in cls().get_fields().items():
+            if field.write_only or not fieldset.includes(name):
+                continue
+            # Unbound fields have no source yet; it defaults to the field name
+            source = field.source or name
+            needed.add(source.split('.')[0])
+            needed.update(dependencies.get(name, ()))
+        return [
+            field.name for field in model._meta.concrete_fields
+            if not field.is_relation and not field.primary_key and field.name not in needed
+        ]
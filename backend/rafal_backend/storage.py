@@ -0,0 +1,42 @@
+"""
+Generated files kept in storage (product feeds, sitemaps) and rewritten in
+place while crawlers keep fetching them.
+"""
+import gzip
+import os
+import tempfile
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+
+def replace_file(name, chunks, compress=False, storage=default_storage):
+    """
+    Write the text ``chunks`` to ``name`` in ``storage``, gzipped with
+    ``compress``, spooled through a temporary file so memory stays flat.
+
+    The previous file keeps being served until the new one is complete:
+    storages that overwrite on save (S3 with ``file_overwrite``) replace it
+    in one PUT, and on the local filesystem the new file is written under a
+    temporary name and renamed over it.
+    """
+    with tempfile.TemporaryFile() as spool:
+        if compress:
+            with gzip.GzipFile(fileobj=spool, mode='wb') as compressed:
+                for chunk in chunks:
+                    compressed.write(chunk.encode())
+        else:
+            for chunk in chunks:
+                spool.write(chunk.encode())
+        spool.seek(0)
+        if not storage.exists(name) or storage.get_available_name(name) == name:
+            return storage.save(name, File(spool))
+        temporary = storage.save(f'{name}.tmp', File(spool))
+    try:
+        os.replace(storage.path(temporary), storage.path(name))
+    except NotImplementedError:
+        # Neither overwrites nor renames: the old file goes first
+        with storage.open(temporary, 'rb') as written:
+            storage.delete(name)
+            storage.save(name, written)
+        storage.delete(temporary)
+    return name